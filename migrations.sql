@@ -20,3 +20,18 @@ CREATE TABLE IF NOT EXISTS token_movements (
 
 CREATE INDEX IF NOT EXISTS idx_transactions_slot ON transactions(slot);
 CREATE INDEX IF NOT EXISTS idx_token_movements_mint ON token_movements(mint);
+
+-- Covering indexes for the analytics SQL pushdown queries
+CREATE INDEX IF NOT EXISTS idx_transactions_block_time ON transactions(block_time);
+CREATE INDEX IF NOT EXISTS idx_token_movements_mint_amount ON token_movements(mint, amount, decimals);
+CREATE INDEX IF NOT EXISTS idx_token_movements_source ON token_movements(source, mint, amount);
+CREATE INDEX IF NOT EXISTS idx_token_movements_destination ON token_movements(destination, amount);
+CREATE INDEX IF NOT EXISTS idx_token_movements_block_time ON token_movements(block_time);
+
+-- Whether the history backfill last walked back to the wallet's first
+-- transaction without errors, so later runs may resume from the newest one
+CREATE TABLE IF NOT EXISTS history_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    complete BOOLEAN NOT NULL,
+    updated_at INTEGER NOT NULL
+);
@@ -2,13 +2,21 @@ from fastapi import FastAPI, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
+import math
 import os
-import threading
 
-from vialytics_api.services.analytics import WalletAnalyzer
+from vialytics_api.services.analytics import WalletAnalyzer, parse_sections
+from vialytics_api.services.analytics_cache import get_analytics_cache
+from vialytics_api.services.rollups import TimezoneBuckets
+from vialytics_api.services.timeline import BALANCE_INTERVALS
+from vialytics_api.services.wallet_group import WalletGroupAnalyzer
 from vialytics_api.services.supabase_service import get_supabase
-from vialytics_api.services.indexer_service import get_indexer, DATA_DIR
-from vialytics_api.services.helius_client import get_default_client
+from vialytics_api.services.indexer_service import DATA_DIR, get_indexer
+from vialytics_api.services.index_queue import QueueFullError, get_index_queue
+from vialytics_api.services.helius_client import get_async_client
+from vialytics_api.core.http import get_async_http_client, get_http_client
+from vialytics_api.core.rate_limit import get_rate_limiter
+from vialytics_api.core.singleflight import SingleFlight
 from fastapi.concurrency import run_in_threadpool
 
 app = FastAPI(title="Vialytics API")
@@ -36,7 +44,10 @@ app.add_middleware(
 )
 
 supabase = get_supabase()
-indexer = get_indexer()
+index_queue = get_index_queue()
+analytics_cache = get_analytics_cache()
+# Identical group requests in flight at the same time share one analysis
+group_flights = SingleFlight()
 
 class ChatMessage(BaseModel):
     role: str
@@ -54,16 +65,38 @@ class IndexRequest(BaseModel):
 class IndexResponse(BaseModel):
     job_id: str
     status: str
+    queue_position: Optional[int] = None
+    estimated_wait_seconds: Optional[float] = None
+
+class GroupAnalyticsRequest(BaseModel):
+    wallet_addresses: List[str]
+    sections: Optional[List[str]] = None
+    tz: Optional[str] = None
 
 class JobStatus(BaseModel):
     job_id: str
     status: str
     progress: int
     error: Optional[str] = None
+    queue_position: Optional[int] = None
+    estimated_wait_seconds: Optional[float] = None
+    eta_seconds: Optional[float] = None
+
+def _queued_job_response(job_id: str, status: str) -> IndexResponse:
+    return IndexResponse(
+        job_id=job_id,
+        status=status,
+        queue_position=index_queue.position(job_id),
+        estimated_wait_seconds=index_queue.estimated_wait(job_id),
+    )
 
 @app.post("/api/index")
 async def start_indexing(request: IndexRequest, background_tasks: BackgroundTasks) -> IndexResponse:
-    """Trigger wallet indexing"""
+    """Queue wallet indexing.
+
+    A wallet that is already queued or being indexed returns its existing job.
+    When the queue is full the request is refused with 429 and a Retry-After.
+    """
     wallet = request.wallet_address
     
     # Validate
@@ -74,22 +107,28 @@ async def start_indexing(request: IndexRequest, background_tasks: BackgroundTask
     cached = supabase.get_analytics(wallet)
     if cached:
         return IndexResponse(job_id="cached", status="completed")
+
+    active = index_queue.active_job(wallet)
+    if active is not None:
+        return _queued_job_response(active.job_id, active.status)
     
     # Create job
-    job_id = supabase.create_job(wallet) if supabase.client else wallet[:8]
+    # A fresh UUID, recorded in Supabase when it is configured
+    job_id = supabase.create_job(wallet)
     
-    # Run indexer in background thread
-    def run_in_background():
-        try:
-            indexer.run_indexer(wallet, job_id)
-        except Exception as e:
-            print(f"Background indexer error: {e}")
-    
-    thread = threading.Thread(target=run_in_background)
-    thread.daemon = True
-    thread.start()
+    # Run on the indexer worker pool
+    try:
+        job, created = index_queue.submit(wallet, job_id)
+    except QueueFullError as e:
+        if supabase.client:
+            supabase.update_job(job_id, "failed", 0, str(e))
+        raise HTTPException(status_code=429, detail=str(e),
+                            headers={"Retry-After": str(math.ceil(e.retry_after))})
+    if not created and supabase.client:
+        # Lost a race with another request for the same wallet
+        supabase.update_job(job_id, "failed", 0, f"Duplicate of job {job.job_id}")
     
-    return IndexResponse(job_id=job_id, status="running")
+    return _queued_job_response(job.job_id, job.status)
 
 @app.get("/api/index/status/{job_id}")
 async def get_index_status(job_id: str) -> JobStatus:
@@ -98,6 +137,13 @@ async def get_index_status(job_id: str) -> JobStatus:
     # Check for cached status
     if job_id == "cached":
         return JobStatus(job_id=job_id, status="completed", progress=100)
+
+    # Still waiting for a worker: report its place in the queue
+    job = index_queue.get(job_id)
+    if job is not None and job.status == "pending":
+        return JobStatus(job_id=job_id, status=job.status, progress=0,
+                         queue_position=index_queue.position(job_id),
+                         estimated_wait_seconds=index_queue.estimated_wait(job_id))
     
     # Get from Supabase
     if supabase.client:
@@ -107,19 +153,53 @@ async def get_index_status(job_id: str) -> JobStatus:
                 job_id=job_id,
                 status=job["status"],
                 progress=job["progress"],
-                error=job.get("error_message")
+                error=job.get("error_message"),
+                eta_seconds=(get_indexer().job_progress(job_id) or {}).get("eta_seconds")
             )
     
+    if job is not None:
+        running = get_indexer().job_progress(job_id) if job.status == "running" else None
+        if running is not None:
+            return JobStatus(job_id=job_id, status=job.status, progress=running["progress"],
+                             eta_seconds=running["eta_seconds"])
+        progress = 100 if job.status == "completed" else 0 if job.status == "failed" else 10
+        return JobStatus(job_id=job_id, status=job.status, progress=progress, error=job.error)
+
     # Fallback: simulate progress for demo
     return JobStatus(job_id=job_id, status="completed", progress=100)
 
+def _analyze_indexed(db_path: str, **options: Any) -> Dict[str, Any]:
+    analyzer = WalletAnalyzer(db_path=db_path, incremental=True, **options)
+    try:
+        return analyzer.analyze()
+    finally:
+        analyzer.close()
+
 @app.get("/api/analytics/{wallet_address}")
-async def get_analytics_by_wallet(wallet_address: str) -> Dict[str, Any]:
-    """Get analytics for a specific wallet with Helius-only fallback for MVP"""
+async def get_analytics_by_wallet(wallet_address: str, tz: Optional[str] = None,
+                                  sections: Optional[str] = None, include_raw: bool = False,
+                                  balance_interval: Optional[str] = None) -> Dict[str, Any]:
+    """Get analytics for a specific wallet with Helius-only fallback for MVP.
+
+    `sections` is a comma-separated subset of the report (e.g. "activity_insights");
+    only the data those sections need is computed. The embedded Helius
+    enrichment is compact (normalized view only) unless `include_raw` is set.
+    `balance_interval=day` asks for a daily balance history instead of weekly.
+    """
     
     # Validate wallet address
     if not (32 <= len(wallet_address) <= 44):
         raise HTTPException(status_code=400, detail="Invalid wallet address")
+    try:
+        if tz is not None:
+            TimezoneBuckets(tz)
+        if balance_interval is not None and balance_interval not in BALANCE_INTERVALS:
+            raise ValueError(f"Unknown balance interval: {balance_interval}")
+        requested = parse_sections(
+            [s.strip() for s in sections.split(",") if s.strip()] if sections is not None else None
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     # Check Supabase cache first
     if supabase.client:
@@ -139,17 +219,30 @@ async def get_analytics_by_wallet(wallet_address: str) -> Dict[str, Any]:
     # Try to get indexed data first (for transaction history, earnings, etc)
     if os.path.exists(db_path):
         try:
-            analyzer = WalletAnalyzer(db_path=db_path)
-            indexed_data = analyzer.analyze()
+            # Served from memory until the indexer writes new rows; concurrent
+            # misses for the same wallet share one analysis
+            indexed_data = await run_in_threadpool(
+                analytics_cache.get_or_compute,
+                db_path,
+                lambda: _analyze_indexed(db_path, timezone=tz, sections=requested,
+                                         balance_interval=balance_interval),
+                options=(tz, requested, balance_interval),
+            )
             result.update(indexed_data)
             result["data_source"] = "indexed"
         except Exception as e:
             print(f"Indexed analytics error: {e}")
     
-    # Always enrich with Helius/Orb data (this provides real-time balances)
+    # Helius provides the real-time portfolio, and stands in for the earnings and
+    # activity sections of wallets that are not indexed yet
+    helius_sections = {"portfolio_overview"}
+    if result["data_source"] == "helius":
+        helius_sections |= {"earnings_spending", "activity_insights"}
+    if helius_sections.isdisjoint(requested):
+        return result
+
     try:
-        client = get_default_client()
-        enrichment = await run_in_threadpool(client.fetch_enrichment, wallet_address)
+        enrichment = await get_async_client().fetch_enrichment_async(wallet_address, include_raw=include_raw)
         if enrichment:
             result.setdefault("external_sources", {})["helius_orb"] = enrichment
             
@@ -157,22 +250,24 @@ async def get_analytics_by_wallet(wallet_address: str) -> Dict[str, Any]:
             token_balances = normalized.get("token_balances", [])
             
             # ALWAYS use Helius for real-time portfolio data (more accurate)
-            result["portfolio_overview"] = {
-                "total_balance_usd": sum(t.get("usd_value", 0) for t in token_balances),
-                "token_count": len(token_balances),
-                "nft_count": len(normalized.get("nfts", [])),
-                "top_tokens": token_balances[:5] if token_balances else [],
-            }
+            if "portfolio_overview" in requested:
+                result["portfolio_overview"] = {
+                    "total_balance_usd": sum(t.get("usd_value", 0) for t in token_balances),
+                    "token_count": len(token_balances),
+                    "nft_count": normalized.get("nft_count", len(normalized.get("nfts", []))),
+                    "top_tokens": token_balances[:5] if token_balances else [],
+                }
             
             # If we don't have indexed data, also build earnings/activity from Helius
-            if result.get("data_source") == "helius":
+            if result.get("data_source") == "helius" and "earnings_spending" in requested:
                 result["earnings_spending"] = {
                     "total_received_usd": 0,
                     "total_sent_usd": 0,
                     "net_flow": 0,
                 }
+            if result.get("data_source") == "helius" and "activity_insights" in requested:
                 result["activity_insights"] = {
-                    "total_transactions": len(enrichment.get("transactions", [])),
+                    "total_transactions": normalized.get("transaction_count", 0),
                     "active_days_count": 0,
                     "monthly_frequency": {},
                     "top_counterparties": normalized.get("top_counterparties", [])[:5],
@@ -180,21 +275,84 @@ async def get_analytics_by_wallet(wallet_address: str) -> Dict[str, Any]:
     except Exception as e:
         print(f"Helius enrichment error: {e}")
         # If Helius fails and we have no indexed data, return minimal structure
-        if result.get("data_source") == "helius" and "portfolio_overview" not in result:
+        if result.get("data_source") == "helius" and helius_sections.isdisjoint(result):
             raise HTTPException(status_code=503, detail="Unable to fetch wallet data. Please try again.")
 
     return result
 
+@app.post("/api/analytics/group")
+async def get_group_analytics(request: GroupAnalyticsRequest) -> Dict[str, Any]:
+    """Combined analytics for several indexed wallets of one user.
+
+    Transfers between the wallets are netted out and shared transactions are
+    counted once. Sections have the same shape as the per-wallet endpoint.
+    """
+    wallets = list(dict.fromkeys(request.wallet_addresses))
+    if not wallets or any(not (32 <= len(w) <= 44) for w in wallets):
+        raise HTTPException(status_code=400, detail="Invalid wallet address")
+    try:
+        requested = parse_sections(request.sections)
+        if request.tz is not None:
+            TimezoneBuckets(request.tz)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    wallet_dbs = {w: os.path.join(DATA_DIR, f"wallet_{w}.db") for w in wallets}
+    missing = [w for w, path in wallet_dbs.items() if not os.path.exists(path)]
+    indexed = {w: path for w, path in wallet_dbs.items() if w not in missing}
+    if not indexed:
+        raise HTTPException(status_code=404, detail="None of these wallets have been indexed yet")
+
+    analyzer = WalletGroupAnalyzer(indexed, timezone=request.tz, sections=requested)
+    result: Dict[str, Any] = {
+        "wallet_addresses": list(indexed),
+        "missing_wallets": missing,
+        "data_source": "indexed",
+    }
+    flight_key = (tuple(sorted(indexed)), request.tz, requested)
+    result.update(await run_in_threadpool(group_flights.do, flight_key, analyzer.analyze))
+    return result
+
+@app.get("/api/analytics/cache/stats")
+async def get_analytics_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters for the in-process analytics result cache."""
+    return analytics_cache.stats()
+
+@app.get("/api/http/stats")
+async def get_http_stats() -> Dict[str, Any]:
+    """Per-host latency, retry and error counters for outbound API calls."""
+    return get_http_client().stats()
+
+@app.get("/api/index/queue/stats")
+async def get_index_queue_stats() -> Dict[str, Any]:
+    """Pending/running jobs, worker count and outcomes of the indexing queue."""
+    return {**index_queue.stats(), "indexer": get_indexer().stats()}
+
+@app.get("/api/rate-limits/stats")
+async def get_rate_limit_stats() -> Dict[str, Any]:
+    """Per-provider quotas and how often outbound calls waited for them in this worker."""
+    return get_rate_limiter().stats()
+
+@app.get("/api/enrichment/cache/stats")
+async def get_enrichment_cache_stats() -> Dict[str, Any]:
+    """Size, hit/miss and eviction counters for the in-memory Helius result cache."""
+    return get_async_client().cache.stats()
+
 @app.get("/api/enrichment/{wallet_address}")
-async def get_enrichment(wallet_address: str) -> Dict[str, Any]:
-    """Get Helius enrichment data for a wallet (token balances, NFTs, labels)."""
+async def get_enrichment(wallet_address: str, full_history: bool = False,
+                         include_raw: bool = False) -> Dict[str, Any]:
+    """Get Helius enrichment data for a wallet (token balances, NFTs, labels).
+
+    With `full_history` all asset and transaction pages are read (up to the
+    configured page cap / time budget) instead of only the latest page.
+    `include_raw` adds the raw DAS and transaction responses of the latest page.
+    """
     if not (32 <= len(wallet_address) <= 44):
         raise HTTPException(status_code=400, detail="Invalid wallet address")
     
     try:
-        client = get_default_client()
-        enrichment = await run_in_threadpool(client.fetch_enrichment, wallet_address)
-        return enrichment
+        return await get_async_client().fetch_enrichment_async(wallet_address, full_history=full_history,
+                                                               include_raw=include_raw)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Enrichment failed: {e}")
 
@@ -220,15 +378,13 @@ async def chat(request: ChatRequest) -> ChatResponse:
 
 @app.get("/api/news")
 async def get_solana_news():
-    import requests
-    
     try:
         url = "https://min-api.cryptocompare.com/data/v2/news/"
         params = {
             "categories": "SOL,Blockchain",
             "lang": "EN"
         }
-        response = requests.get(url, params=params, timeout=10)
+        response = await get_async_http_client().get(url, params=params, timeout=10)
         response.raise_for_status()
         data = response.json()
         
@@ -247,6 +403,11 @@ async def get_solana_news():
         print(f"Error fetching news: {e}")
         return {"news": []}
 
+@app.on_event("shutdown")
+async def close_clients():
+    await get_async_http_client().aclose()
+    get_indexer().shutdown()
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8000))
@@ -0,0 +1,150 @@
+"""
+In-process caches shared by the API services.
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+# Seconds between expiry sweeps of a TTL cache
+SWEEP_INTERVAL_SECONDS = 60.0
+
+
+def approx_size(value: Any) -> int:
+    """Rough deep size in bytes of a JSON-like value (dicts, lists, strings, numbers)."""
+    size = 0
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+    return size
+
+
+class LRUCache:
+    """Thread-safe, bounded LRU map with hit/miss/eviction counters.
+
+    Optionally entries expire after `ttl` seconds (per cache, or per entry via
+    `set(..., ttl=)`), and the total of `sizeof(value)` is kept under
+    `max_bytes`. Expired entries are dropped when read, and all of them are
+    swept out at most every `sweep_interval` seconds on writes, so entries
+    that are never read again do not pin memory.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None,
+                 max_bytes: Optional[int] = None, sizeof: Callable[[Any], int] = approx_size,
+                 sweep_interval: float = SWEEP_INTERVAL_SECONDS):
+        if max_entries < 1:
+            raise ValueError("max_entries must be positive")
+        if max_bytes is not None and max_bytes < 1:
+            raise ValueError("max_bytes must be positive")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.sweep_interval = sweep_interval
+        # key -> (value, expires_at or None, size in bytes)
+        self._store: "OrderedDict[Hashable, Tuple[Any, Optional[float], int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._next_sweep = time.monotonic() + sweep_interval
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Optional[Any]:
+        with self._lock:
+            entry = self._store.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if entry[1] is not None and entry[1] <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._store.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        now = time.monotonic()
+        with self._lock:
+            if key in self._store:
+                self._remove(key)
+            if now >= self._next_sweep:
+                self._sweep(now)
+            if self.max_bytes is not None and size > self.max_bytes:
+                # Would evict everything else and still not fit: do not cache it
+                self.evictions += 1
+                return
+            self._store[key] = (value, now + ttl if ttl is not None else None, size)
+            self._bytes += size
+            while len(self._store) > self.max_entries or (self.max_bytes is not None and self._bytes > self.max_bytes):
+                self._remove(next(iter(self._store)))
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Optional[Any] = None) -> Optional[Any]:
+        with self._lock:
+            if key not in self._store:
+                return default
+            return self._remove(key)[0]
+
+    def sweep(self) -> int:
+        """Drop every expired entry now; returns how many were dropped."""
+        with self._lock:
+            return self._sweep(time.monotonic())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._store.clear()
+            self._bytes = 0
+
+    def keys(self) -> List[Hashable]:
+        """Snapshot of the keys, least recently used first."""
+        with self._lock:
+            return list(self._store)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._store),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _remove(self, key: Hashable) -> Tuple[Any, Optional[float], int]:
+        entry = self._store.pop(key)
+        self._bytes -= entry[2]
+        return entry
+
+    def _sweep(self, now: float) -> int:
+        expired = [key for key, (_, expires_at, _) in self._store.items()
+                   if expires_at is not None and expires_at <= now]
+        for key in expired:
+            self._remove(key)
+        self.expirations += len(expired)
+        self._next_sweep = now + self.sweep_interval
+        return len(expired)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._store.get(key)
+            return entry is not None and (entry[1] is None or entry[1] > time.monotonic())
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._store)
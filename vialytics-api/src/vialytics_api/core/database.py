@@ -2,6 +2,9 @@ import sqlite3
 import os
 from typing import Optional
 
+# Data directory for per-wallet databases, configs and shared on-disk caches
+DATA_DIR = os.environ.get("VIALYTICS_DATA_DIR", "/tmp/vialytics_data")
+
 DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))), "vialytics-core", "wallet.db")
 
 class Database:
@@ -0,0 +1,15 @@
+"""
+Calendar helpers shared by the API services.
+
+Daily data (price history, per-mint flow rollups, the balance timeline) is
+keyed by UTC epoch day: unix time // SECONDS_PER_DAY.
+"""
+import time
+from typing import Optional
+
+SECONDS_PER_DAY = 86400
+
+
+def utc_epoch_day(timestamp: Optional[float] = None) -> int:
+    """UTC epoch day of `timestamp` (unix seconds), or of now."""
+    return int(time.time() if timestamp is None else timestamp) // SECONDS_PER_DAY
@@ -0,0 +1,271 @@
+"""
+Shared outbound HTTP layer.
+
+All calls to Helius, CoinGecko and the news API go through one pooled
+requests.Session (or, from async handlers, one httpx.AsyncClient):
+connections are kept alive per host, so repeated calls skip the TCP + TLS
+handshake. Calls to rate-limited providers first take a token from the
+shared RateLimiter. Throttling (429) and transient failures (5xx, connection
+errors, timeouts) are retried with jittered exponential backoff, honouring
+Retry-After; a 429 also pauses the provider's bucket for every worker.
+Latency is tracked per host.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Mapping, Optional
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from vialytics_api.core.rate_limit import RateLimiter, get_rate_limiter, provider_for_url
+
+# Connections kept alive per host, and how many hosts keep a pool
+HTTP_POOL_SIZE = int(os.environ.get("VIALYTICS_HTTP_POOL_SIZE", "20"))
+HTTP_POOL_HOSTS = int(os.environ.get("VIALYTICS_HTTP_POOL_HOSTS", "10"))
+HTTP_MAX_RETRIES = int(os.environ.get("VIALYTICS_HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_SECONDS = float(os.environ.get("VIALYTICS_HTTP_BACKOFF_SECONDS", "0.5"))
+HTTP_MAX_BACKOFF_SECONDS = float(os.environ.get("VIALYTICS_HTTP_MAX_BACKOFF_SECONDS", "30"))
+# In-flight requests allowed at once from the async client
+HTTP_MAX_CONCURRENCY = int(os.environ.get("VIALYTICS_HTTP_MAX_CONCURRENCY", "32"))
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+logger = logging.getLogger(__name__)
+
+
+def retry_after_seconds(headers: Mapping[str, str]) -> Optional[float]:
+    """Delay requested by a Retry-After header (seconds or HTTP date), if any."""
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HostStats:
+    """Thread-safe per-host request, retry and error counts with latency totals."""
+
+    def __init__(self):
+        self._hosts: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _host(self, host: str) -> Dict[str, float]:
+        stats = self._hosts.get(host)
+        if stats is None:
+            stats = self._hosts[host] = {"requests": 0, "retries": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0}
+        return stats
+
+    def record(self, host: str, start: float, error: bool) -> None:
+        elapsed_ms = (time.monotonic() - start) * 1000
+        with self._lock:
+            stats = self._host(host)
+            stats["requests"] += 1
+            stats["errors"] += int(error)
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        logger.debug(f"HTTP {host}: {elapsed_ms:.0f}ms")
+
+    def record_retry(self, host: str) -> None:
+        with self._lock:
+            self._host(host)["retries"] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                host: {
+                    "requests": s["requests"],
+                    "retries": s["retries"],
+                    "errors": s["errors"],
+                    "avg_ms": round(s["total_ms"] / s["requests"], 1) if s["requests"] else 0.0,
+                    "max_ms": round(s["max_ms"], 1),
+                }
+                for host, s in self._hosts.items()
+            }
+
+
+class _RetryPolicy:
+    """Backoff shared by the sync and async clients."""
+
+    def __init__(self, max_retries: int, backoff: float, max_backoff: float,
+                 host_stats: Optional[HostStats] = None, limiter: Optional[RateLimiter] = None):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.host_stats = host_stats or HostStats()
+        # No limiter: requests go out unthrottled (tests, one-off scripts)
+        self.limiter = limiter
+
+    def _backoff_delay(self, attempt: int) -> float:
+        # "Full jitter": uniform in [0, base * 2^attempt], capped
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    def _status_delay(self, headers: Mapping[str, str], attempt: int) -> float:
+        delay = retry_after_seconds(headers)
+        if delay is None:
+            delay = self._backoff_delay(attempt)
+        return min(delay, self.max_backoff)
+
+    def _throttled(self, provider: Optional[str], delay: float) -> None:
+        if provider and self.limiter:
+            self.limiter.penalize(provider, delay)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per-host request, retry and error counts with average/max latency."""
+        return self.host_stats.snapshot()
+
+
+class HttpClient(_RetryPolicy):
+    """Pooled keep-alive session with retry/backoff and per-host latency stats."""
+
+    def __init__(self, pool_size: int = HTTP_POOL_SIZE, pool_hosts: int = HTTP_POOL_HOSTS,
+                 max_retries: int = HTTP_MAX_RETRIES, backoff: float = HTTP_BACKOFF_SECONDS,
+                 max_backoff: float = HTTP_MAX_BACKOFF_SECONDS, host_stats: Optional[HostStats] = None,
+                 limiter: Optional[RateLimiter] = None):
+        super().__init__(max_retries, backoff, max_backoff, host_stats, limiter)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def request(self, method: str, url: str, max_retries: Optional[int] = None, **kwargs: Any) -> requests.Response:
+        """Send a request, retrying throttled and transient failures.
+
+        Returns the last response (callers still raise_for_status) or raises the
+        last connection error once retries are exhausted. Every call made
+        through this layer is a read, so POSTs (JSON-RPC) are retried too.
+        """
+        retries = self.max_retries if max_retries is None else max_retries
+        host = urlsplit(url).netloc
+        provider = provider_for_url(url) if self.limiter else None
+        attempt = 0
+        while True:
+            if provider:
+                self.limiter.acquire(provider)
+            start = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.host_stats.record(host, start, error=True)
+                if attempt >= retries:
+                    raise
+                delay = self._backoff_delay(attempt)
+                logger.warning(f"HTTP {method} {host} failed ({e.__class__.__name__}), retry in {delay:.2f}s")
+            else:
+                self.host_stats.record(host, start, error=response.status_code >= 400)
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                delay = self._status_delay(response.headers, attempt)
+                if response.status_code == 429:
+                    self._throttled(provider, delay)
+                if attempt >= retries:
+                    return response
+                logger.warning(f"HTTP {method} {host} returned {response.status_code}, retry in {delay:.2f}s")
+                response.close()
+
+            self.host_stats.record_retry(host)
+            time.sleep(delay)
+            attempt += 1
+
+
+class AsyncHttpClient(_RetryPolicy):
+    """httpx.AsyncClient counterpart of HttpClient for async handlers.
+
+    A semaphore caps the requests in flight at once, so a burst of wallets
+    queues here instead of opening unbounded connections.
+    """
+
+    def __init__(self, pool_size: int = HTTP_POOL_SIZE, max_concurrency: int = HTTP_MAX_CONCURRENCY,
+                 max_retries: int = HTTP_MAX_RETRIES, backoff: float = HTTP_BACKOFF_SECONDS,
+                 max_backoff: float = HTTP_MAX_BACKOFF_SECONDS, host_stats: Optional[HostStats] = None,
+                 limiter: Optional[RateLimiter] = None):
+        super().__init__(max_retries, backoff, max_backoff, host_stats, limiter)
+        self.client = httpx.AsyncClient(limits=httpx.Limits(
+            max_connections=max(pool_size, max_concurrency),
+            max_keepalive_connections=pool_size,
+        ))
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def request(self, method: str, url: str, max_retries: Optional[int] = None,
+                      **kwargs: Any) -> httpx.Response:
+        """Async request with the same retry rules as HttpClient.request."""
+        retries = self.max_retries if max_retries is None else max_retries
+        host = urlsplit(url).netloc
+        provider = provider_for_url(url) if self.limiter else None
+        attempt = 0
+        while True:
+            if provider:
+                await self.limiter.acquire_async(provider)
+            async with self.semaphore:
+                start = time.monotonic()
+                try:
+                    response = await self.client.request(method, url, **kwargs)
+                except httpx.TransportError as e:
+                    self.host_stats.record(host, start, error=True)
+                    if attempt >= retries:
+                        raise
+                    delay = self._backoff_delay(attempt)
+                    logger.warning(f"HTTP {method} {host} failed ({e.__class__.__name__}), retry in {delay:.2f}s")
+                else:
+                    self.host_stats.record(host, start, error=response.status_code >= 400)
+                    if response.status_code not in RETRY_STATUSES:
+                        return response
+                    delay = self._status_delay(response.headers, attempt)
+                    if response.status_code == 429:
+                        self._throttled(provider, delay)
+                    if attempt >= retries:
+                        return response
+                    logger.warning(f"HTTP {method} {host} returned {response.status_code}, retry in {delay:.2f}s")
+
+            # Back off outside the semaphore so waiting retries do not hold a slot
+            self.host_stats.record_retry(host)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+_http_client: Optional[HttpClient] = None
+
+
+def get_http_client() -> HttpClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = HttpClient(limiter=get_rate_limiter())
+    return _http_client
+
+
+_async_http_client: Optional[AsyncHttpClient] = None
+
+
+def get_async_http_client() -> AsyncHttpClient:
+    global _async_http_client
+    if _async_http_client is None:
+        # One set of per-host stats for blocking and async calls alike
+        _async_http_client = AsyncHttpClient(host_stats=get_http_client().host_stats, limiter=get_rate_limiter())
+    return _async_http_client
@@ -0,0 +1,259 @@
+"""
+Client-side rate limiting for outbound provider calls.
+
+Each provider (Helius, CoinGecko) has a token bucket: `rate` tokens per second
+refill up to `burst`, and every request takes one. Buckets live in a shared
+SQLite file under DATA_DIR and are updated in short IMMEDIATE transactions, so
+every uvicorn worker and the indexer share one quota. The vialytics-core
+backfill calls Helius itself; the indexer service caps its request rate.
+
+Callers run at a priority: interactive requests may drain a bucket, while
+background indexing and prewarming (stale refreshes) leave part of the burst
+for them. The current priority is a context variable, so code that calls out
+through the HTTP layer does not have to pass it along.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Tuple
+from urllib.parse import urlsplit
+
+from vialytics_api.core.database import DATA_DIR
+
+RATE_LIMIT_DB_PATH = os.environ.get("VIALYTICS_RATE_LIMIT_DB", os.path.join(DATA_DIR, "rate_limits.db"))
+# How long a bucket update waits for another process's write lock before the
+# caller backs off and retries (the transactions themselves take microseconds)
+RATE_LIMIT_BUSY_TIMEOUT_SECONDS = float(os.environ.get("VIALYTICS_RATE_LIMIT_BUSY_TIMEOUT_SECONDS", "0.2"))
+# Back-off before retrying a bucket that stayed locked
+RATE_LIMIT_RETRY_SECONDS = 0.05
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BACKGROUND = "background"
+PRIORITY_PREWARM = "prewarm"
+
+# Share of the burst each priority must leave in the bucket for higher ones
+PRIORITY_RESERVE = {
+    PRIORITY_INTERACTIVE: 0.0,
+    PRIORITY_BACKGROUND: 0.25,
+    PRIORITY_PREWARM: 0.5,
+}
+
+RATE_LIMIT_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS rate_buckets (
+        provider TEXT PRIMARY KEY,
+        tokens REAL NOT NULL,
+        updated_at REAL NOT NULL -- unix time of the last refill
+    )
+"""
+
+logger = logging.getLogger(__name__)
+
+_priority: contextvars.ContextVar[str] = contextvars.ContextVar("rate_limit_priority", default=PRIORITY_INTERACTIVE)
+
+
+class ProviderQuota:
+    """Sustained requests per second and burst size of one provider."""
+
+    def __init__(self, rate: float, burst: float):
+        if rate <= 0 or burst < 1:
+            raise ValueError("A quota needs a positive rate and a burst of at least 1")
+        self.rate = rate
+        self.burst = burst
+
+
+def default_quotas() -> Dict[str, ProviderQuota]:
+    return {
+        "helius": ProviderQuota(
+            float(os.environ.get("HELIUS_RATE_LIMIT_RPS", "10")),
+            float(os.environ.get("HELIUS_RATE_LIMIT_BURST", "20")),
+        ),
+        "coingecko": ProviderQuota(
+            float(os.environ.get("COINGECKO_RATE_LIMIT_PER_MINUTE", "30")) / 60,
+            float(os.environ.get("COINGECKO_RATE_LIMIT_BURST", "5")),
+        ),
+    }
+
+
+def provider_for_url(url: str) -> Optional[str]:
+    """Quota name for a request URL, or None for hosts without a quota."""
+    host = urlsplit(url).hostname or ""
+    if "helius" in host:
+        return "helius"
+    if "coingecko" in host:
+        return "coingecko"
+    return None
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+@contextmanager
+def priority(name: str) -> Iterator[None]:
+    """Run the block's outbound calls at the given priority."""
+    if name not in PRIORITY_RESERVE:
+        raise ValueError(f"Unknown priority: {name}")
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class RateLimiter:
+    """Token buckets per provider, shared across processes through SQLite."""
+
+    def __init__(self, db_path: Optional[str] = None, quotas: Optional[Dict[str, ProviderQuota]] = None):
+        self.db_path = db_path or RATE_LIMIT_DB_PATH
+        self.quotas = default_quotas() if quotas is None else quotas
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with conn:
+                conn.execute(RATE_LIMIT_SCHEMA)
+        finally:
+            conn.close()
+        self._lock = threading.Lock()
+        # One connection per process, shared by its threads under _conn_lock
+        self._conn_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid: Optional[int] = None
+        self.waits: Dict[str, int] = {}
+        self.waited_seconds: Dict[str, float] = {}
+
+    def _connection(self) -> sqlite3.Connection:
+        """This process's connection; call with _conn_lock held."""
+        # A forked worker must not reuse its parent's connection
+        if self._conn is None or self._conn_pid != os.getpid():
+            # Autocommit mode so BEGIN IMMEDIATE takes the write lock up front
+            self._conn = sqlite3.connect(self.db_path, timeout=RATE_LIMIT_BUSY_TIMEOUT_SECONDS,
+                                         isolation_level=None, check_same_thread=False)
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def _max_cost(self, quota: ProviderQuota, priority_name: str) -> float:
+        return quota.burst * (1 - PRIORITY_RESERVE[priority_name])
+
+    def try_acquire(self, provider: str, cost: float = 1, priority_name: Optional[str] = None) -> float:
+        """Take `cost` tokens if the priority allows it now.
+
+        Returns 0 on success, otherwise the seconds to wait before the tokens
+        will be there (nothing is taken).
+        """
+        quota = self.quotas.get(provider)
+        if quota is None:
+            return 0.0
+        priority_name = priority_name or current_priority()
+        cost = min(cost, self._max_cost(quota, priority_name))
+        floor = quota.burst * PRIORITY_RESERVE[priority_name]
+
+        def take(tokens: float) -> Tuple[float, float]:
+            if tokens - cost >= floor:
+                return tokens - cost, 0.0
+            return tokens, (floor + cost - tokens) / quota.rate
+
+        try:
+            return self._update_bucket(provider, quota, take)
+        except sqlite3.OperationalError as e:
+            # Another process holds the bucket: retry shortly rather than block
+            logger.debug(f"{provider} bucket busy: {e}")
+            return RATE_LIMIT_RETRY_SECONDS
+
+    def acquire(self, provider: str, cost: float = 1, priority_name: Optional[str] = None,
+                timeout: Optional[float] = None) -> bool:
+        """Block until the tokens are taken; False if `timeout` seconds pass first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(provider, cost, priority_name)
+            if wait <= 0:
+                self._record_wait(provider, waited)
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                self._record_wait(provider, waited)
+                return False
+            time.sleep(wait)
+            waited += wait
+
+    async def acquire_async(self, provider: str, cost: float = 1, priority_name: Optional[str] = None) -> None:
+        """acquire() for async callers: waits on the event loop instead of blocking it.
+
+        The bucket update is SQLite I/O, so it runs in a worker thread.
+        """
+        priority_name = priority_name or current_priority()
+        waited = 0.0
+        while True:
+            wait = await asyncio.to_thread(self.try_acquire, provider, cost, priority_name)
+            if wait <= 0:
+                self._record_wait(provider, waited)
+                return
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def penalize(self, provider: str, seconds: float) -> None:
+        """Empty the bucket for `seconds` after the provider throttled us, in every process."""
+        quota = self.quotas.get(provider)
+        if quota is None or seconds <= 0:
+            return
+        # Negative tokens: nothing is granted until the bucket has refilled past zero
+        try:
+            self._update_bucket(provider, quota, lambda tokens: (min(tokens, 0.0) - seconds * quota.rate, 0.0))
+        except sqlite3.OperationalError as e:
+            logger.error(f"Could not pause the {provider} bucket: {e}")
+            return
+        logger.warning(f"{provider} throttled us; pausing its bucket for {seconds:.1f}s")
+
+    def _update_bucket(self, provider: str, quota: ProviderQuota,
+                       update: Callable[[float], Tuple[float, float]]) -> float:
+        """Refill the bucket, apply `update(tokens) -> (tokens, result)` atomically, return result."""
+        with self._conn_lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = conn.execute("SELECT tokens, updated_at FROM rate_buckets WHERE provider = ?",
+                                   (provider,)).fetchone()
+                tokens = quota.burst if row is None else min(quota.burst, row[0] + (now - row[1]) * quota.rate)
+                tokens, result = update(tokens)
+                conn.execute("INSERT OR REPLACE INTO rate_buckets (provider, tokens, updated_at) VALUES (?, ?, ?)",
+                             (provider, tokens, now))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def _record_wait(self, provider: str, waited: float) -> None:
+        if waited <= 0:
+            return
+        with self._lock:
+            self.waits[provider] = self.waits.get(provider, 0) + 1
+            self.waited_seconds[provider] = self.waited_seconds.get(provider, 0.0) + waited
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per-provider quota and how often (and how long) calls waited for tokens."""
+        with self._lock:
+            return {
+                provider: {
+                    "rate": quota.rate,
+                    "burst": quota.burst,
+                    "waits": self.waits.get(provider, 0),
+                    "waited_seconds": round(self.waited_seconds.get(provider, 0.0), 3),
+                }
+                for provider, quota in self.quotas.items()
+            }
+
+
+_rate_limiter: Optional[RateLimiter] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter()
+    return _rate_limiter
@@ -0,0 +1,94 @@
+"""
+Single-flight request coalescing.
+
+Concurrent callers asking for the same key share one in-flight call: the first
+caller runs it, the others wait and receive the same result (or exception).
+Nothing is remembered once the call finishes; caching stays the caller's job.
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class _FlightStats:
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self.calls = 0
+        self.shared = 0
+
+    def _count(self, shared: bool) -> None:
+        with self._stats_lock:
+            self.calls += 1
+            self.shared += int(shared)
+
+    def stats(self) -> Dict[str, int]:
+        """Calls made, and how many of them joined a call already in flight."""
+        with self._stats_lock:
+            return {"calls": self.calls, "shared": self.shared, "executed": self.calls - self.shared}
+
+
+class SingleFlight(_FlightStats):
+    """Coalesces concurrent blocking calls across threads."""
+
+    def __init__(self):
+        super().__init__()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def in_flight(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._calls
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        self._count(shared=not leader)
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class AsyncSingleFlight(_FlightStats):
+    """Coalesces concurrent coroutine calls on one event loop."""
+
+    def __init__(self):
+        super().__init__()
+        self._tasks: Dict[Hashable, "asyncio.Task[Any]"] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._tasks
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._tasks.get(key)
+        self._count(shared=task is not None)
+        if task is None:
+            task = self._tasks[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda _, key=key: self._tasks.pop(key, None))
+        # A caller that gives up (e.g. client disconnect) must not cancel the shared call
+        return await asyncio.shield(task)
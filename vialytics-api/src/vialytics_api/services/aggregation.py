@@ -0,0 +1,160 @@
+"""
+Single-pass aggregation engine for wallet analytics.
+
+WalletAggregates folds transactions and token movements into exact integer
+running totals keyed by mint / address. Every analytics section can be built
+from these totals, so the rows are walked once and prices, labels and decimals
+are resolved later, once per distinct key, by WalletAnalyzer. Date-bucketed
+totals live in the rollup tables instead (see rollups.py).
+"""
+from typing import Any, Dict, Iterable, Mapping, Optional
+
+
+def _new_mint_flow() -> Dict[str, Any]:
+    return {
+        "net": 0,        # signed sum of raw amounts (current holdings)
+        "received": 0,   # sum of positive raw amounts
+        "sent": 0,       # sum of absolute negative raw amounts
+        "transfers": 0,  # number of non-zero movements
+        "max_in": 0,     # largest single incoming raw amount
+        "max_out": 0,    # largest single outgoing raw amount (absolute)
+        "max_in_at": None,   # block_time of the earliest movement of max_in
+        "max_out_at": None,  # block_time of the earliest movement of max_out
+    }
+
+
+def earlier(block_time: Optional[int], other: Optional[int]) -> bool:
+    """Whether `block_time` sorts before `other` in ORDER BY block_time (NULL first)."""
+    if block_time is None:
+        return other is not None
+    return other is not None and block_time < other
+
+
+def _fold_max(flow: Dict[str, Any], key: str, amount: int, block_time: Optional[int]) -> None:
+    """Keep the largest amount and, among equal ones, the earliest block_time."""
+    at = key + "_at"
+    if amount > flow[key]:
+        flow[key] = amount
+        flow[at] = block_time
+    elif amount == flow[key] and earlier(block_time, flow[at]):
+        flow[at] = block_time
+
+
+class WalletAggregates:
+    """Running totals for all analytics sections, filled in one pass."""
+
+    def __init__(self):
+        # mint -> flow totals (see _new_mint_flow)
+        self.mint_flows: Dict[str, Dict[str, int]] = {}
+        # mint -> decimals as recorded on the movement rows
+        self.mint_decimals: Dict[str, int] = {}
+        # source address -> mint -> raw amount received from it
+        self.income: Dict[str, Dict[str, int]] = {}
+        # destination address -> number of outgoing movements
+        self.interactions: Dict[str, int] = {}
+
+        self.tx_count = 0
+        self.fee_total = 0
+        self.failed_count = 0
+
+    def add_transactions(self, txs: Iterable[Mapping[str, Any]]) -> None:
+        for tx in txs:
+            self.tx_count += 1
+            self.fee_total += tx["fee"] or 0
+            if not tx["status"]:
+                self.failed_count += 1
+
+    def add_movements(self, movements: Iterable[Mapping[str, Any]]) -> None:
+        mint_flows = self.mint_flows
+        income = self.income
+        interactions = self.interactions
+        mint_decimals = self.mint_decimals
+        for mov in movements:
+            mint = mov["mint"]
+            amount = mov["amount"]
+
+            if mint not in mint_decimals and mov["decimals"] is not None:
+                mint_decimals[mint] = mov["decimals"]
+
+            flow = mint_flows.get(mint)
+            if flow is None:
+                flow = mint_flows[mint] = _new_mint_flow()
+            flow["net"] += amount
+
+            if amount > 0:
+                flow["received"] += amount
+                flow["transfers"] += 1
+                if amount >= flow["max_in"]:
+                    _fold_max(flow, "max_in", amount, mov["block_time"])
+                source = mov["source"]
+                if source:
+                    by_mint = income.get(source)
+                    if by_mint is None:
+                        by_mint = income[source] = {}
+                    by_mint[mint] = by_mint.get(mint, 0) + amount
+            elif amount < 0:
+                flow["sent"] -= amount
+                flow["transfers"] += 1
+                if -amount >= flow["max_out"]:
+                    _fold_max(flow, "max_out", -amount, mov["block_time"])
+                destination = mov["destination"]
+                if destination:
+                    interactions[destination] = interactions.get(destination, 0) + 1
+
+    def merge(self, other: "WalletAggregates") -> None:
+        """Fold another set of totals into this one."""
+        for mint, flow in other.mint_flows.items():
+            mine = self.mint_flows.get(mint)
+            if mine is None:
+                self.mint_flows[mint] = dict(flow)
+                continue
+            for key in ("net", "received", "sent", "transfers"):
+                mine[key] += flow[key]
+            if flow["max_in"] > 0:
+                _fold_max(mine, "max_in", flow["max_in"], flow["max_in_at"])
+            if flow["max_out"] > 0:
+                _fold_max(mine, "max_out", flow["max_out"], flow["max_out_at"])
+
+        for mint, decimals in other.mint_decimals.items():
+            self.mint_decimals.setdefault(mint, decimals)
+
+        for source, by_mint in other.income.items():
+            mine = self.income.setdefault(source, {})
+            for mint, amount in by_mint.items():
+                mine[mint] = mine.get(mint, 0) + amount
+
+        for destination, count in other.interactions.items():
+            self.interactions[destination] = self.interactions.get(destination, 0) + count
+
+        self.tx_count += other.tx_count
+        self.fee_total += other.fee_total
+        self.failed_count += other.failed_count
+
+    def sort_keys(self) -> None:
+        """Order every map by key.
+
+        Backends fill the maps in different orders (first seen, GROUP BY, resumed
+        checkpoints); sorting makes reports and their tie-breaks identical.
+        """
+        self.mint_flows = dict(sorted(self.mint_flows.items()))
+        self.mint_decimals = dict(sorted(self.mint_decimals.items()))
+        self.income = {source: dict(sorted(by_mint.items())) for source, by_mint in sorted(self.income.items())}
+        self.interactions = dict(sorted(self.interactions.items()))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "mint_flows": self.mint_flows,
+            "mint_decimals": self.mint_decimals,
+            "income": self.income,
+            "interactions": self.interactions,
+            "tx_count": self.tx_count,
+            "fee_total": self.fee_total,
+            "failed_count": self.failed_count,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "WalletAggregates":
+        aggregates = cls()
+        for key, value in data.items():
+            setattr(aggregates, key, value)
+        return aggregates
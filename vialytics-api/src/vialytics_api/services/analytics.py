@@ -1,76 +1,340 @@
 import json
+import os
 import sqlite3
-from datetime import datetime
 from collections import defaultdict
-from typing import Dict, List, Any, Optional
+from types import MappingProxyType
+from typing import Dict, List, Any, Optional, Iterable, Iterator, Mapping, Tuple
 
 from vialytics_api.core.database import get_db_connection
-from vialytics_api.services.price_service import get_price_service
-from vialytics_api.services.label_service import get_label_service
+from vialytics_api.core.dates import utc_epoch_day
+from vialytics_api.services.aggregation import WalletAggregates, earlier
+from vialytics_api.services import checkpoint, columnar, pushdown, rollups, timeline
+from vialytics_api.services.price_service import AbstractPriceService, get_price_service
+from vialytics_api.services.label_service import LabelService, get_label_service
+from vialytics_api.services.token_metadata import DEFAULT_DECIMALS, TokenMetadataService, get_token_metadata_service
+
+SOL_MINT = "So11111111111111111111111111111111111111112"
+
+# "python" folds sqlite rows one by one, "numpy" uses the columnar backend
+# and "sql" pushes the aggregations down into SQLite
+ANALYTICS_BACKENDS = ("python", "numpy", "sql")
+DEFAULT_BACKEND = os.environ.get("VIALYTICS_ANALYTICS_BACKEND", "python")
+# Rows pulled from SQLite per fetchmany() call; bounds the rows held in memory
+DEFAULT_CHUNK_SIZE = int(os.environ.get("VIALYTICS_ANALYTICS_CHUNK_SIZE", "10000"))
+# Longest wait for the wallet DB write lock before an incremental analysis
+# computes its results without storing them
+ANALYTICS_LOCK_TIMEOUT_SECONDS = float(os.environ.get("VIALYTICS_ANALYTICS_LOCK_TIMEOUT_SECONDS", "0.5"))
+# Bucket size of total_balance_history; "day" is opt-in per request
+DEFAULT_BALANCE_INTERVAL = os.environ.get("VIALYTICS_BALANCE_INTERVAL", "week")
+
+# Data each report section is built from. analyze() only fetches and resolves
+# what the requested sections need:
+#   transactions / movements - WalletAggregates totals over each table
+#   activity / mint_flow_history - daily/monthly rollups
+#   prices - the price snapshot
+#   mint_labels / income_labels / interaction_labels - label lookups
+SECTION_REQUIREMENTS: Dict[str, frozenset] = {
+    "portfolio_overview": frozenset({"movements", "mint_flow_history", "prices", "mint_labels"}),
+    "earnings_spending": frozenset({"movements", "prices", "mint_labels"}),
+    "token_insights": frozenset({"movements", "mint_labels"}),
+    "activity_insights": frozenset({"transactions", "activity"}),
+    "income_streams": frozenset({"movements", "prices", "income_labels"}),
+    "spending_categories": frozenset({"transactions", "prices"}),
+    "interactions": frozenset({"movements", "interaction_labels"}),
+    "security": frozenset({"transactions"}),
+    "highlights": frozenset(),
+}
+ANALYTICS_SECTIONS = tuple(SECTION_REQUIREMENTS)
+
+
+def parse_sections(sections: Optional[Iterable[str]]) -> Tuple[str, ...]:
+    """Validate a requested section set; None means every section, in report order."""
+    if sections is None:
+        return ANALYTICS_SECTIONS
+    requested = set(sections)
+    unknown = requested - set(ANALYTICS_SECTIONS)
+    if unknown:
+        raise ValueError(f"Unknown analytics sections: {', '.join(sorted(unknown))}")
+    return tuple(section for section in ANALYTICS_SECTIONS if section in requested)
 
 class WalletAnalyzer:
-    def __init__(self, db_path: Optional[str] = None):
+    def __init__(self, db_path: Optional[str] = None,
+                 price_service: Optional[AbstractPriceService] = None,
+                 label_service: Optional[LabelService] = None,
+                 backend: Optional[str] = None,
+                 incremental: bool = False,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 balance_interval: Optional[str] = None,
+                 token_metadata: Optional[TokenMetadataService] = None,
+                 timezone: Optional[str] = None,
+                 sections: Optional[Iterable[str]] = None,
+                 fill_price_history: bool = False):
+        self.backend = backend or DEFAULT_BACKEND
+        if self.backend not in ANALYTICS_BACKENDS:
+            raise ValueError(f"Unknown analytics backend: {self.backend}")
+        if self.backend == "numpy":
+            columnar.require_numpy()
+        # Keep running aggregates in the wallet DB and only fold in new rows
+        self.incremental = incremental
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be positive")
+        self.chunk_size = chunk_size
+        self.balance_interval = balance_interval or DEFAULT_BALANCE_INTERVAL
+        if self.balance_interval not in timeline.BALANCE_INTERVALS:
+            raise ValueError(f"Unknown balance interval: {self.balance_interval}")
+        # Fetch missing price history inline (background jobs); requests only
+        # read the cache and leave the fetch to the price service's workers
+        self.fill_price_history = fill_price_history
+        # IANA name for activity day/month buckets; defaults to server local time
+        self.timezone = rollups.TimezoneBuckets(timezone)
+        self.sections = parse_sections(sections)
+        self._needs = frozenset().union(*(SECTION_REQUIREMENTS[section] for section in self.sections))
+
         self.conn = get_db_connection(db_path)
-        self.price_service = get_price_service()
-        self.label_service = get_label_service()
+        self.price_service = price_service or get_price_service()
+        self.token_metadata = token_metadata or get_token_metadata_service()
+        # Labels read token symbols from the same metadata store
+        self.label_service = label_service or (LabelService(token_metadata) if token_metadata else get_label_service())
+        # Resolved once per distinct mint/address for each analysis
+        self._prices: Mapping[str, float] = MappingProxyType({})
+        self._decimals: Dict[str, int] = {}
+        self._labels: Dict[str, str] = {}
+        self._rollups = rollups.Rollups()
+
+    def close(self) -> None:
+        """Close the wallet DB connection."""
+        self.conn.close()
 
     def analyze(self) -> Dict[str, Any]:
         """Main entry point to generate all analytics categories."""
-        txs = self._fetch_all_transactions()
-        movements = self._fetch_all_token_movements()
-        
-        # Pre-process data
-        tx_map = {tx['signature']: tx for tx in txs}
-        
-        return {
-            "portfolio_overview": self._generate_portfolio_overview(movements),
-            "earnings_spending": self._generate_earnings_spending(movements),
-            "token_insights": self._generate_token_insights(movements),
-            "activity_insights": self._generate_activity_insights(txs),
-            "income_streams": self._generate_income_streams(movements),
-            "spending_categories": self._generate_spending_categories(txs, movements),
-            "interactions": self._generate_interactions(movements),
-            "security": self._generate_security_checks(txs, movements),
-            "highlights": self._generate_highlights(txs, movements)
+        if self.incremental:
+            aggregates, self._rollups = self._sync_incremental()
+        else:
+            aggregates = self._aggregate()
+            self._rollups = self._build_rollups()
+        aggregates.sort_keys()
+        self._resolve_keys(aggregates)
+
+        generators = {
+            "portfolio_overview": self._generate_portfolio_overview,
+            "earnings_spending": self._generate_earnings_spending,
+            "token_insights": self._generate_token_insights,
+            "activity_insights": self._generate_activity_insights,
+            "income_streams": self._generate_income_streams,
+            "spending_categories": self._generate_spending_categories,
+            "interactions": self._generate_interactions,
+            "security": self._generate_security_checks,
+            "highlights": self._generate_highlights,
         }
+        return {section: generators[section](aggregates) for section in self.sections}
 
-    def _fetch_all_transactions(self) -> List[sqlite3.Row]:
-        cur = self.conn.cursor()
-        cur.execute("SELECT * FROM transactions ORDER BY block_time ASC")
-        return cur.fetchall()
+    def _aggregate(self) -> WalletAggregates:
+        return self._aggregate_full(transactions="transactions" in self._needs,
+                                    movements="movements" in self._needs)
+
+    def _rollup_needs(self) -> Tuple[bool, bool]:
+        return "activity" in self._needs, "mint_flow_history" in self._needs
 
-    def _fetch_all_token_movements(self) -> List[sqlite3.Row]:
+    def _build_rollups(self) -> rollups.Rollups:
+        """Daily/monthly rollups grouped in memory, without touching the DB."""
+        activity, mint_flows = self._rollup_needs()
+        if not (activity or mint_flows):
+            return rollups.Rollups()
+        return rollups.build_rollups(self.conn, self.timezone, activity=activity, mint_flows=mint_flows)
+
+    def _sync_incremental(self) -> Tuple[WalletAggregates, rollups.Rollups]:
+        """Checkpointed aggregates and stored rollups, brought up to date together.
+
+        Everything is computed in a read transaction, so the indexer can keep
+        writing meanwhile. The write lock is only taken to store the new
+        checkpoint and rollup rows in one short transaction, and only if no
+        rows (or checkpoint) changed since they were read.
+        """
+        activity, mint_flows = self._rollup_needs()
+        # One read transaction so the high-water marks match the rows we read
+        self.conn.execute("BEGIN")
+        try:
+            movement_id, tx_rowid, slot = checkpoint.high_water_marks(self.conn)
+            marks = checkpoint.checkpoint_marks(self.conn)
+            saved = checkpoint.load_checkpoint(self.conn)
+            current = saved is not None and (saved.last_movement_id, saved.last_tx_rowid) == (movement_id, tx_rowid)
+            if current and rollups.is_current(self.conn, self.timezone, movement_id, tx_rowid,
+                                              activity, mint_flows):
+                stored = rollups.read_rollups(self.conn, self.timezone.name, activity=activity, mint_flows=mint_flows)
+                return saved.aggregates, stored
+            aggregates = self._fold_checkpoint(saved, movement_id, tx_rowid)
+            update = None
+            if activity or mint_flows:
+                update = rollups.plan_rollups(self.conn, self.timezone, movement_id, tx_rowid,
+                                              activity=activity, mint_flows=mint_flows)
+        finally:
+            self.conn.rollback()
+
+        self._store_incremental(aggregates, update, (movement_id, tx_rowid, slot), marks, current)
+        return aggregates, update.rollups if update is not None else rollups.Rollups()
+
+    def _store_incremental(self, aggregates: WalletAggregates, update: Optional[rollups.RollupUpdate],
+                           high_water_marks: Tuple[int, int, Optional[int]],
+                           marks: Optional[Tuple[int, int, int]], current: bool) -> None:
+        """Store a checkpoint and rollup update computed from the given high-water marks.
+
+        Nothing is stored if rows were added since (the next analysis folds
+        them in) or another analysis stored its results first.
+        """
+        movement_id, tx_rowid, slot = high_water_marks
+        try:
+            # A short wait: a busy indexer should not stall the request
+            self.conn.execute(f"PRAGMA busy_timeout = {int(ANALYTICS_LOCK_TIMEOUT_SECONDS * 1000)}")
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                if (checkpoint.high_water_marks(self.conn) != high_water_marks
+                        or checkpoint.checkpoint_marks(self.conn) != marks):
+                    self.conn.rollback()
+                    return
+                if update is not None and not rollups.store_rollups(self.conn, update):
+                    self.conn.rollback()
+                    return
+                if not current:
+                    checkpoint.save_checkpoint(self.conn,
+                                               checkpoint.Checkpoint(aggregates, movement_id, tx_rowid, slot))
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+        except sqlite3.OperationalError as e:
+            # e.g. the indexer holds the write lock; the results are returned without storing them
+            print(f"Could not update analytics checkpoint: {e}")
+
+    def _fold_checkpoint(self, saved: Optional[checkpoint.Checkpoint], movement_id: int,
+                         tx_rowid: int) -> WalletAggregates:
+        """The saved checkpoint plus the rows added since, up to the given high-water marks."""
+        if saved is None or saved.last_movement_id > movement_id or saved.last_tx_rowid > tx_rowid:
+            # No usable checkpoint (or rows were removed): rebuild from scratch
+            return self._aggregate_full()
+        aggregates = saved.aggregates
+        aggregates.add_transactions(self._fetch_transactions_between(saved.last_tx_rowid, tx_rowid))
+        aggregates.add_movements(self._fetch_token_movements_between(saved.last_movement_id, movement_id))
+        return aggregates
+
+    def _aggregate_full(self, transactions: bool = True, movements: bool = True) -> WalletAggregates:
+        """Single pass over each requested table, filling every section's accumulators."""
+        aggregates = WalletAggregates()
+        if transactions:
+            if self.backend == "sql":
+                pushdown.aggregate_transactions(self.conn, aggregates)
+            else:
+                aggregates.add_transactions(self._fetch_all_transactions())
+        if not movements:
+            return aggregates
+        if self.backend == "sql":
+            try:
+                # Raises before touching `aggregates`, so the Python pass can take over
+                pushdown.aggregate_movements(self.conn, aggregates)
+                return aggregates
+            except pushdown.PushdownOverflowError as e:
+                print(f"{e}; using the Python backend")
+        elif self.backend == "numpy":
+            columns = columnar.load_movement_columns(self.conn, chunk_size=self.chunk_size)
+            try:
+                # Raises before touching `aggregates`, so the Python pass can take over
+                columnar.aggregate_movement_columns(columns, aggregates)
+                return aggregates
+            except columnar.ColumnarOverflowError as e:
+                print(f"{e}; using the Python backend")
+        aggregates.add_movements(self._fetch_all_token_movements())
+        return aggregates
+
+    def _stream_rows(self, query: str, params: tuple = ()) -> Iterator[sqlite3.Row]:
+        """Yield query rows chunk by chunk so memory stays flat for any history length."""
         cur = self.conn.cursor()
-        cur.execute("SELECT * FROM token_movements ORDER BY block_time ASC")
-        return cur.fetchall()
+        cur.execute(query, params)
+        try:
+            while True:
+                rows = cur.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cur.close()
 
-    def _generate_portfolio_overview(self, movements: List[sqlite3.Row]) -> Dict[str, Any]:
-        # Calculate current holdings by summing up all movements
-        # Assuming we start from 0
-        holdings = defaultdict(int) 
-        
-        for mov in movements:
-            amount = mov['amount']
-            mint = mov['mint']
-            holdings[mint] += amount
+    def _fetch_all_transactions(self) -> Iterator[sqlite3.Row]:
+        return self._stream_rows("SELECT fee, status, block_time FROM transactions ORDER BY block_time ASC")
+
+    def _fetch_all_token_movements(self) -> Iterator[sqlite3.Row]:
+        return self._stream_rows("SELECT mint, amount, decimals, source, destination, block_time FROM token_movements ORDER BY block_time ASC, id ASC")
+
+    def _fetch_transactions_between(self, after_rowid: int, upto_rowid: int) -> Iterator[sqlite3.Row]:
+        return self._stream_rows(
+            "SELECT fee, status, block_time FROM transactions WHERE rowid > ? AND rowid <= ? ORDER BY rowid",
+            (after_rowid, upto_rowid),
+        )
 
+    def _fetch_token_movements_between(self, after_id: int, upto_id: int) -> Iterator[sqlite3.Row]:
+        return self._stream_rows(
+            "SELECT mint, amount, decimals, source, destination, block_time FROM token_movements WHERE id > ? AND id <= ? ORDER BY id",
+            (after_id, upto_id),
+        )
+
+    def _resolve_keys(self, aggregates: WalletAggregates) -> None:
+        """Look up prices, decimals and labels once per distinct mint/address."""
+        needs = self._needs
+        mints = set(aggregates.mint_flows)
+        if "prices" in needs:
+            # Immutable snapshot: one bulk lookup, every section values at the same prices
+            self._prices = MappingProxyType(dict(self.price_service.get_prices(mints | {SOL_MINT})))
+        if mints:
+            self._decimals = self._resolve_decimals(aggregates, mints)
+
+        addresses = set()
+        if "mint_labels" in needs:
+            addresses |= mints
+        if "income_labels" in needs:
+            addresses |= set(aggregates.income)
+        if "interaction_labels" in needs:
+            addresses |= set(aggregates.interactions)
+        if addresses:
+            self._labels = self.label_service.get_labels(addresses)
+
+    def _resolve_decimals(self, aggregates: WalletAggregates, mints: set) -> Dict[str, int]:
+        """Decimals from the movement rows, then token metadata, then the default."""
+        metadata = self.token_metadata.get_many(mints)
+
+        # Share decimals seen on-chain with other wallets and the label service
+        learned = [
+            {"mint": mint, "decimals": decimals}
+            for mint, decimals in aggregates.mint_decimals.items()
+            if metadata.get(mint, {}).get("decimals") != decimals
+        ]
+        if learned:
+            self.token_metadata.upsert_many(learned)
+
+        decimals = {}
+        for mint in mints:
+            recorded = aggregates.mint_decimals.get(mint)
+            if recorded is None:
+                recorded = metadata.get(mint, {}).get("decimals")
+            decimals[mint] = DEFAULT_DECIMALS if recorded is None else recorded
+        return decimals
+
+    def _ui_amount(self, mint: str, raw_amount: int) -> float:
+        return raw_amount / (10 ** self._decimals[mint])
+
+    def _usd_value(self, mint: str, raw_amount: int) -> float:
+        return self._ui_amount(mint, raw_amount) * self._prices[mint]
+
+    def _generate_portfolio_overview(self, aggregates: WalletAggregates) -> Dict[str, Any]:
+        # Current holdings are the sum of all movements, assuming we start from 0
         total_balance_usd = 0.0
         top_tokens = []
         
-        for mint, raw_amount in holdings.items():
-            # TODO: Get decimals from somewhere. For now assuming based on mint or standard
-            # Ideally decimals should be in token_movements 
-            decimals = 9 if mint == "So11111111111111111111111111111111111111112" else 6 
-            # In real app we need a token metadata service
-            
-            ui_amount = raw_amount / (10 ** decimals)
-            price = self.price_service.get_price(mint)
-            value_usd = ui_amount * price
+        for mint, flow in aggregates.mint_flows.items():
+            ui_amount = self._ui_amount(mint, flow["net"])
+            value_usd = ui_amount * self._prices[mint]
             
             if ui_amount > 0: # Only positive balances
                 total_balance_usd += value_usd
                 top_tokens.append({
-                    "symbol": self.label_service.get_label(mint), # Should use metadata service for symbol
+                    "symbol": self._labels[mint], # Should use metadata service for symbol
                     "amount": ui_amount,
                     "value_usd": value_usd,
                     "share_percent": 0 # Calc later
@@ -85,40 +349,62 @@ class WalletAnalyzer:
 
         return {
             "total_balance_usd": round(total_balance_usd, 2),
-            "total_balance_history": [], # Placeholder for now
+            "total_balance_history": self._generate_balance_history(aggregates),
             "top_tokens": top_tokens[:5]
         }
 
-    def _generate_earnings_spending(self, movements: List[sqlite3.Row]) -> Dict[str, Any]:
+    def _generate_balance_history(self, aggregates: WalletAggregates) -> List[Dict[str, Any]]:
+        daily_mint_flows = self._rollups.daily_mint_flows
+        if not daily_mint_flows:
+            return []
+        first_day = min(daily_mint_flows)
+        end_day = utc_epoch_day()
+        if self.fill_price_history:
+            self.price_service.fill_daily_prices(aggregates.mint_flows, first_day, end_day)
+        daily_prices = self.price_service.get_daily_prices(aggregates.mint_flows, first_day, end_day)
+        return timeline.build_balance_timeline(
+            daily_mint_flows,
+            {mint: self._decimals[mint] for mint in aggregates.mint_flows},
+            self._prices,
+            daily_prices,
+            end_day,
+            self.balance_interval,
+        )
+
+    def _generate_earnings_spending(self, aggregates: WalletAggregates) -> Dict[str, Any]:
         total_received_usd = 0.0
         total_sent_usd = 0.0
         biggest_incoming = {"value": 0, "label": "None"}
         biggest_outgoing = {"value": 0, "label": "None"}
+        # Equal values go to the earliest movement, as in a time-ordered scan
+        incoming_at = outgoing_at = None
         
         tx_count = 0
         total_tx_value = 0
         
-        for mov in movements:
-            amount = mov['amount']
-            mint = mov['mint']
-            decimals = 9 if mint == "So11111111111111111111111111111111111111112" else 6
-            price = self.price_service.get_price(mint)
-            
-            ui_amount = abs(amount) / (10 ** decimals)
-            usd_value = ui_amount * price
+        for mint, flow in aggregates.mint_flows.items():
+            received_usd = self._usd_value(mint, flow["received"])
+            sent_usd = self._usd_value(mint, flow["sent"])
+            total_received_usd += received_usd
+            total_sent_usd += sent_usd
             
-            if usd_value > 0:
-                total_tx_value += usd_value
-                tx_count += 1
+            # Only movements with a USD value count towards the average size
+            if self._prices[mint] > 0:
+                total_tx_value += received_usd + sent_usd
+                tx_count += flow["transfers"]
             
-            if amount > 0:
-                total_received_usd += usd_value
-                if usd_value > biggest_incoming['value']:
-                    biggest_incoming = {"value": usd_value, "label": f"Received {self.label_service.get_label(mint)}"}
-            elif amount < 0:
-                total_sent_usd += usd_value
-                if usd_value > biggest_outgoing['value']:
-                    biggest_outgoing = {"value": usd_value, "label": f"Sent {self.label_service.get_label(mint)}"}
+            incoming_usd = self._usd_value(mint, flow["max_in"])
+            if incoming_usd > biggest_incoming['value'] or (
+                    incoming_usd > 0 and incoming_usd == biggest_incoming['value']
+                    and earlier(flow["max_in_at"], incoming_at)):
+                biggest_incoming = {"value": incoming_usd, "label": f"Received {self._labels[mint]}"}
+                incoming_at = flow["max_in_at"]
+            outgoing_usd = self._usd_value(mint, flow["max_out"])
+            if outgoing_usd > biggest_outgoing['value'] or (
+                    outgoing_usd > 0 and outgoing_usd == biggest_outgoing['value']
+                    and earlier(flow["max_out_at"], outgoing_at)):
+                biggest_outgoing = {"value": outgoing_usd, "label": f"Sent {self._labels[mint]}"}
+                outgoing_at = flow["max_out_at"]
 
         return {
             "total_received_usd": round(total_received_usd, 2),
@@ -129,117 +415,82 @@ class WalletAnalyzer:
             "average_transaction_size": round(total_tx_value / tx_count, 2) if tx_count > 0 else 0
         }
 
-    def _generate_token_insights(self, movements: List[sqlite3.Row]) -> List[Dict[str, Any]]:
+    def _generate_token_insights(self, aggregates: WalletAggregates) -> List[Dict[str, Any]]:
         # Simplified token insights
-        # Focusing on top tokens
-        tokens_map = defaultdict(lambda: {"received": 0, "sent": 0, "balance": 0})
-        
-        for mov in movements:
-            mint = mov['mint']
-            amount = mov['amount']
-            # Again, assuming decimals...
-            decimals = 9 if mint == "So11111111111111111111111111111111111111112" else 6
-            ui_amount = amount / (10 ** decimals)
-            
-            tokens_map[mint]["balance"] += ui_amount
-            if ui_amount > 0:
-                tokens_map[mint]["received"] += ui_amount
-            else:
-                tokens_map[mint]["sent"] += abs(ui_amount)
-                
         results = []
-        for mint, data in tokens_map.items():
-            if data['balance'] > 0 or data['received'] > 0:
+        for mint, flow in aggregates.mint_flows.items():
+            if flow['net'] > 0 or flow['received'] > 0:
                 results.append({
-                    "token": self.label_service.get_label(mint),
+                    "token": self._labels[mint],
                     "mint": mint,
-                    "current_holdings": data['balance'],
-                    "total_received": data['received'],
-                    "total_sent": data['sent']
+                    "current_holdings": self._ui_amount(mint, flow['net']),
+                    "total_received": self._ui_amount(mint, flow['received']),
+                    "total_sent": self._ui_amount(mint, flow['sent'])
                 })
         return results
 
-    def _generate_activity_insights(self, txs: List[sqlite3.Row]) -> Dict[str, Any]:
-        if not txs:
+    def _generate_activity_insights(self, aggregates: WalletAggregates) -> Dict[str, Any]:
+        daily = self._rollups.daily_activity
+        if not aggregates.tx_count or not daily:
             return {}
-            
-        timestamps = [tx['block_time'] for tx in txs if tx['block_time']]
-        if not timestamps:
-            return {}
-            
-        first_date = datetime.fromtimestamp(min(timestamps))
-        last_date = datetime.fromtimestamp(max(timestamps))
-        
-        # Active days
-        active_days = set(datetime.fromtimestamp(ts).date() for ts in timestamps)
-        
-        # Monthly frequency
-        months = defaultdict(int)
-        for ts in timestamps:
-            dt = datetime.fromtimestamp(ts)
-            months[dt.strftime("%Y-%m")] += 1
-            
+
+        # Read from the rollups, already bucketed in self.timezone
+        days = sorted(daily)
         return {
-            "total_transactions": len(txs),
-            "first_activity": first_date.strftime("%Y-%m-%d"),
-            "last_activity": last_date.strftime("%Y-%m-%d"),
-            "active_days_count": len(active_days),
-            "monthly_frequency": dict(months)
+            "total_transactions": aggregates.tx_count,
+            "first_activity": days[0],
+            "last_activity": days[-1],
+            "active_days_count": len(days),
+            "monthly_frequency": {
+                month: totals["tx_count"] for month, totals in sorted(self._rollups.monthly_activity.items())
+            }
         }
 
-    def _generate_income_streams(self, movements: List[sqlite3.Row]) -> Dict[str, Any]:
+    def _generate_income_streams(self, aggregates: WalletAggregates) -> Dict[str, Any]:
         # Heuristic: Check source of incoming funds
         sources = defaultdict(float)
         
-        for mov in movements:
-            if mov['amount'] > 0 and mov['source']:
-                label = self.label_service.get_label(mov['source'])
-                mint = mov['mint']
-                decimals = 9 if mint == "So11111111111111111111111111111111111111112" else 6
-                price = self.price_service.get_price(mint)
-                value = (mov['amount'] / (10**decimals)) * price
-                sources[label] += value
+        for source, by_mint in aggregates.income.items():
+            label = self._labels[source]
+            for mint, raw_amount in by_mint.items():
+                sources[label] += self._usd_value(mint, raw_amount)
                 
         sorted_sources = sorted(sources.items(), key=lambda x: x[1], reverse=True)
         return {
             "top_income_sources": [{"source": k, "value_usd": round(v, 2)} for k, v in sorted_sources[:5]]
         }
 
-    def _generate_spending_categories(self, txs: List[sqlite3.Row], movements: List[sqlite3.Row]) -> Dict[str, Any]:
+    def _generate_spending_categories(self, aggregates: WalletAggregates) -> Dict[str, Any]:
         # Simple heuristic mapping
         categories = defaultdict(float)
         
         # Fee calculation
-        total_fees = sum(tx['fee'] for tx in txs) / 10**9 * self.price_service.get_price("So11111111111111111111111111111111111111112")
+        total_fees = aggregates.fee_total / 10**9 * self._prices[SOL_MINT]
         categories["Network Fees"] = total_fees
         
         return {
             "top_spending_categories": [{"category": k, "value_usd": round(v, 2)} for k, v in categories.items()]
         }
 
-    def _generate_interactions(self, movements: List[sqlite3.Row]) -> Dict[str, Any]:
+    def _generate_interactions(self, aggregates: WalletAggregates) -> Dict[str, Any]:
         interactions = defaultdict(int)
-        for mov in movements:
-            if mov['amount'] < 0 and mov['destination']:
-                 label = self.label_service.get_label(mov['destination'])
-                 interactions[label] += 1
+        for destination, count in aggregates.interactions.items():
+            interactions[self._labels[destination]] += count
                  
         sorted_interactions = sorted(interactions.items(), key=lambda x: x[1], reverse=True)
         return {
             "top_apps_platforms": [{"name": k, "count": v} for k, v in sorted_interactions[:5]]
         }
 
-    def _generate_security_checks(self, txs: List[sqlite3.Row], movements: List[sqlite3.Row]) -> Dict[str, Any]:
-        failed_txs = len([tx for tx in txs if not tx['status']])
+    def _generate_security_checks(self, aggregates: WalletAggregates) -> Dict[str, Any]:
+        failed_txs = aggregates.failed_count
         return {
             "failed_transactions_count": failed_txs,
             "security_score": "High" if failed_txs < 5 else "Medium"
         }
 
-    def _generate_highlights(self, txs: List[sqlite3.Row], movements: List[sqlite3.Row]) -> Dict[str, str]:
+    def _generate_highlights(self, aggregates: WalletAggregates) -> Dict[str, str]:
         return {
             "wallet_personality": "Hodler", # Placeholder logic
             "top_moment": "You made your biggest trade!"
         }
-
-import sqlite3
@@ -0,0 +1,119 @@
+"""
+In-process cache of WalletAnalyzer results keyed by wallet DB version.
+
+A wallet DB's version is the mtime/size of the DB and its WAL file plus the
+latest movement id, transaction rowid and slot. Any indexer write changes it,
+so cached results invalidate themselves without the indexer having to notify
+the API. A short max age keeps price-dependent sections from going stale on
+wallets that stop receiving new rows.
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from vialytics_api.core.cache import LRUCache
+from vialytics_api.core.singleflight import SingleFlight
+from vialytics_api.services import checkpoint
+
+ANALYTICS_CACHE_MAX_ENTRIES = int(os.environ.get("VIALYTICS_ANALYTICS_CACHE_SIZE", "256"))
+ANALYTICS_CACHE_MAX_AGE = float(os.environ.get("VIALYTICS_ANALYTICS_CACHE_MAX_AGE", "300"))
+
+
+def _file_signature(path: str) -> Tuple[int, int]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return 0, 0
+    return st.st_mtime_ns, st.st_size
+
+
+def wallet_db_version(db_path: str) -> Tuple:
+    """(db mtime, db size, wal mtime, wal size, movement id, tx rowid, slot)."""
+    files = _file_signature(db_path) + _file_signature(db_path + "-wal")
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        marks = checkpoint.high_water_marks(conn)
+    except sqlite3.OperationalError:
+        marks = (0, 0, None)  # Tables not created yet
+    finally:
+        conn.close()
+    return files + tuple(marks)
+
+
+class AnalyticsResultCache:
+    """Bounded LRU of analysis results, one entry per (wallet DB, options)."""
+
+    def __init__(self, max_entries: int = ANALYTICS_CACHE_MAX_ENTRIES,
+                 max_age_seconds: float = ANALYTICS_CACHE_MAX_AGE):
+        self.max_age_seconds = max_age_seconds
+        self._results = LRUCache(max_entries)
+        # Concurrent misses for the same wallet, options and version share one analysis
+        self._flights = SingleFlight()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def get_or_compute(self, db_path: str, compute: Callable[[], Dict[str, Any]],
+                       options: Hashable = ()) -> Dict[str, Any]:
+        """Return the cached result for the DB's current version, else compute and store it."""
+        key = (os.path.abspath(db_path), options)
+        version = wallet_db_version(db_path)
+        entry = self._results.get(key)
+        if entry is not None:
+            cached_version, stored_at, result = entry
+            if cached_version == version and time.time() - stored_at <= self.max_age_seconds:
+                self._count("hits")
+                return result
+            self._count("stale")
+        self._count("misses")
+
+        def compute_and_store() -> Dict[str, Any]:
+            result = compute()
+            # An incremental analysis writes its checkpoint back, which moves the
+            # file mtime. Store under the post-analysis version as long as no new
+            # rows were indexed while we were computing.
+            after = wallet_db_version(db_path)
+            if after[4:] == version[4:]:
+                self._results.set(key, (after, time.time(), result))
+            return result
+
+        return self._flights.do((key, version), compute_and_store)
+
+    def invalidate(self, db_path: str) -> None:
+        path = os.path.abspath(db_path)
+        for key in [k for k in self._results.keys() if k[0] == path]:
+            self._results.pop(key)
+
+    def clear(self) -> None:
+        self._results.clear()
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        lru = self._results.stats()
+        return {
+            "entries": lru["entries"],
+            "max_entries": lru["max_entries"],
+            "evictions": lru["evictions"],
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "coalesced": self._flights.stats()["shared"],
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+_analytics_cache: Optional[AnalyticsResultCache] = None
+
+
+def get_analytics_cache() -> AnalyticsResultCache:
+    global _analytics_cache
+    if _analytics_cache is None:
+        _analytics_cache = AnalyticsResultCache()
+    return _analytics_cache
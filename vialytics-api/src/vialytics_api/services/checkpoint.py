@@ -0,0 +1,90 @@
+"""
+Persisted analytics checkpoints for incremental re-analysis.
+
+The running WalletAggregates of a wallet are stored in its own DB together
+with the high-water marks of the rows they cover. Later runs load the
+checkpoint and only fold in rows inserted after it.
+
+Rows are tracked by insertion order (token_movements.id, transactions.rowid)
+rather than by slot, because the history backfill inserts older slots after
+newer ones.
+"""
+import json
+import sqlite3
+import time
+from typing import Optional, Tuple
+
+from vialytics_api.services.aggregation import WalletAggregates
+
+# Bump when the shape of WalletAggregates changes to force a full rebuild
+CHECKPOINT_VERSION = 5
+
+CHECKPOINT_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS analytics_checkpoint (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL,
+        last_movement_id INTEGER NOT NULL,
+        last_tx_rowid INTEGER NOT NULL,
+        last_slot INTEGER,
+        aggregates_json TEXT NOT NULL,
+        updated_at INTEGER NOT NULL
+    )
+"""
+
+
+class Checkpoint:
+    def __init__(self, aggregates: WalletAggregates, last_movement_id: int, last_tx_rowid: int,
+                 last_slot: Optional[int] = None):
+        self.aggregates = aggregates
+        self.last_movement_id = last_movement_id
+        self.last_tx_rowid = last_tx_rowid
+        self.last_slot = last_slot
+
+
+def high_water_marks(conn: sqlite3.Connection) -> Tuple[int, int, Optional[int]]:
+    """Latest movement id, transaction rowid and slot currently in the DB."""
+    movement_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM token_movements").fetchone()[0]
+    tx_rowid, slot = conn.execute("SELECT COALESCE(MAX(rowid), 0), MAX(slot) FROM transactions").fetchone()
+    return movement_id, tx_rowid, slot
+
+
+def checkpoint_marks(conn: sqlite3.Connection) -> Optional[Tuple[int, int, int]]:
+    """(version, last_movement_id, last_tx_rowid) of the stored checkpoint, without loading it."""
+    try:
+        return conn.execute(
+            "SELECT version, last_movement_id, last_tx_rowid FROM analytics_checkpoint WHERE id = 1"
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None  # No checkpoint table yet
+
+
+def load_checkpoint(conn: sqlite3.Connection) -> Optional[Checkpoint]:
+    try:
+        row = conn.execute(
+            "SELECT version, last_movement_id, last_tx_rowid, last_slot, aggregates_json "
+            "FROM analytics_checkpoint WHERE id = 1"
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None  # No checkpoint table yet
+    if not row or row[0] != CHECKPOINT_VERSION:
+        return None
+    _, last_movement_id, last_tx_rowid, last_slot, aggregates_json = row
+    aggregates = WalletAggregates.from_dict(json.loads(aggregates_json))
+    return Checkpoint(aggregates, last_movement_id, last_tx_rowid, last_slot)
+
+
+def save_checkpoint(conn: sqlite3.Connection, checkpoint: Checkpoint) -> None:
+    conn.execute(CHECKPOINT_SCHEMA)
+    conn.execute(
+        "INSERT OR REPLACE INTO analytics_checkpoint "
+        "(id, version, last_movement_id, last_tx_rowid, last_slot, aggregates_json, updated_at) "
+        "VALUES (1, ?, ?, ?, ?, ?, ?)",
+        (
+            CHECKPOINT_VERSION,
+            checkpoint.last_movement_id,
+            checkpoint.last_tx_rowid,
+            checkpoint.last_slot,
+            json.dumps(checkpoint.aggregates.to_dict()),
+            int(time.time()),
+        ),
+    )
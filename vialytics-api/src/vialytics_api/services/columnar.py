@@ -0,0 +1,189 @@
+"""
+NumPy columnar backend for token_movements analytics.
+
+Movements are loaded into typed column arrays, with mints and addresses
+dictionary-encoded to integer codes in first-seen order. Per-mint flows,
+income-by-source and interaction counts are then
+computed with vectorized group-bys and written into a WalletAggregates, so
+the result is identical to the pure-Python pass. Sums are int64, so a wallet
+whose per-mint totals could overflow them raises ColumnarOverflowError and is
+left to the Python pass. Install with: pip install numpy
+"""
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from vialytics_api.services.aggregation import WalletAggregates, _new_mint_flow
+
+MOVEMENT_COLUMNS_QUERY = (
+    "SELECT mint, amount, decimals, source, destination, block_time "
+    "FROM token_movements ORDER BY block_time ASC, id ASC"
+)
+DEFAULT_CHUNK_SIZE = 50_000
+# Per-mint sum of absolute raw amounts above which int64 sums might wrap;
+# kept well below 2**63 to absorb float64 rounding
+INT64_SAFE_TOTAL = 2.0 ** 62
+# Stand-in for a NULL block_time; the smallest value, as NULLs sort first
+NULL_TIME = -(2 ** 63)
+
+
+class ColumnarOverflowError(ArithmeticError):
+    """Raw amounts too large to be summed exactly in int64."""
+
+
+def require_numpy() -> None:
+    if np is None:
+        raise ImportError("The numpy analytics backend requires numpy. Run: pip install numpy")
+
+
+class MovementColumns:
+    """token_movements as typed column arrays plus their code dictionaries."""
+
+    def __init__(self, mint, amount, decimals, source, destination, block_time,
+                 mints: List[str], addresses: List[str]):
+        self.mint = mint                # int32 code into `mints`
+        self.amount = amount            # int64 raw amount
+        self.decimals = decimals        # int16, -1 when unknown
+        self.source = source            # int32 code into `addresses`, -1 when NULL or empty
+        self.destination = destination  # int32 code into `addresses`, -1 when NULL or empty
+        self.block_time = block_time    # int64, NULL_TIME when NULL
+        self.mints = mints
+        self.addresses = addresses
+
+    def __len__(self) -> int:
+        return len(self.amount)
+
+
+def load_movement_columns(conn: sqlite3.Connection, chunk_size: int = DEFAULT_CHUNK_SIZE) -> MovementColumns:
+    """Read token_movements chunk by chunk into dictionary-encoded columns."""
+    require_numpy()
+    mint_codes: Dict[str, int] = {}
+    address_codes: Dict[str, int] = {}
+
+    def address_code(address: Optional[str]) -> int:
+        # No address (NULL or empty) is -1, skipped like the Python pass does
+        return address_codes.setdefault(address, len(address_codes)) if address else -1
+
+    chunks: Dict[str, list] = {name: [] for name in ("mint", "amount", "decimals", "source", "destination",
+                                                     "block_time")}
+
+    cur = conn.cursor()
+    cur.execute(MOVEMENT_COLUMNS_QUERY)
+    while True:
+        rows = cur.fetchmany(chunk_size)
+        if not rows:
+            break
+        mint, amount, decimals, source, destination, block_time = zip(*rows)
+        chunks["mint"].append(np.fromiter(
+            (mint_codes.setdefault(m, len(mint_codes)) for m in mint), np.int32, len(rows)))
+        chunks["amount"].append(np.fromiter(amount, np.int64, len(rows)))
+        chunks["decimals"].append(np.fromiter(
+            (-1 if d is None else d for d in decimals), np.int16, len(rows)))
+        chunks["source"].append(np.fromiter(
+            (address_code(a) for a in source), np.int32, len(rows)))
+        chunks["destination"].append(np.fromiter(
+            (address_code(a) for a in destination), np.int32, len(rows)))
+        chunks["block_time"].append(np.fromiter(
+            (NULL_TIME if t is None else t for t in block_time), np.int64, len(rows)))
+
+    dtypes = {"mint": np.int32, "amount": np.int64, "decimals": np.int16,
+              "source": np.int32, "destination": np.int32, "block_time": np.int64}
+    columns = {
+        name: np.concatenate(parts) if parts else np.empty(0, dtypes[name])
+        for name, parts in chunks.items()
+    }
+    return MovementColumns(
+        mints=list(mint_codes),
+        addresses=list(address_codes),
+        **columns,
+    )
+
+
+def _first_seen_groups(keys) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Unique keys ordered by first occurrence, plus each row's group index."""
+    unique, first_index, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    order = np.argsort(first_index, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return unique[order], rank[inverse]
+
+
+def _earliest_at(columns: MovementColumns, rows, values, maxima) -> List:
+    """Per mint, the earliest block_time of the `rows` whose value equals the mint's maximum."""
+    hit = rows & (values == maxima[columns.mint])
+    at = np.full(len(columns.mints), np.iinfo(np.int64).max, np.int64)
+    np.minimum.at(at, columns.mint[hit], columns.block_time[hit])
+    no_rows = np.iinfo(np.int64).max
+    return [None if t in (NULL_TIME, no_rows) else t for t in at.tolist()]
+
+
+def aggregate_movement_columns(columns: MovementColumns, aggregates: WalletAggregates) -> None:
+    """Fill the movement totals of `aggregates` with vectorized group-bys."""
+    require_numpy()
+    n_mints = len(columns.mints)
+    mint, amount = columns.mint, columns.amount
+
+    # Every int64 sum below (net, received, sent, income) is bounded by the
+    # mint's total absolute amount, estimated in float64 which cannot wrap
+    magnitude = np.zeros(n_mints, np.float64)
+    np.add.at(magnitude, mint, np.abs(amount.astype(np.float64)))
+    if n_mints and magnitude.max() >= INT64_SAFE_TOTAL:
+        raise ColumnarOverflowError("Token amounts exceed the int64 range of the numpy backend")
+    incoming = amount > 0
+    outgoing = amount < 0
+
+    net = np.zeros(n_mints, np.int64)
+    np.add.at(net, mint, amount)
+    received = np.zeros(n_mints, np.int64)
+    np.add.at(received, mint[incoming], amount[incoming])
+    sent = np.zeros(n_mints, np.int64)
+    np.add.at(sent, mint[outgoing], -amount[outgoing])
+    transfers = np.bincount(mint[incoming | outgoing], minlength=n_mints)
+    max_in = np.zeros(n_mints, np.int64)
+    np.maximum.at(max_in, mint[incoming], amount[incoming])
+    max_out = np.zeros(n_mints, np.int64)
+    np.maximum.at(max_out, mint[outgoing], -amount[outgoing])
+
+    max_in_at = _earliest_at(columns, incoming, amount, max_in)
+    max_out_at = _earliest_at(columns, outgoing, -amount, max_out)
+
+    totals = zip(net.tolist(), received.tolist(), sent.tolist(), transfers.tolist(),
+                 max_in.tolist(), max_out.tolist(), max_in_at, max_out_at)
+    for code, (n, r, s, t, mi, mo, mi_at, mo_at) in enumerate(totals):
+        flow = _new_mint_flow()
+        flow.update(net=n, received=r, sent=s, transfers=t, max_in=mi, max_out=mo,
+                    max_in_at=mi_at, max_out_at=mo_at)
+        aggregates.mint_flows[columns.mints[code]] = flow
+
+    # Decimals: first recorded value per mint
+    has_decimals = columns.decimals >= 0
+    if has_decimals.any():
+        codes, first_index = np.unique(mint[has_decimals], return_index=True)
+        recorded = columns.decimals[has_decimals][first_index]
+        for code, decimals in zip(codes.tolist(), recorded.tolist()):
+            aggregates.mint_decimals.setdefault(columns.mints[code], decimals)
+
+    # Income: sum of incoming amounts per (source, mint)
+    has_source = incoming & (columns.source >= 0)
+    if has_source.any():
+        pair_keys = columns.source[has_source].astype(np.int64) * n_mints + mint[has_source]
+        pairs, group = _first_seen_groups(pair_keys)
+        sums = np.zeros(len(pairs), np.int64)
+        np.add.at(sums, group, amount[has_source])
+        for key, total in zip(pairs.tolist(), sums.tolist()):
+            source, mint_code = divmod(key, n_mints)
+            by_mint = aggregates.income.setdefault(columns.addresses[source], {})
+            by_mint[columns.mints[mint_code]] = total
+
+    # Interactions: number of outgoing movements per destination
+    has_destination = outgoing & (columns.destination >= 0)
+    if has_destination.any():
+        destinations, group = _first_seen_groups(columns.destination[has_destination])
+        counts = np.bincount(group, minlength=len(destinations))
+        for code, count in zip(destinations.tolist(), counts.tolist()):
+            aggregates.interactions[columns.addresses[code]] = count
+
@@ -0,0 +1,89 @@
+"""
+Disk-persisted store of Helius enrichment results.
+
+Results are kept as JSON per cache key in a shared SQLite file under
+DATA_DIR, so a restarted API process starts warm. Entries younger than the
+soft TTL are fresh; entries between the soft and hard TTL are stale and may be
+served while a refresh runs in the background; older entries are ignored and
+purged on the next write.
+"""
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from vialytics_api.core.database import DATA_DIR
+
+ENRICHMENT_DB_PATH = os.environ.get("VIALYTICS_ENRICHMENT_DB", os.path.join(DATA_DIR, "enrichment.db"))
+ENRICHMENT_SOFT_TTL_SECONDS = float(os.environ.get("HELIUS_ENRICHMENT_SOFT_TTL_SECONDS", "300"))
+ENRICHMENT_HARD_TTL_SECONDS = float(os.environ.get("HELIUS_ENRICHMENT_HARD_TTL_SECONDS", "86400"))
+
+ENRICHMENT_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS enrichment (
+        cache_key TEXT PRIMARY KEY,
+        stored_at REAL NOT NULL, -- unix time of the fetch
+        payload TEXT NOT NULL -- JSON result
+    );
+    CREATE INDEX IF NOT EXISTS idx_enrichment_stored_at ON enrichment(stored_at);
+"""
+
+
+class EnrichmentStore:
+    """Enrichment results by cache key with soft/hard TTLs, backed by SQLite."""
+
+    def __init__(self, db_path: Optional[str] = None, soft_ttl: float = ENRICHMENT_SOFT_TTL_SECONDS,
+                 hard_ttl: float = ENRICHMENT_HARD_TTL_SECONDS):
+        if hard_ttl < soft_ttl:
+            raise ValueError("hard_ttl must be at least soft_ttl")
+        self.db_path = db_path or ENRICHMENT_DB_PATH
+        self.soft_ttl = soft_ttl
+        self.hard_ttl = hard_ttl
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(ENRICHMENT_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # Short-lived connections: the store is shared by threadpool workers
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def get(self, cache_key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """(result, age in seconds) for an entry younger than the hard TTL, else None."""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT stored_at, payload FROM enrichment WHERE cache_key = ? AND stored_at > ?",
+                (cache_key, time.time() - self.hard_ttl),
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        stored_at, payload = row
+        return json.loads(payload), max(0.0, time.time() - stored_at)
+
+    def is_fresh(self, age: float) -> bool:
+        return age < self.soft_ttl
+
+    def put(self, cache_key: str, result: Dict[str, Any]) -> None:
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO enrichment (cache_key, stored_at, payload) VALUES (?, ?, ?)",
+                    (cache_key, now, json.dumps(result)),
+                )
+                conn.execute("DELETE FROM enrichment WHERE stored_at <= ?", (now - self.hard_ttl,))
+        finally:
+            conn.close()
+
+
+_enrichment_store: Optional[EnrichmentStore] = None
+
+
+def get_enrichment_store() -> EnrichmentStore:
+    global _enrichment_store
+    if _enrichment_store is None:
+        _enrichment_store = EnrichmentStore()
+    return _enrichment_store
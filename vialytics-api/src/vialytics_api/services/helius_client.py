@@ -4,53 +4,212 @@ Uses correct Helius API endpoints:
 - Base: https://api-mainnet.helius-rpc.com  
 - DAS: JSON-RPC methods (getAssetsByOwner)
 - Transactions: /v0/addresses/{address}/transactions
+
+HeliusClient is blocking (CLI, indexer); AsyncHeliusClient serves the async
+API handlers and fetches the asset and transaction streams concurrently.
 """
+import asyncio
 import os
+import threading
 import time
 import logging
-from typing import Any, Dict, List, Optional
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Set, Tuple
 
+import httpx
 import requests
 
-from vialytics_api.services.label_service import get_label_service
+from vialytics_api.core.cache import LRUCache
+from vialytics_api.core.rate_limit import PRIORITY_PREWARM, priority
+from vialytics_api.core.http import AsyncHttpClient, HttpClient, get_async_http_client, get_http_client
+from vialytics_api.core.singleflight import AsyncSingleFlight, SingleFlight
+from vialytics_api.services.enrichment_store import EnrichmentStore, get_enrichment_store
+from vialytics_api.services.label_service import LabelService, get_label_service
+from vialytics_api.services.token_metadata import TokenMetadataService, get_token_metadata_service
 
 HELIUS_API_KEY = os.environ.get("HELIUS_API_KEY")
 # 0xAbim: correct Helius base URL
 HELIUS_BASE = os.environ.get("HELIUS_ORB_URL", "https://mainnet.helius-rpc.com")
 
+# Page sizes are the API maximums
+ASSETS_PAGE_LIMIT = 1000
+TRANSACTIONS_PAGE_LIMIT = 100
+# Caps for full-history fetches: pages per source and a wall-clock budget
+HELIUS_MAX_PAGES = int(os.environ.get("HELIUS_MAX_PAGES", "50"))
+HELIUS_FETCH_BUDGET_SECONDS = float(os.environ.get("HELIUS_FETCH_BUDGET_SECONDS", "20"))
+NFT_PREVIEW_LIMIT = 10
+# Enrichment results cached in memory: entry count, total size and freshness
+HELIUS_CACHE_MAX_ENTRIES = int(os.environ.get("HELIUS_CACHE_MAX_ENTRIES", "256"))
+HELIUS_CACHE_MAX_BYTES = int(os.environ.get("HELIUS_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+HELIUS_CACHE_TTL_SECONDS = float(os.environ.get("HELIUS_CACHE_TTL_SECONDS", "300"))
+
+# Protocol name mapping for cleaner display
+PROTOCOL_LABELS = {
+    "JUPITER": "Jupiter",
+    "JUPITER_V6": "Jupiter",
+    "RAYDIUM": "Raydium",
+    "ORCA": "Orca",
+    "MARINADE": "Marinade",
+    "PHANTOM": "Phantom",
+    "MAGIC_EDEN": "Magic Eden",
+    "TENSOR": "Tensor",
+    "METAPLEX": "Metaplex",
+    "HELIUM": "Helium",
+    "SOLANA_PROGRAM_LIBRARY": "SPL",
+    "SYSTEM_PROGRAM": "System Transfer",
+}
+
 logger = logging.getLogger(__name__)
 
 
-class SimpleTTLCache:
-    """In-memory cache with TTL expiration."""
+class EnrichmentTotals:
+    """Running totals that asset and transaction pages are folded into."""
+
     def __init__(self):
-        self._store: Dict[str, tuple] = {}
+        self.native_balance: Dict[str, Any] = {}
+        self.token_balances: List[Dict[str, Any]] = []
+        self.nfts: List[Dict[str, Any]] = []
+        self.nft_count = 0
+        self.token_metadata: List[Dict[str, Any]] = []
+        # Tracking maps - store (address, label, sol_amount)
+        self.income_by_source: Dict[str, Dict] = {}  # address -> {label, sol_amount}
+        self.spending_by_category: Dict[str, float] = {}  # category/protocol -> sol_amount
+        self.total_fees = 0.0
+        self.tx_count = 0
+
+
+class _Pagination(ABC):
+    """Cursor and stop conditions of one paginated Helius stream.
+
+    Shared by the sync and async clients, which only differ in how a page is
+    fetched: next_params() gives the parameters of the next request (None once
+    the stream is finished) and accept() records its response, returning the
+    page to fold or None when the stream ends with it.
+    """
+
+    # Counter in the fetch stats incremented per page
+    stat = ""
+
+    def __init__(self, address: str, max_pages: int, deadline: Optional[float], stats: Optional[Dict[str, Any]]):
+        self.address = address
+        self.max_pages = max_pages
+        self.deadline = deadline
+        self.stats = stats if stats is not None else {}
+        self.pages = 0
+        self.done = False
+
+    def next_params(self) -> Optional[Dict[str, Any]]:
+        if self.done:
+            return None
+        if self.pages >= self.max_pages:
+            self.stats["truncated"] = self.max_pages > 1
+            return None
+        if self.pages and self.deadline is not None and time.monotonic() > self.deadline:
+            self.stats["truncated"] = True
+            return None
+        return self._params()
 
-    def get(self, key: str) -> Optional[Any]:
-        item = self._store.get(key)
-        if not item:
+    def accept(self, page: Any) -> Optional[Any]:
+        if not self._is_page(page):
+            # A failed page: the result is incomplete, not finished
+            self.stats["truncated"] = self.stats["error"] = True
+            self.done = True
             return None
-        expiry, value = item
-        if time.time() > expiry:
-            del self._store[key]
+        if not page and isinstance(page, list):
+            self.done = True
             return None
-        return value
+        self.pages += 1
+        self.stats[self.stat] = self.stats.get(self.stat, 0) + 1
+        self.done = self._advance(page)
+        return page
+
+    @abstractmethod
+    def _params(self) -> Dict[str, Any]:
+        pass
+
+    @abstractmethod
+    def _is_page(self, page: Any) -> bool:
+        pass
+
+    @abstractmethod
+    def _advance(self, page: Any) -> bool:
+        """Move the cursor past `page`; True if it was the last one."""
+
+
+class _AssetPagination(_Pagination):
+    """getAssetsByOwner pages, numbered from 1."""
+
+    stat = "asset_pages"
+
+    def _params(self) -> Dict[str, Any]:
+        return {
+            "ownerAddress": self.address,
+            "page": self.pages + 1,
+            "limit": ASSETS_PAGE_LIMIT if self.max_pages > 1 else 100,
+            "displayOptions": {"showFungible": True, "showNativeBalance": True}
+        }
+
+    def _is_page(self, page: Any) -> bool:
+        return isinstance(page, dict)
 
-    def set(self, key: str, value: Any, ttl: int):
-        self._store[key] = (time.time() + ttl, value)
+    def _advance(self, page: Dict[str, Any]) -> bool:
+        return len(page.get("items") or []) < (page.get("limit") or ASSETS_PAGE_LIMIT)
+
+
+class _TransactionPagination(_Pagination):
+    """Enhanced-transaction pages; the cursor is the oldest signature seen so far."""
+
+    stat = "transaction_pages"
+
+    def __init__(self, *args: Any):
+        super().__init__(*args)
+        self.before: Optional[str] = None
+
+    @property
+    def path(self) -> str:
+        return f"/v0/addresses/{self.address}/transactions"
+
+    def _params(self) -> Dict[str, Any]:
+        params: Dict[str, Any] = {"limit": TRANSACTIONS_PAGE_LIMIT}
+        if self.before:
+            params["before"] = self.before
+        return params
+
+    def _is_page(self, page: Any) -> bool:
+        return isinstance(page, list)
+
+    def _advance(self, page: List[Dict[str, Any]]) -> bool:
+        self.before = page[-1].get("signature")
+        return len(page) < TRANSACTIONS_PAGE_LIMIT or not self.before
 
 
 class HeliusClient:
     """Client for Helius API enrichment."""
 
-    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 http: Optional[HttpClient] = None, store: Optional[EnrichmentStore] = None,
+                 token_metadata: Optional[TokenMetadataService] = None):
         self.api_key = api_key or HELIUS_API_KEY
         self.base = base_url or HELIUS_BASE
-        self.cache = SimpleTTLCache()
-        self.label_service = get_label_service()
+        self._http = http
+        self.cache = LRUCache(HELIUS_CACHE_MAX_ENTRIES, ttl=HELIUS_CACHE_TTL_SECONDS,
+                              max_bytes=HELIUS_CACHE_MAX_BYTES)
+        # Survives restarts; memory misses fall back to it before calling Helius
+        self.store = store or get_enrichment_store()
+        # Concurrent misses for the same wallet share one fetch
+        self.inflight = SingleFlight()
+        self.token_metadata = token_metadata or get_token_metadata_service()
+        # Labels read token symbols from the same metadata store
+        self.label_service = LabelService(token_metadata) if token_metadata else get_label_service()
 
-    def _rpc_call(self, method: str, params: Any, timeout: int = 10) -> Optional[Any]:
-        """Make a JSON-RPC call to Helius DAS API."""
+    @property
+    def http(self) -> HttpClient:
+        # The shared client (and its rate limiter) is only created once a sync call needs it
+        if self._http is None:
+            self._http = get_http_client()
+        return self._http
+
+    def _rpc_request(self, method: str, params: Any) -> Tuple[str, Dict[str, Any]]:
         url = f"{self.base}?api-key={self.api_key}" if self.api_key else self.base
         payload = {
             "jsonrpc": "2.0",
@@ -58,118 +217,214 @@ class HeliusClient:
             "method": method,
             "params": params
         }
+        return url, payload
+
+    @staticmethod
+    def _rpc_result(method: str, data: Dict[str, Any], started: float) -> Optional[Any]:
+        logger.info(f"Helius RPC {method}: {(time.time()-started)*1000:.0f}ms")
+        if "error" in data:
+            logger.error(f"Helius RPC error: {data['error']}")
+            return None
+        return data.get("result")
+
+    def _get_request(self, path: str, params: Optional[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+        params = params or {}
+        if self.api_key:
+            params["api-key"] = self.api_key
+        return f"{self.base}{path}", params
+
+    @staticmethod
+    def _get_failed(path: str, e: Exception) -> None:
+        response = getattr(e, "response", None)
+        if isinstance(e, (requests.exceptions.HTTPError, httpx.HTTPStatusError)) and response is not None:
+            logger.warning(f"Helius HTTP {response.status_code}: {path}")
+        else:
+            logger.error(f"Helius error: {e}")
+
+    def _rpc_call(self, method: str, params: Any, timeout: int = 10) -> Optional[Any]:
+        """Make a JSON-RPC call to Helius DAS API."""
+        url, payload = self._rpc_request(method, params)
         start = time.time()
         try:
-            r = requests.post(url, json=payload, timeout=timeout)
+            r = self.http.post(url, json=payload, timeout=timeout)
             r.raise_for_status()
-            data = r.json()
-            logger.info(f"Helius RPC {method}: {(time.time()-start)*1000:.0f}ms")
-            if "error" in data:
-                logger.error(f"Helius RPC error: {data['error']}")
-                return None
-            return data.get("result")
+            return self._rpc_result(method, r.json(), start)
         except Exception as e:
             logger.error(f"Helius RPC error ({method}): {e}")
             return None
 
     def _get(self, path: str, params: Optional[Dict[str, Any]] = None, timeout: int = 8) -> Optional[Any]:
         """Make a REST GET call to Helius API."""
-        url = f"{self.base}{path}"
-        params = params or {}
-        if self.api_key:
-            params["api-key"] = self.api_key
+        url, params = self._get_request(path, params)
         start = time.time()
         try:
-            r = requests.get(url, params=params, timeout=timeout)
+            r = self.http.get(url, params=params, timeout=timeout)
             r.raise_for_status()
             logger.info(f"Helius GET {path}: {(time.time()-start)*1000:.0f}ms")
             return r.json()
-        except requests.exceptions.HTTPError as e:
-            logger.warning(f"Helius HTTP {e.response.status_code}: {path}")
-            return None
         except Exception as e:
-            logger.error(f"Helius error: {e}")
+            self._get_failed(path, e)
             return None
 
-    def fetch_enrichment(self, address: str, use_cache: bool = True) -> Dict[str, Any]:
-        """Fetch enrichment data for wallet address."""
-        cache_key = f"helius:{address}"
+    @staticmethod
+    def _page_limits(full_history: bool, max_pages: Optional[int],
+                     time_budget: Optional[float]) -> Tuple[int, Optional[float]]:
+        """Pages per source and monotonic deadline for one fetch."""
+        if not full_history:
+            return 1, None
+        budget = HELIUS_FETCH_BUDGET_SECONDS if time_budget is None else time_budget
+        return max_pages or HELIUS_MAX_PAGES, time.monotonic() + budget
+
+    def iter_asset_pages(self, address: str, max_pages: int = 1, deadline: Optional[float] = None,
+                         stats: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """Yield getAssetsByOwner pages until the last page, `max_pages` or `deadline`.
+
+        A failed request ends the stream with `truncated` and `error` set in `stats`.
+        """
+        pages = _AssetPagination(address, max_pages, deadline, stats)
+        while True:
+            params = pages.next_params()
+            page = None if params is None else pages.accept(self._rpc_call("getAssetsByOwner", params))
+            if page is None:
+                return
+            yield page
+
+    def iter_transaction_pages(self, address: str, max_pages: int = 1, deadline: Optional[float] = None,
+                               stats: Optional[Dict[str, Any]] = None) -> Iterator[List[Dict[str, Any]]]:
+        """Yield parsed transaction pages newest first, following the `before` signature cursor."""
+        pages = _TransactionPagination(address, max_pages, deadline, stats)
+        while True:
+            params = pages.next_params()
+            page = None if params is None else pages.accept(self._get(pages.path, params=params))
+            if page is None:
+                return
+            yield page
+
+    def fetch_enrichment(self, address: str, use_cache: bool = True, full_history: bool = False,
+                         max_pages: Optional[int] = None, time_budget: Optional[float] = None,
+                         include_raw: bool = False) -> Dict[str, Any]:
+        """Fetch enrichment data for wallet address.
+
+        By default only the first DAS page and the latest 100 transactions are
+        read. With `full_history` both are paginated up to `max_pages` pages each
+        or `time_budget` seconds. Pages are folded into the normalized totals
+        as they arrive; only with `include_raw` (latest page only) are the raw
+        DAS and transaction responses kept in the result and its cache entry.
+
+        A result older than the store's soft TTL is returned as is while a
+        background thread refreshes it.
+        """
+        include_raw = include_raw and not full_history
+        cache_key = self._cache_key(address, full_history, include_raw)
         if use_cache:
-            cached = self.cache.get(cache_key)
+            cached, stale = self._cached_enrichment(cache_key)
             if cached:
-                logger.debug(f"Cache hit: {address[:8]}...")
+                if stale and not self.inflight.in_flight((cache_key, max_pages, time_budget)):
+                    threading.Thread(
+                        target=self._refresh_enrichment,
+                        args=(address, cache_key, full_history, include_raw, max_pages, time_budget),
+                        daemon=True,
+                    ).start()
                 return cached
+        return self._fetch_coalesced(address, cache_key, full_history, include_raw, max_pages, time_budget)
+
+    def _cached_enrichment(self, cache_key: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """(result, stale) from memory, else from the on-disk store."""
+        cached = self.cache.get(cache_key)
+        if cached:
+            logger.debug(f"Cache hit: {cache_key}")
+            return cached, False
+        return self._stored_enrichment(cache_key)
+
+    def _stored_enrichment(self, cache_key: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+        stored = self.store.get(cache_key)
+        if stored is None:
+            return None, False
+        result, age = stored
+        if self.store.is_fresh(age):
+            self.cache.set(cache_key, result, ttl=self.store.soft_ttl - age)
+            return result, False
+        logger.debug(f"Serving stale enrichment ({age:.0f}s old): {cache_key}")
+        return result, True
 
+    def _fetch_coalesced(self, address: str, cache_key: str, full_history: bool, include_raw: bool,
+                         max_pages: Optional[int], time_budget: Optional[float]) -> Dict[str, Any]:
+        return self.inflight.do(
+            (cache_key, max_pages, time_budget),
+            lambda: self._fetch_enrichment(address, cache_key, full_history, include_raw, max_pages, time_budget),
+        )
+
+    def _refresh_enrichment(self, *args: Any) -> None:
+        try:
+            # Nobody is waiting on a refresh: leave quota headroom for live requests
+            with priority(PRIORITY_PREWARM):
+                self._fetch_coalesced(*args)
+        except Exception as e:
+            logger.error(f"Background enrichment refresh failed: {e}")
+
+    def _fetch_enrichment(self, address: str, cache_key: str, full_history: bool, include_raw: bool,
+                          max_pages: Optional[int], time_budget: Optional[float]) -> Dict[str, Any]:
         result: Dict[str, Any] = {"fetched_at": int(time.time()), "source": "helius"}
+        max_pages, deadline = self._page_limits(full_history, max_pages, time_budget)
+        stats: Dict[str, Any] = {"asset_pages": 0, "transaction_pages": 0, "truncated": False, "error": False}
+        totals = EnrichmentTotals()
 
-        # 1) Get assets using DAS API (tokens + NFTs)
-        assets = self._rpc_call("getAssetsByOwner", {
-            "ownerAddress": address,
-            "page": 1,
-            "limit": 100,
-            "displayOptions": {"showFungible": True, "showNativeBalance": True}
-        })
-        if assets:
-            result["assets"] = assets
+        # 1) Assets using DAS API (tokens + NFTs), 2) parsed transaction history
+        for assets in self.iter_asset_pages(address, max_pages, deadline, stats):
+            if include_raw:
+                result["assets"] = assets
+            self._fold_asset_page(assets, totals)
+        for txs in self.iter_transaction_pages(address, max_pages, deadline, stats):
+            if include_raw:
+                result["transactions"] = txs
+            self._fold_transaction_page(txs, address, totals)
+
+        return self._finish_enrichment(result, totals, stats, cache_key, full_history)
 
-        # 2) Get transaction history
-        txs = self._get(f"/v0/addresses/{address}/transactions", params={"limit": 100})
-        if txs:
-            result["transactions"] = txs if isinstance(txs, list) else []
+    @staticmethod
+    def _cache_key(address: str, full_history: bool, include_raw: bool = False) -> str:
+        return f"helius:{address}:{'full' if full_history else 'latest'}{':raw' if include_raw else ''}"
 
+    def _finish_enrichment(self, result: Dict[str, Any], totals: EnrichmentTotals, stats: Dict[str, Any],
+                           cache_key: str, full_history: bool) -> Dict[str, Any]:
         # Build normalized data for frontend
-        normalized = self._normalize_data(result, address)
-        result["normalized"] = normalized
+        result["normalized"] = self._normalize_totals(totals)
+        # Feed decimals/symbols to the shared metadata cache in one write
+        self.token_metadata.upsert_many(totals.token_metadata)
+        if full_history:
+            result["pagination"] = stats
+        if stats.get("error"):
+            # A page failed: serve what was folded, but let the next request fetch again
+            result["partial"] = True
+            return result
 
-        # Cache for 5 minutes
-        self.cache.set(cache_key, result, ttl=300)
+        self.cache.set(cache_key, result)
+        try:
+            self.store.put(cache_key, result)
+        except Exception as e:
+            logger.error(f"Enrichment store write failed: {e}")
         return result
 
-    def _normalize_data(self, result: Dict[str, Any], address: str) -> Dict[str, Any]:
-        """Normalize Helius data for frontend consumption."""
-        normalized: Dict[str, Any] = {}
+    def _fold_asset_page(self, assets: Dict[str, Any], totals: EnrichmentTotals) -> None:
+        """Fold one DAS page into the totals; pages can be dropped once folded."""
+        # Native balance (and the SOL price used for USD conversion) comes with the first page
+        if not totals.native_balance:
+            totals.native_balance = assets.get("nativeBalance") or {}
+        for item in assets.get("items") or []:
+            totals.nft_count += self._fold_asset(item, totals.token_balances, totals.nfts, totals.token_metadata)
 
-        # Extract token balances from DAS assets
-        assets = result.get("assets", {})
-        items = assets.get("items", []) if isinstance(assets, dict) else []
-        
-        token_balances = []
-        nfts = []
-        
-        # Get SOL price for USD conversion (from native balance if available)
-        native_balance = assets.get("nativeBalance", {})
+    def _fold_transaction_page(self, txs: List[Dict[str, Any]], address: str, totals: EnrichmentTotals) -> None:
+        totals.tx_count += len(txs)
+        totals.total_fees += self._fold_transactions(txs, address, totals.income_by_source,
+                                                     totals.spending_by_category)
+
+    def _normalize_totals(self, totals: EnrichmentTotals) -> Dict[str, Any]:
+        """Turn folded page totals into the normalized frontend view."""
+        normalized: Dict[str, Any] = {}
+        token_balances = totals.token_balances
+        native_balance = totals.native_balance
         sol_price = native_balance.get("price_per_sol", 0) if native_balance else 0
         
-        for item in items:
-            interface = item.get("interface", "")
-            content = item.get("content", {})
-            metadata = content.get("metadata", {})
-            
-            if interface in ["FungibleToken", "FungibleAsset"]:
-                # Token
-                token_info = item.get("token_info", {})
-                symbol = token_info.get("symbol") or metadata.get("symbol") or "Unknown"
-                balance = token_info.get("balance", 0)
-                decimals = token_info.get("decimals", 9)
-                price_info = token_info.get("price_info", {})
-                
-                ui_amount = balance / (10 ** decimals) if decimals else balance
-                usd_value = price_info.get("total_price", 0)
-                
-                token_balances.append({
-                    "mint": item.get("id"),
-                    "symbol": symbol,
-                    "ui_amount": ui_amount,
-                    "usd_value": usd_value,
-                })
-            elif interface in ["ProgrammableNFT", "V1_NFT", "V2_NFT"]:
-                # NFT
-                nfts.append({
-                    "mint": item.get("id"),
-                    "name": metadata.get("name", "Unknown NFT"),
-                    "image": content.get("files", [{}])[0].get("uri") if content.get("files") else None,
-                })
-        
         # Add native SOL balance if present
         if native_balance:
             lamports = native_balance.get("lamports", 0)
@@ -183,63 +438,117 @@ class HeliusClient:
             })
         
         normalized["token_balances"] = token_balances
-        normalized["nfts"] = nfts[:10]  # Limit NFTs
+        normalized["nfts"] = totals.nfts
+        normalized["nft_count"] = totals.nft_count
 
-        # Process transactions for income sources and spending categories
-        txs = result.get("transactions", [])
-        
-        # Tracking maps - store (address, label, sol_amount)
-        income_by_source: Dict[str, Dict] = {}  # address -> {label, sol_amount}
-        spending_by_category: Dict[str, float] = {}  # category/protocol -> sol_amount
+        # Income sources and spending categories folded from the transactions
+        income_by_source = totals.income_by_source
+        spending_by_category = totals.spending_by_category
+        normalized["transaction_count"] = totals.tx_count
+
+        # Add network fees to spending
+        if totals.total_fees > 0:
+            spending_by_category["Network Fees"] = totals.total_fees
+
+        # Top income sources - sorted by SOL amount, convert to USD
+        income_sorted = sorted(income_by_source.values(), key=lambda x: x["sol_amount"], reverse=True)[:5]
+        normalized["top_counterparties"] = [
+            {
+                "address": item.get("address", ""),
+                "label": item["label"],
+                "usd_volume": item["sol_amount"] * sol_price
+            }
+            for item in income_sorted
+        ]
+
+        # Top spending categories - convert SOL to USD  
+        spending_sorted = sorted(spending_by_category.items(), key=lambda x: x[1], reverse=True)[:5]
+        normalized["top_spending_categories"] = [
+            {
+                "category": category,
+                "value_usd": sol_amount * sol_price
+            }
+            for category, sol_amount in spending_sorted
+        ]
+
+        return normalized
+
+    def _fold_asset(self, item: Dict[str, Any], token_balances: List[Dict[str, Any]],
+                    nfts: List[Dict[str, Any]], token_metadata: List[Dict[str, Any]]) -> int:
+        """Fold one DAS asset into the running lists; returns 1 for an NFT."""
+        interface = item.get("interface", "")
+        content = item.get("content", {})
+        metadata = content.get("metadata", {})
+
+        if interface in ["FungibleToken", "FungibleAsset"]:
+            # Token
+            token_info = item.get("token_info", {})
+            symbol = token_info.get("symbol") or metadata.get("symbol") or "Unknown"
+            balance = token_info.get("balance", 0)
+            decimals = token_info.get("decimals", 9)
+            price_info = token_info.get("price_info", {})
+
+            ui_amount = balance / (10 ** decimals) if decimals else balance
+            usd_value = price_info.get("total_price", 0)
+
+            token_balances.append({
+                "mint": item.get("id"),
+                "symbol": symbol,
+                "ui_amount": ui_amount,
+                "usd_value": usd_value,
+            })
+            token_metadata.append({
+                "mint": item.get("id"),
+                "decimals": token_info.get("decimals"),
+                "symbol": token_info.get("symbol") or metadata.get("symbol"),
+                "name": metadata.get("name"),
+            })
+        elif interface in ["ProgrammableNFT", "V1_NFT", "V2_NFT"]:
+            # NFT: keep a short preview, count the rest
+            if len(nfts) < NFT_PREVIEW_LIMIT:
+                nfts.append({
+                    "mint": item.get("id"),
+                    "name": metadata.get("name", "Unknown NFT"),
+                    "image": content.get("files", [{}])[0].get("uri") if content.get("files") else None,
+                })
+            return 1
+        return 0
+
+    def _fold_transactions(self, txs: List[Dict[str, Any]], address: str,
+                           income_by_source: Dict[str, Dict], spending_by_category: Dict[str, float]) -> float:
+        """Fold one page of parsed transactions into the income/spending maps; returns fees in SOL."""
         total_fees = 0.0
-        
-        # Protocol name mapping for cleaner display
-        source_labels = {
-            "JUPITER": "Jupiter",
-            "JUPITER_V6": "Jupiter", 
-            "RAYDIUM": "Raydium",
-            "ORCA": "Orca",
-            "MARINADE": "Marinade",
-            "PHANTOM": "Phantom",
-            "MAGIC_EDEN": "Magic Eden",
-            "TENSOR": "Tensor",
-            "METAPLEX": "Metaplex",
-            "HELIUM": "Helium",
-            "SOLANA_PROGRAM_LIBRARY": "SPL",
-            "SYSTEM_PROGRAM": "System Transfer",
-        }
-        
-        for tx in txs[:100]:
+        for tx in txs:
             # Get transaction source/type from Helius parsed data
             source = tx.get("source", "UNKNOWN")
             tx_type = tx.get("type", "UNKNOWN")
             fee = tx.get("fee", 0) / 1e9  # SOL
-            
+
             # Track network fees
             total_fees += fee
-            
+
             # Get protocol label
-            protocol_label = source_labels.get(source, source.replace("_", " ").title() if source != "UNKNOWN" else None)
-            
+            protocol_label = PROTOCOL_LABELS.get(source, source.replace("_", " ").title() if source != "UNKNOWN" else None)
+
             # Process native SOL transfers
             native_transfers = tx.get("nativeTransfers", [])
             for transfer in native_transfers:
                 from_addr = transfer.get("fromUserAccount")
                 to_addr = transfer.get("toUserAccount")
                 amount_sol = transfer.get("amount", 0) / 1e9
-                
+
                 # Skip tiny amounts and self-transfers
                 if amount_sol < 0.0001:
                     continue
                 if from_addr == to_addr:
                     continue
-                    
+
                 # OUTGOING: User sent SOL somewhere
                 if from_addr == address and to_addr:
                     # Skip if sending to self
                     if to_addr == address:
                         continue
-                    
+
                     # Categorize spending
                     if protocol_label and source not in ["UNKNOWN", "SYSTEM_PROGRAM"]:
                         # Protocol-based spending (Jupiter swap, etc.)
@@ -252,13 +561,13 @@ class HeliusClient:
                         else:
                             # Unknown - categorize as "Transfers"
                             spending_by_category["Transfers Out"] = spending_by_category.get("Transfers Out", 0) + amount_sol
-                
+
                 # INCOMING: User received SOL from somewhere
                 elif to_addr == address and from_addr:
                     # Skip if receiving from self
                     if from_addr == address:
                         continue
-                    
+
                     # Track income by source address
                     if from_addr not in income_by_source:
                         src_label = self.label_service.get_label(from_addr)
@@ -267,14 +576,14 @@ class HeliusClient:
                             src_label = protocol_label
                         income_by_source[from_addr] = {"label": src_label, "sol_amount": 0, "address": from_addr}
                     income_by_source[from_addr]["sol_amount"] += amount_sol
-            
+
             # Track token transfers for protocol interactions
             token_transfers = tx.get("tokenTransfers", [])
             if token_transfers and protocol_label and source not in ["UNKNOWN", "SYSTEM_PROGRAM"]:
                 for tt in token_transfers:
                     from_addr = tt.get("fromUserAccount")
                     to_addr = tt.get("toUserAccount") 
-                    
+
                     if from_addr == address:
                         # Outgoing token = spending via protocol
                         spending_by_category[protocol_label] = spending_by_category.get(protocol_label, 0) + 0.01
@@ -283,37 +592,134 @@ class HeliusClient:
                         if protocol_label not in income_by_source:
                             income_by_source[protocol_label] = {"label": protocol_label, "sol_amount": 0, "address": ""}
                         income_by_source[protocol_label]["sol_amount"] += 0.01
+        return total_fees
 
-        # Add network fees to spending
-        if total_fees > 0:
-            spending_by_category["Network Fees"] = total_fees
 
-        # Top income sources - sorted by SOL amount, convert to USD
-        income_sorted = sorted(income_by_source.values(), key=lambda x: x["sol_amount"], reverse=True)[:5]
-        normalized["top_counterparties"] = [
-            {
-                "address": item.get("address", ""),
-                "label": item["label"],
-                "usd_volume": item["sol_amount"] * sol_price
-            }
-            for item in income_sorted
-        ]
+class AsyncHeliusClient(HeliusClient):
+    """HeliusClient for async handlers: awaits httpx instead of blocking a thread.
 
-        # Top spending categories - convert SOL to USD  
-        spending_sorted = sorted(spending_by_category.items(), key=lambda x: x[1], reverse=True)[:5]
-        normalized["top_spending_categories"] = [
-            {
-                "category": category,
-                "value_usd": sol_amount * sol_price
-            }
-            for category, sol_amount in spending_sorted
-        ]
+    The asset and transaction streams are paged concurrently, each folding its
+    pages into the shared totals as they arrive, so an enrichment takes about
+    as long as the slower of the two rather than their sum.
+    """
 
-        return normalized
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 http: Optional[AsyncHttpClient] = None, store: Optional[EnrichmentStore] = None,
+                 token_metadata: Optional[TokenMetadataService] = None):
+        super().__init__(api_key, base_url, store=store, token_metadata=token_metadata)
+        self.async_http = http or get_async_http_client()
+        self.async_inflight = AsyncSingleFlight()
+        # Strong references to background refreshes until they finish
+        self._refreshes: Set["asyncio.Task[Any]"] = set()
+
+    async def _rpc_call_async(self, method: str, params: Any, timeout: int = 10) -> Optional[Any]:
+        url, payload = self._rpc_request(method, params)
+        start = time.time()
+        try:
+            r = await self.async_http.post(url, json=payload, timeout=timeout)
+            r.raise_for_status()
+            return self._rpc_result(method, r.json(), start)
+        except Exception as e:
+            logger.error(f"Helius RPC error ({method}): {e}")
+            return None
+
+    async def _get_async(self, path: str, params: Optional[Dict[str, Any]] = None,
+                         timeout: int = 8) -> Optional[Any]:
+        url, params = self._get_request(path, params)
+        start = time.time()
+        try:
+            r = await self.async_http.get(url, params=params, timeout=timeout)
+            r.raise_for_status()
+            logger.info(f"Helius GET {path}: {(time.time()-start)*1000:.0f}ms")
+            return r.json()
+        except Exception as e:
+            self._get_failed(path, e)
+            return None
+
+    async def aiter_asset_pages(self, address: str, max_pages: int = 1, deadline: Optional[float] = None,
+                                stats: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+        pages = _AssetPagination(address, max_pages, deadline, stats)
+        while True:
+            params = pages.next_params()
+            page = None if params is None else pages.accept(await self._rpc_call_async("getAssetsByOwner", params))
+            if page is None:
+                return
+            yield page
+
+    async def aiter_transaction_pages(self, address: str, max_pages: int = 1, deadline: Optional[float] = None,
+                                      stats: Optional[Dict[str, Any]] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        pages = _TransactionPagination(address, max_pages, deadline, stats)
+        while True:
+            params = pages.next_params()
+            page = None if params is None else pages.accept(await self._get_async(pages.path, params=params))
+            if page is None:
+                return
+            yield page
+
+    async def fetch_enrichment_async(self, address: str, use_cache: bool = True, full_history: bool = False,
+                                     max_pages: Optional[int] = None, time_budget: Optional[float] = None,
+                                     include_raw: bool = False) -> Dict[str, Any]:
+        """fetch_enrichment with the asset and transaction pages fetched concurrently."""
+        include_raw = include_raw and not full_history
+        cache_key = self._cache_key(address, full_history, include_raw)
+        if use_cache:
+            cached, stale = self.cache.get(cache_key), False
+            if not cached:
+                # The on-disk store is SQLite: read it off the event loop
+                cached, stale = await asyncio.to_thread(self._stored_enrichment, cache_key)
+            if cached:
+                if stale and not self.async_inflight.in_flight((cache_key, max_pages, time_budget)):
+                    task = asyncio.ensure_future(self._refresh_enrichment_async(
+                        address, cache_key, full_history, include_raw, max_pages, time_budget))
+                    self._refreshes.add(task)
+                    task.add_done_callback(self._refreshes.discard)
+                return cached
+        return await self._fetch_coalesced_async(address, cache_key, full_history, include_raw,
+                                                 max_pages, time_budget)
 
+    async def _fetch_coalesced_async(self, address: str, cache_key: str, full_history: bool, include_raw: bool,
+                                     max_pages: Optional[int], time_budget: Optional[float]) -> Dict[str, Any]:
+        return await self.async_inflight.do(
+            (cache_key, max_pages, time_budget),
+            lambda: self._fetch_enrichment_async(address, cache_key, full_history, include_raw,
+                                                 max_pages, time_budget),
+        )
 
-# Module-level client
+    async def _refresh_enrichment_async(self, *args: Any) -> None:
+        try:
+            with priority(PRIORITY_PREWARM):
+                await self._fetch_coalesced_async(*args)
+        except Exception as e:
+            logger.error(f"Background enrichment refresh failed: {e}")
+
+    async def _fetch_enrichment_async(self, address: str, cache_key: str, full_history: bool, include_raw: bool,
+                                      max_pages: Optional[int], time_budget: Optional[float]) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"fetched_at": int(time.time()), "source": "helius"}
+        max_pages, deadline = self._page_limits(full_history, max_pages, time_budget)
+        stats: Dict[str, Any] = {"asset_pages": 0, "transaction_pages": 0, "truncated": False, "error": False}
+        totals = EnrichmentTotals()
+
+        async def fold_assets() -> None:
+            async for assets in self.aiter_asset_pages(address, max_pages, deadline, stats):
+                if include_raw:
+                    result["assets"] = assets
+                self._fold_asset_page(assets, totals)
+
+        async def fold_transactions() -> None:
+            async for txs in self.aiter_transaction_pages(address, max_pages, deadline, stats):
+                if include_raw:
+                    result["transactions"] = txs
+                self._fold_transaction_page(txs, address, totals)
+
+        # Both folds run on the event loop thread, so the shared totals need no lock
+        await asyncio.gather(fold_assets(), fold_transactions())
+        # The metadata and enrichment store writes are SQLite I/O: keep them off the loop
+        return await asyncio.to_thread(self._finish_enrichment, result, totals, stats, cache_key, full_history)
+
+
+# Module-level clients
 _default_client: Optional[HeliusClient] = None
+_async_client: Optional[AsyncHeliusClient] = None
 
 
 def get_default_client() -> HeliusClient:
@@ -321,3 +727,10 @@ def get_default_client() -> HeliusClient:
     if _default_client is None:
         _default_client = HeliusClient()
     return _default_client
+
+
+def get_async_client() -> AsyncHeliusClient:
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncHeliusClient()
+    return _async_client
@@ -0,0 +1,189 @@
+"""
+Bounded queue of indexing jobs served by a fixed pool of worker threads.
+
+At most `workers` indexer processes run at once; further jobs wait in FIFO
+order up to `max_depth`, beyond which submissions are refused with an
+estimated retry delay. A wallet that is already pending or running is not
+queued again: its existing job is returned.
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from vialytics_api.services.indexer_service import get_indexer
+
+INDEX_WORKERS = int(os.environ.get("VIALYTICS_INDEX_WORKERS", "2"))
+INDEX_QUEUE_MAX_DEPTH = int(os.environ.get("VIALYTICS_INDEX_QUEUE_MAX_DEPTH", "50"))
+# Finished jobs remembered for status lookups
+INDEX_JOB_HISTORY = 1000
+# Assumed job duration until one has finished
+DEFAULT_JOB_SECONDS = 60.0
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    """Raised when the queue is at max depth; `retry_after` is a delay estimate in seconds."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Indexing queue is full, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class IndexJob:
+    def __init__(self, job_id: str, wallet: str):
+        self.job_id = job_id
+        self.wallet = wallet
+        self.status = STATUS_PENDING
+        self.error: Optional[str] = None
+        self.enqueued_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+
+class IndexingQueue:
+    """FIFO of IndexJobs run by `workers` threads calling `run_job(wallet, job_id)`."""
+
+    def __init__(self, run_job: Callable[[str, str], Any], workers: int = INDEX_WORKERS,
+                 max_depth: int = INDEX_QUEUE_MAX_DEPTH):
+        if workers < 1 or max_depth < 0:
+            raise ValueError("Need at least one worker and a non-negative max depth")
+        self.run_job = run_job
+        self.workers = workers
+        self.max_depth = max_depth
+        self._pending: Deque[IndexJob] = deque()
+        self._jobs: Dict[str, IndexJob] = {}
+        self._active: Dict[str, IndexJob] = {}  # wallet -> pending or running job
+        self._finished: "OrderedDict[str, IndexJob]" = OrderedDict()
+        self._running = 0
+        self._avg_job_seconds = DEFAULT_JOB_SECONDS
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+
+    def active_job(self, wallet: str) -> Optional[IndexJob]:
+        """The wallet's pending or running job, if any."""
+        with self._cond:
+            return self._active.get(wallet)
+
+    def submit(self, wallet: str, job_id: str) -> Tuple[IndexJob, bool]:
+        """Queue a job; returns (job, created). An active job for the wallet is returned as is."""
+        with self._cond:
+            existing = self._active.get(wallet)
+            if existing is not None:
+                return existing, False
+            if len(self._pending) >= self.max_depth:
+                self.rejected += 1
+                # A queue slot frees up when the next pending job starts
+                raise QueueFullError(max(1.0, self._avg_job_seconds / self.workers))
+            if job_id in self._jobs:
+                raise ValueError(f"Job id already in use: {job_id}")
+            job = IndexJob(job_id, wallet)
+            self._pending.append(job)
+            self._jobs[job_id] = job
+            self._active[wallet] = job
+            self._start_workers()
+            self._cond.notify()
+            return job, True
+
+    def get(self, job_id: str) -> Optional[IndexJob]:
+        with self._cond:
+            return self._jobs.get(job_id) or self._finished.get(job_id)
+
+    def position(self, job_id: str) -> Optional[int]:
+        """1-based place of a pending job in the queue; None once it has started."""
+        with self._cond:
+            for index, job in enumerate(self._pending):
+                if job.job_id == job_id:
+                    return index + 1
+            return None
+
+    def estimated_wait(self, job_id: str) -> Optional[float]:
+        """Seconds until a pending job should start, from the average job duration."""
+        position = self.position(job_id)
+        if position is None:
+            return None
+        with self._cond:
+            return self._estimated_wait(position)
+
+    def _estimated_wait(self, position: int) -> float:
+        # Jobs that must finish before a worker is free for this one
+        ahead = self._running + position - self.workers
+        if ahead <= 0:
+            return 0.0
+        return math.ceil(ahead / self.workers) * self._avg_job_seconds
+
+    def _start_workers(self) -> None:
+        # Replace workers that died instead of counting them as running
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f"indexer-worker-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                job = self._pending.popleft()
+                job.status = STATUS_RUNNING
+                job.started_at = time.time()
+                self._running += 1
+
+            try:
+                self.run_job(job.wallet, job.job_id)
+                status, error = STATUS_COMPLETED, None
+            except Exception as e:
+                print(f"[{job.job_id}] Indexing job failed: {e}")
+                status, error = STATUS_FAILED, str(e)
+
+            with self._cond:
+                job.status, job.error = status, error
+                job.finished_at = time.time()
+                self._running -= 1
+                if status == STATUS_COMPLETED:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                # Moving average of job duration for Retry-After estimates
+                self._avg_job_seconds = 0.8 * self._avg_job_seconds + 0.2 * (job.finished_at - job.started_at)
+                # Only drop entries that are still this job's
+                if self._jobs.get(job.job_id) is job:
+                    del self._jobs[job.job_id]
+                if self._active.get(job.wallet) is job:
+                    del self._active[job.wallet]
+                self._finished[job.job_id] = job
+                while len(self._finished) > INDEX_JOB_HISTORY:
+                    self._finished.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "pending": len(self._pending),
+                "running": self._running,
+                "workers": self.workers,
+                "max_depth": self.max_depth,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "avg_job_seconds": round(self._avg_job_seconds, 1),
+            }
+
+
+_index_queue: Optional[IndexingQueue] = None
+
+
+def get_index_queue() -> IndexingQueue:
+    global _index_queue
+    if _index_queue is None:
+        _index_queue = IndexingQueue(get_indexer().run_indexer)
+    return _index_queue
@@ -0,0 +1,81 @@
+"""
+Progress of indexing jobs from the indexer's structured output.
+
+vialytics-core prints one-line JSON `progress` events while it backfills a
+wallet, page by page: `total` counts the signatures listed so far and is final
+once `listed` is set; until then `eta_seconds` is extrapolated from the pages
+listed so far. They are mapped onto the job percentage between the
+"indexer started" and "analyzing" milestones and pushed to the job store at a
+throttled rate.
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+# Job percentages at the milestones around the backfill
+PROGRESS_STARTED = 10
+PROGRESS_INDEXING = 20
+PROGRESS_ANALYZING = 80
+# Least time between two progress pushes of one job
+INDEXER_PROGRESS_INTERVAL_SECONDS = float(os.environ.get("VIALYTICS_INDEXER_PROGRESS_INTERVAL_SECONDS", "2"))
+
+
+def parse_event(line: str) -> Optional[Dict[str, Any]]:
+    """The JSON event on an indexer stdout line, or None for a plain log line."""
+    if not line.startswith("{"):
+        return None
+    try:
+        message = json.loads(line)
+    except ValueError:
+        return None
+    return message if isinstance(message, dict) and "event" in message else None
+
+
+def progress_percent(event: Dict[str, Any]) -> int:
+    """Job percentage for a `progress` event."""
+    done = event.get("done", 0)
+    total = event.get("total") or 0
+    pages = event.get("pages") or 0
+    if not event.get("listed") and pages:
+        # More pages to come: assume at least one more of the average size
+        total += total / pages
+    fraction = min(done / total, 1.0) if total else float(bool(event.get("listed")))
+    return int(PROGRESS_INDEXING + fraction * (PROGRESS_ANALYZING - PROGRESS_INDEXING))
+
+
+class ProgressReporter:
+    """Forwards a job's progress to `push(percent, eta_seconds)`, at most every `min_interval` seconds.
+
+    The percentage never goes backwards, and unchanged percentages are not pushed again.
+    """
+
+    def __init__(self, push: Callable[[int, Optional[float]], Any],
+                 min_interval: float = INDEXER_PROGRESS_INTERVAL_SECONDS):
+        self.push = push
+        self.min_interval = min_interval
+        self.percent = 0
+        self.eta_seconds: Optional[float] = None
+        self.pushes = 0
+        self._pushed_percent: Optional[int] = None
+        self._last_push: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def update(self, event: Dict[str, Any]) -> bool:
+        """Report a `progress` event; True if it was pushed."""
+        return self.report(progress_percent(event), event.get("eta_seconds"))
+
+    def report(self, percent: int, eta_seconds: Optional[float] = None, force: bool = False) -> bool:
+        with self._lock:
+            self.percent = max(percent, self.percent)
+            self.eta_seconds = eta_seconds
+            now = time.monotonic()
+            if not force and (self.percent == self._pushed_percent or (
+                    self._last_push is not None and now - self._last_push < self.min_interval)):
+                return False
+            self._pushed_percent, self._last_push = self.percent, now
+            self.pushes += 1
+            percent = self.percent
+        self.push(percent, eta_seconds)
+        return True
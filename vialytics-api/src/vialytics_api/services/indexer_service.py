@@ -4,14 +4,30 @@ Based on the working wrapped-worker implementation.
 """
 import subprocess
 import os
+import sqlite3
 import threading
-from typing import Dict, Any, Optional
+from collections import deque
+from typing import Deque, Dict, Any, Optional
+from vialytics_api.core.database import DATA_DIR
+from vialytics_api.core.rate_limit import PRIORITY_BACKGROUND, get_rate_limiter, priority
 from vialytics_api.services.analytics import WalletAnalyzer
+from vialytics_api.services.indexer_progress import (
+    PROGRESS_ANALYZING, PROGRESS_INDEXING, PROGRESS_STARTED, ProgressReporter, parse_event,
+)
+from vialytics_api.services.indexer_supervisor import INDEXER_PROCESSES, IndexerSupervisor
 from vialytics_api.services.supabase_service import get_supabase
 
-# Data directory for per-wallet databases and configs
-DATA_DIR = os.environ.get("VIALYTICS_DATA_DIR", "/tmp/vialytics_data")
 RPC_URL = os.environ.get("RPC_URL", "https://mainnet.helius-rpc.com/?api-key=532c57d3-d97d-445a-971c-7c017aafa285")
+# Helius tokens taken from the shared bucket before an indexer process starts,
+# and how long a job waits for them before failing
+INDEXER_HELIUS_RESERVATION = float(os.environ.get("VIALYTICS_INDEXER_HELIUS_RESERVATION", "10"))
+INDEXER_QUOTA_TIMEOUT_SECONDS = float(os.environ.get("VIALYTICS_INDEXER_QUOTA_TIMEOUT_SECONDS", "60"))
+# Helius requests per second each indexer process may send for the rest of the
+# run; the default two processes stay under half of the default 10 rps quota
+INDEXER_HELIUS_RPS = float(os.environ.get("VIALYTICS_INDEXER_HELIUS_RPS", "2"))
+INDEXER_TIMEOUT_SECONDS = 300  # 5 minutes per history fetch
+# Last stderr lines of a one-shot indexer kept for error messages
+INDEXER_STDERR_TAIL_LINES = 50
 
 class IndexerService:
     """Real vialytics-core indexer integration with per-wallet database support."""
@@ -27,6 +43,11 @@ class IndexerService:
         
         self.supabase = get_supabase()
         os.makedirs(DATA_DIR, exist_ok=True)
+        self._supervisor: Optional[IndexerSupervisor] = None
+        self._supervisor_lock = threading.Lock()
+        # job_id -> latest progress of running jobs, for status lookups without Supabase
+        self._progress: Dict[str, Dict[str, Any]] = {}
+        self._progress_lock = threading.Lock()
     
     def get_wallet_db_path(self, wallet_address: str) -> str:
         """Get per-wallet database path."""
@@ -36,117 +57,149 @@ class IndexerService:
         """Get per-wallet config file path."""
         return os.path.join(DATA_DIR, f"config_{wallet_address}.toml")
     
+    def resume_signature(self, wallet_address: str) -> Optional[str]:
+        """Newest indexed signature if the wallet's last backfill completed, else None.
+
+        vialytics-core clears its history_state marker when a backfill starts and
+        sets it only after an error-free walk, so resuming never skips a gap.
+        """
+        db_path = self.get_wallet_db_path(wallet_address)
+        if not os.path.exists(db_path):
+            return None
+        try:
+            conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=10)
+            try:
+                state = conn.execute("SELECT complete FROM history_state WHERE id = 1").fetchone()
+                if not state or not state[0]:
+                    return None
+                row = conn.execute("SELECT signature FROM transactions ORDER BY slot DESC LIMIT 1").fetchone()
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return None  # DB from before the history_state table
+        return row[0] if row else None
+
     def create_config(self, wallet_address: str) -> str:
         """Create per-wallet config file (like wrapped-worker)."""
         db_path = self.get_wallet_db_path(wallet_address)
         config_path = self.get_wallet_config_path(wallet_address)
-        
-        config_content = f"""[source]
+        with open(config_path, 'w') as f:
+            f.write(self._config_content(db_path))
+        return config_path
+
+    def create_daemon_config(self) -> str:
+        """Config shared by the `--serve` processes; each request names its wallet DB."""
+        config_path = os.path.join(DATA_DIR, "config_daemon.toml")
+        with open(config_path, 'w') as f:
+            f.write(self._config_content(None))
+        return config_path
+
+    def _config_content(self, db_path: Optional[str]) -> str:
+        db_line = f'db_url = "sqlite://{db_path}"\n' if db_path else ""
+        return f"""[source]
 endpoint = "{RPC_URL}"
 x-token = "mock-token"
 timeout = 10
 
 [vialytics]
 rpc_url = "{RPC_URL}"
-db_url = "sqlite://{db_path}"
-
+max_rps = {INDEXER_HELIUS_RPS}
+{db_line}
 [pipeline]
 """
-        with open(config_path, 'w') as f:
-            f.write(config_content)
-        
-        return config_path
-    
-    def run_indexer(self, wallet_address: str, job_id: str) -> Dict[str, Any]:
-        """Run indexer with per-wallet config, watching for completion message."""
+
+    def _indexer_env(self) -> Dict[str, str]:
+        env = os.environ.copy()
+        env["RUST_LOG"] = "info"
+        return env
+
+    def get_supervisor(self) -> Optional[IndexerSupervisor]:
+        """Pool of warm `--serve` indexer processes, or None when INDEXER_PROCESSES is 0."""
+        if INDEXER_PROCESSES < 1:
+            return None
+        with self._supervisor_lock:
+            if self._supervisor is None:
+                cmd = [self.binary_path, "--config", self.create_daemon_config(), "--serve"]
+                self._supervisor = IndexerSupervisor(cmd, env=self._indexer_env())
+            return self._supervisor
+
+    def shutdown(self) -> None:
+        if self._supervisor is not None:
+            self._supervisor.shutdown()
+
+    def stats(self) -> Dict[str, Any]:
+        supervisor = self._supervisor
+        return {"mode": "daemon" if INDEXER_PROCESSES > 0 else "process",
+                "supervisor": supervisor.stats() if supervisor else None}
+
+    def job_progress(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Latest {"progress", "eta_seconds"} of a running job."""
+        with self._progress_lock:
+            return self._progress.get(job_id)
+
+    def _push_progress(self, job_id: str, percent: int, eta_seconds: Optional[float] = None) -> None:
+        with self._progress_lock:
+            self._progress[job_id] = {"progress": percent, "eta_seconds": eta_seconds}
+        if self.supabase.client:
+            self.supabase.update_job(job_id, "running", percent)
+
+    def run_indexer(self, wallet_address: str, job_id: str, resume: bool = True) -> Dict[str, Any]:
+        """Index a wallet's history into its DB, then analyze it.
+
+        With `resume`, a wallet whose earlier backfill completed only fetches
+        transactions newer than the ones already in its DB.
+        """
+        # Indexing is background work: interactive requests keep quota headroom
+        with priority(PRIORITY_BACKGROUND):
+            try:
+                return self._run_indexer(wallet_address, job_id, resume)
+            finally:
+                with self._progress_lock:
+                    self._progress.pop(job_id, None)
+
+    def _run_indexer(self, wallet_address: str, job_id: str, resume: bool) -> Dict[str, Any]:
+        reporter = ProgressReporter(lambda percent, eta: self._push_progress(job_id, percent, eta))
         try:
-            if self.supabase.client:
-                self.supabase.update_job(job_id, "running", 10)
-            
-            # Check binary exists
-            if not os.path.exists(self.binary_path):
-                # Try cargo build first
-                if os.path.exists(self.core_path):
-                    print(f"[{job_id}] Binary not found, attempting cargo build...")
-                    build_result = subprocess.run(
-                        ["cargo", "build", "--release"],
-                        cwd=self.core_path,
-                        capture_output=True,
-                        text=True,
-                        timeout=600
-                    )
-                    if build_result.returncode != 0:
-                        raise Exception(f"Cargo build failed: {build_result.stderr}")
-                else:
-                    raise Exception(f"vialytics-core not found at {self.core_path}")
+            reporter.report(PROGRESS_STARTED, force=True)
             
-            # Create per-wallet config
-            config_path = self.create_config(wallet_address)
+            self._ensure_binary(job_id)
             db_path = self.get_wallet_db_path(wallet_address)
             
+            # The Rust indexer calls Helius directly: reserve a share of the
+            # quota up front so a burst of jobs cannot starve live requests;
+            # the config's max_rps paces the requests that follow
+            if not get_rate_limiter().acquire("helius", cost=INDEXER_HELIUS_RESERVATION,
+                                              timeout=INDEXER_QUOTA_TIMEOUT_SECONDS):
+                raise Exception("Helius quota exhausted, indexing postponed")
+
             print(f"[{job_id}] Starting indexer for {wallet_address}...")
+            reporter.report(PROGRESS_INDEXING, force=True)
             
-            if self.supabase.client:
-                self.supabase.update_job(job_id, "running", 20)
-            
-            # Run indexer with process streaming (like wrapped-worker)
-            cmd = [self.binary_path, "--config", config_path, "--wallet-address", wallet_address]
-            env = os.environ.copy()
-            env["RUST_LOG"] = "info"
-            
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                env=env
-            )
-            
-            # Monitor output for completion message
-            completed = False
-            timeout_seconds = 300  # 5 minutes
-            
-            def read_output():
-                nonlocal completed
-                buffer = ""
-                for line in iter(process.stdout.readline, ''):
-                    if not line:
-                        break
-                    buffer += line
-                    print(f"[Indexer]: {line.strip()}")
-                    
-                    # Check for completion (same as wrapped-worker)
-                    if "Finished fetching history" in buffer:
-                        print(f"[{job_id}] History fetch complete. Stopping indexer.")
-                        completed = True
-                        process.terminate() # Graceful shutdown for WAL flush
-                        try:
-                            process.wait(timeout=5)
-                        except subprocess.TimeoutExpired:
-                            process.kill()
-                        break
-            
-            output_thread = threading.Thread(target=read_output)
-            output_thread.start()
-            output_thread.join(timeout=timeout_seconds)
-            
-            if output_thread.is_alive():
-                process.kill()
-                raise Exception("Indexer timed out")
+            until_signature = self.resume_signature(wallet_address) if resume else None
+            if until_signature:
+                print(f"[{job_id}] Resuming history after {until_signature}")
+
+            supervisor = self.get_supervisor()
+            if supervisor is not None:
+                result = supervisor.index(wallet_address, db_path, until_signature, timeout=INDEXER_TIMEOUT_SECONDS,
+                                          on_progress=reporter.update)
+                print(f"[{job_id}] History fetch complete (complete={result.get('complete')}).")
+            else:
+                self._run_process(wallet_address, job_id, until_signature, reporter)
             
             # Check if DB was created
             if not os.path.exists(db_path):
-                stderr = process.stderr.read() if process.stderr else ""
-                raise Exception(f"Database not created. Stderr: {stderr}")
-            
-            if self.supabase.client:
-                self.supabase.update_job(job_id, "running", 80)
+                raise Exception("Database not created")
             
+            reporter.report(PROGRESS_ANALYZING, force=True)
             print(f"[{job_id}] Analyzing data from {db_path}...")
             
             # Analyze data
-            analyzer = WalletAnalyzer(db_path=db_path)
-            analytics = analyzer.analyze()
+            analyzer = WalletAnalyzer(db_path=db_path, incremental=True, fill_price_history=True)
+            try:
+                analytics = analyzer.analyze()
+            finally:
+                analyzer.close()
             
             # Save to Supabase
             if self.supabase.client:
@@ -155,12 +208,6 @@ db_url = "sqlite://{db_path}"
             
             print(f"[{job_id}] Request completed successfully.")
             
-            # Cleanup config file (keep DB for caching)
-            try:
-                os.remove(config_path)
-            except:
-                pass
-            
             return analytics
             
         except Exception as e:
@@ -170,6 +217,87 @@ db_url = "sqlite://{db_path}"
                 self.supabase.update_job(job_id, "failed", 0, error_msg)
             raise
 
+    def _ensure_binary(self, job_id: str) -> None:
+        if os.path.exists(self.binary_path):
+            return
+        # Try cargo build first
+        if not os.path.exists(self.core_path):
+            raise Exception(f"vialytics-core not found at {self.core_path}")
+        print(f"[{job_id}] Binary not found, attempting cargo build...")
+        build_result = subprocess.run(
+            ["cargo", "build", "--release"],
+            cwd=self.core_path,
+            capture_output=True,
+            text=True,
+            timeout=600
+        )
+        if build_result.returncode != 0:
+            raise Exception(f"Cargo build failed: {build_result.stderr}")
+
+    def _run_process(self, wallet_address: str, job_id: str, until_signature: Optional[str],
+                     reporter: ProgressReporter) -> None:
+        """One-shot indexer process for the wallet, stopped once its history is fetched."""
+        config_path = self.create_config(wallet_address)
+        cmd = [self.binary_path, "--config", config_path, "--wallet-address", wallet_address]
+        if until_signature:
+            cmd += ["--until-signature", until_signature]
+        
+        # Run indexer with process streaming (like wrapped-worker)
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            env=self._indexer_env()
+        )
+        stderr_tail: Deque[str] = deque(maxlen=INDEXER_STDERR_TAIL_LINES)
+        
+        def read_output():
+            for line in iter(process.stdout.readline, ''):
+                line = line.strip()
+                event = parse_event(line)
+                if event is not None:
+                    if event["event"] == "progress":
+                        reporter.update(event)
+                    continue
+                print(f"[Indexer]: {line}")
+                
+                # Only the current line is checked, so each line costs the same
+                if "Finished fetching history" in line:
+                    print(f"[{job_id}] History fetch complete. Stopping indexer.")
+                    process.terminate() # Graceful shutdown for WAL flush
+                    try:
+                        process.wait(timeout=5)
+                    except subprocess.TimeoutExpired:
+                        process.kill()
+                    break
+        
+        def drain_stderr():
+            # Keep the pipe empty so a chatty indexer never blocks on a full buffer
+            for line in iter(process.stderr.readline, ''):
+                stderr_tail.append(line.rstrip())
+        
+        stderr_thread = threading.Thread(target=drain_stderr, daemon=True)
+        stderr_thread.start()
+        output_thread = threading.Thread(target=read_output)
+        output_thread.start()
+        output_thread.join(timeout=INDEXER_TIMEOUT_SECONDS)
+        
+        if output_thread.is_alive():
+            process.kill()
+            raise Exception("Indexer timed out")
+        stderr_thread.join(timeout=5)
+        
+        if not os.path.exists(self.get_wallet_db_path(wallet_address)):
+            stderr = "\n".join(stderr_tail)
+            raise Exception(f"Database not created. Stderr: {stderr}")
+        
+        # Cleanup config file (keep DB for caching)
+        try:
+            os.remove(config_path)
+        except:
+            pass
+
 
 _indexer_service: Optional[IndexerService] = None
 
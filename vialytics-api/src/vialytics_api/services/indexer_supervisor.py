@@ -0,0 +1,213 @@
+"""
+Pool of warm `vialytics-core --serve` processes.
+
+Each process keeps its RPC client open and backfills one wallet at a time on
+request (one JSON line on stdin, one JSON answer on stdout), so a job no
+longer pays for process startup and connection setup. Processes are started
+lazily, pinged before reuse once they have been idle for a while, and
+restarted when they crash or hang.
+"""
+import itertools
+import json
+import os
+import queue
+import subprocess
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from vialytics_api.services.indexer_progress import parse_event
+
+ProgressCallback = Callable[[Dict[str, Any]], Any]
+
+# Warm indexer processes; 0 runs one short-lived process per job instead
+INDEXER_PROCESSES = int(os.environ.get("VIALYTICS_INDEXER_PROCESSES", "2"))
+# Idle time after which a process is pinged before it gets a job
+INDEXER_HEALTH_INTERVAL_SECONDS = float(os.environ.get("VIALYTICS_INDEXER_HEALTH_INTERVAL_SECONDS", "30"))
+INDEXER_PING_TIMEOUT_SECONDS = 10.0
+
+
+class IndexerProcessError(Exception):
+    """The indexer process crashed, hung or answered with an error."""
+
+
+class IndexerTimeoutError(IndexerProcessError):
+    """The indexer process did not answer in time and was killed."""
+
+
+class IndexerProcess:
+    """One long-running indexer process, used by one request at a time."""
+
+    def __init__(self, cmd: List[str], env: Optional[Dict[str, str]] = None, name: str = "indexer"):
+        self.cmd = cmd
+        self.env = env
+        self.name = name
+        self.process: Optional[subprocess.Popen] = None
+        self._responses: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self._ids = itertools.count(1)
+        self.last_used = 0.0
+        self.starts = 0
+        self.jobs = 0
+
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def start(self) -> None:
+        self.stop()
+        self._responses = queue.Queue()
+        # stderr is inherited so indexer errors show up in the API logs
+        self.process = subprocess.Popen(
+            self.cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1, env=self.env
+        )
+        self.starts += 1
+        self.last_used = time.monotonic()
+        threading.Thread(target=self._read_output, args=(self.process, self._responses),
+                         name=f"{self.name}-stdout", daemon=True).start()
+
+    def _read_output(self, process: subprocess.Popen, responses: "queue.Queue[Optional[Dict[str, Any]]]") -> None:
+        for line in iter(process.stdout.readline, ''):
+            line = line.strip()
+            message = parse_event(line)
+            if message is not None:
+                responses.put(message)
+            else:
+                print(f"[{self.name}]: {line}")
+        responses.put(None)  # EOF: the process exited
+
+    def request(self, payload: Dict[str, Any], timeout: float,
+                on_progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """Send one request and wait for its answer; kills the process on timeout.
+
+        `progress` events printed while the request runs go to `on_progress`.
+        """
+        if not self.alive():
+            self.start()
+        request_id = str(next(self._ids))
+        try:
+            self.process.stdin.write(json.dumps({**payload, "id": request_id}) + "\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise IndexerProcessError(f"{self.name} is not accepting requests: {e}")
+
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stop()
+                    raise IndexerTimeoutError(f"{self.name} did not answer within {timeout:.0f}s")
+                try:
+                    message = self._responses.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+                if message is None:
+                    raise IndexerProcessError(f"{self.name} exited with code {self.process.wait()}")
+                if message["event"] == "progress":
+                    if on_progress is not None:
+                        on_progress(message)
+                    continue
+                if message.get("id") != request_id:
+                    continue  # "ready" or the answer to an abandoned request
+                if message["event"] == "error":
+                    raise IndexerProcessError(message.get("message", "indexer error"))
+                return message
+        finally:
+            self.last_used = time.monotonic()
+
+    def ping(self, timeout: float = INDEXER_PING_TIMEOUT_SECONDS) -> bool:
+        try:
+            return self.request({"op": "ping"}, timeout)["event"] == "pong"
+        except IndexerProcessError:
+            return False
+
+    def stop(self, timeout: float = 5) -> None:
+        """Close stdin so the process exits on its own; kill it if it does not."""
+        process, self.process = self.process, None
+        if process is None or process.poll() is not None:
+            return
+        try:
+            process.stdin.close()
+            process.wait(timeout=timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            process.kill()
+            process.wait()
+
+
+class IndexerSupervisor:
+    """Hands wallets to a fixed set of warm IndexerProcesses, restarting them as needed."""
+
+    def __init__(self, cmd: List[str], env: Optional[Dict[str, str]] = None, processes: int = INDEXER_PROCESSES,
+                 health_interval: float = INDEXER_HEALTH_INTERVAL_SECONDS):
+        if processes < 1:
+            raise ValueError("Need at least one indexer process")
+        self.health_interval = health_interval
+        self.processes = [IndexerProcess(cmd, env, name=f"Indexer-{i}") for i in range(processes)]
+        self._idle: "queue.Queue[IndexerProcess]" = queue.Queue()
+        for process in self.processes:
+            self._idle.put(process)
+        self._lock = threading.Lock()
+        self.crashes = 0
+        self.timeouts = 0
+        self.failed_health_checks = 0
+
+    def index(self, wallet: str, db_path: str, until_signature: Optional[str] = None,
+              timeout: float = 300, on_progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """Backfill one wallet into `db_path`; returns the indexer's `done` answer."""
+        payload = {"op": "index", "wallet": wallet, "db_url": f"sqlite://{db_path}",
+                   "until_signature": until_signature}
+        process = self._checkout()
+        try:
+            try:
+                return self._request(process, payload, timeout, on_progress)
+            except IndexerTimeoutError:
+                raise
+            except IndexerProcessError:
+                if process.alive():
+                    raise  # the indexer rejected the request
+                # Crashed mid-job: backfills are idempotent, so retry once on a fresh process
+                return self._request(process, payload, timeout, on_progress)
+        finally:
+            self._idle.put(process)
+
+    def _request(self, process: IndexerProcess, payload: Dict[str, Any], timeout: float,
+                 on_progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        try:
+            response = process.request(payload, timeout, on_progress)
+        except IndexerTimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            raise
+        except IndexerProcessError:
+            if not process.alive():
+                with self._lock:
+                    self.crashes += 1
+            raise
+        process.jobs += 1
+        return response
+
+    def _checkout(self) -> IndexerProcess:
+        process = self._idle.get()
+        idle_for = time.monotonic() - process.last_used
+        if process.alive() and idle_for >= self.health_interval and not process.ping():
+            with self._lock:
+                self.failed_health_checks += 1
+            print(f"[{process.name}]: failed health check, restarting")
+            process.stop()
+        return process
+
+    def shutdown(self) -> None:
+        for process in self.processes:
+            process.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "processes": len(self.processes),
+                "alive": sum(process.alive() for process in self.processes),
+                "idle": self._idle.qsize(),
+                "jobs": sum(process.jobs for process in self.processes),
+                "starts": sum(process.starts for process in self.processes),
+                "crashes": self.crashes,
+                "timeouts": self.timeouts,
+                "failed_health_checks": self.failed_health_checks,
+            }
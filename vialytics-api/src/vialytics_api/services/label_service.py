@@ -1,9 +1,12 @@
-from typing import Dict, Optional
+from typing import Dict, Iterable, Optional
+
+from vialytics_api.services.token_metadata import TokenMetadataService, get_token_metadata_service
 
 class LabelService:
     """Service for labeling known Solana addresses with friendly names."""
     
-    def __init__(self):
+    def __init__(self, token_metadata: Optional[TokenMetadataService] = None):
+        self._token_metadata = token_metadata
         # 0xAbim: expanded list of known addresses for better UX
         self.labels: Dict[str, str] = {
             # Native tokens
@@ -65,6 +68,20 @@ class LabelService:
             return "Unknown"
         return self.labels.get(address, f"{address[:4]}...{address[-4:]}")
     
+    def get_labels(self, addresses: Iterable[str]) -> Dict[str, str]:
+        """Labels for many addresses; unknown mints use their token symbol (one batched lookup)."""
+        addresses = set(addresses)
+        labels = {address: self.labels[address] for address in addresses if address in self.labels}
+        unknown = [address for address in addresses if address and address not in labels]
+        
+        token_metadata = self._token_metadata or get_token_metadata_service()
+        metadata = token_metadata.get_many(unknown) if unknown else {}
+        for address in addresses:
+            if address not in labels:
+                symbol = metadata.get(address, {}).get("symbol")
+                labels[address] = symbol or self.get_label(address)
+        return labels
+    
     def is_known_platform(self, address: str) -> bool:
         """Check if address is a known platform/program."""
         return address in self.labels
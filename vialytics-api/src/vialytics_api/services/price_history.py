@@ -0,0 +1,72 @@
+"""
+Disk-persisted cache of daily historical prices.
+
+Prices are stored per (coingecko id, currency, UTC epoch day) in a shared
+SQLite file under DATA_DIR, so every wallet and every request reuses the
+points already fetched. Days the provider had no price for are stored as
+NULL so they are not requested again. Only completed days are persisted.
+"""
+import os
+import sqlite3
+from typing import Dict, Optional
+
+from vialytics_api.core.database import DATA_DIR
+
+PRICE_HISTORY_DB_PATH = os.environ.get("VIALYTICS_PRICE_HISTORY_DB", os.path.join(DATA_DIR, "price_history.db"))
+
+PRICE_HISTORY_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS daily_prices (
+        coingecko_id TEXT NOT NULL,
+        currency TEXT NOT NULL,
+        day INTEGER NOT NULL, -- UTC epoch day (unix time // 86400)
+        price REAL, -- NULL when the provider has no price for that day
+        PRIMARY KEY (coingecko_id, currency, day)
+    )
+"""
+
+
+class DailyPriceCache:
+    """Daily close prices keyed by coingecko id, backed by SQLite."""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or PRICE_HISTORY_DB_PATH
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(PRICE_HISTORY_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # Short-lived connections: the cache is shared by threadpool workers
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def get(self, coingecko_id: str, currency: str, first_day: int, last_day: int) -> Dict[int, Optional[float]]:
+        """All stored days in [first_day, last_day], including known gaps (None)."""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT day, price FROM daily_prices WHERE coingecko_id = ? AND currency = ? AND day BETWEEN ? AND ?",
+                (coingecko_id, currency, first_day, last_day),
+            ).fetchall()
+        finally:
+            conn.close()
+        return dict(rows)
+
+    def put(self, coingecko_id: str, currency: str, prices: Dict[int, Optional[float]]) -> None:
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO daily_prices (coingecko_id, currency, day, price) VALUES (?, ?, ?, ?)",
+                    [(coingecko_id, currency, day, price) for day, price in prices.items()],
+                )
+        finally:
+            conn.close()
+
+
+_daily_price_cache: Optional[DailyPriceCache] = None
+
+
+def get_daily_price_cache() -> DailyPriceCache:
+    global _daily_price_cache
+    if _daily_price_cache is None:
+        _daily_price_cache = DailyPriceCache()
+    return _daily_price_cache
@@ -1,18 +1,64 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Optional
-import requests
-import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import os
+import threading
+
+from vialytics_api.core.cache import LRUCache
+from vialytics_api.core.http import HttpClient, get_http_client
+from vialytics_api.core.singleflight import SingleFlight
+from vialytics_api.core.dates import SECONDS_PER_DAY, utc_epoch_day
+from vialytics_api.services.price_history import DailyPriceCache, get_daily_price_cache
+
+PRICE_CACHE_MAX_ENTRIES = int(os.environ.get("VIALYTICS_PRICE_CACHE_MAX_ENTRIES", "1024"))
+PRICE_CACHE_TTL_SECONDS = float(os.environ.get("VIALYTICS_PRICE_CACHE_TTL_SECONDS", "300"))
+# Background threads filling the daily price history cache
+PRICE_HISTORY_WORKERS = int(os.environ.get("VIALYTICS_PRICE_HISTORY_WORKERS", "1"))
+# Fills queued or running at once; further misses are left for a later request
+PRICE_HISTORY_QUEUE_MAX = int(os.environ.get("VIALYTICS_PRICE_HISTORY_QUEUE_MAX", "64"))
 
 class AbstractPriceService(ABC):
     @abstractmethod
     def get_price(self, token_mint: str, currency: str = "USD") -> float:
         pass
 
+    def get_prices(self, token_mints: Iterable[str], currency: str = "USD") -> Dict[str, float]:
+        """Resolve many mints at once. Services with a bulk API should override this."""
+        return {mint: self.get_price(mint, currency) for mint in set(token_mints)}
+
+    def get_daily_prices(self, token_mints: Iterable[str], first_day: int, last_day: int,
+                         currency: str = "USD") -> Dict[str, Dict[int, float]]:
+        """Historical prices per mint and UTC epoch day in [first_day, last_day].
+
+        The result may be sparse; callers fall back to the current price for
+        mints or days without history. Services without history return {}.
+        """
+        return {}
+
+    def fill_daily_prices(self, token_mints: Iterable[str], first_day: int, last_day: int,
+                          currency: str = "USD") -> None:
+        """Fetch and store the history get_daily_prices() will need. Blocks until done."""
+
 class CoinGeckoPriceService(AbstractPriceService):
-    def __init__(self):
+    # Ids per /simple/price request; keeps the query string well under URL limits
+    MAX_IDS_PER_REQUEST = 100
+    MAX_QUEUED_FILLS = PRICE_HISTORY_QUEUE_MAX
+
+    def __init__(self, history_cache: Optional[DailyPriceCache] = None, http: Optional[HttpClient] = None):
         self.base_url = "https://api.coingecko.com/api/v3"
-        self.cache: Dict[str, tuple[float, float]] = {}
-        self.cache_ttl = 300
+        self.history_cache = history_cache
+        self.http = http or get_http_client()
+        # coingecko id -> latest price
+        self.cache = LRUCache(PRICE_CACHE_MAX_ENTRIES, ttl=PRICE_CACHE_TTL_SECONDS)
+        # Analyses running at the same time share identical CoinGecko requests
+        self.inflight = SingleFlight()
+        # Missing history is fetched here, never on the request path
+        self.history_executor = ThreadPoolExecutor(max_workers=PRICE_HISTORY_WORKERS,
+                                                   thread_name_prefix="price-history")
+        # (coingecko id, currency) -> days covered by a queued or running fill
+        self._pending_days: Dict[Tuple[str, str], Set[int]] = {}
+        self._queued_fills = 0
+        self._pending_lock = threading.Lock()
         
         self.mint_to_coingecko_id = {
             "So11111111111111111111111111111111111111112": "solana",
@@ -24,33 +70,163 @@ class CoinGeckoPriceService(AbstractPriceService):
         }
 
     def get_price(self, token_mint: str, currency: str = "USD") -> float:
-        coingecko_id = self.mint_to_coingecko_id.get(token_mint)
-        if not coingecko_id:
-            return 0.0
+        return self.get_prices([token_mint], currency)[token_mint]
+
+    def get_prices(self, token_mints: Iterable[str], currency: str = "USD") -> Dict[str, float]:
+        """Resolve all mints with one /simple/price request per chunk of cache misses."""
+        mints = set(token_mints)
+        prices = {mint: 0.0 for mint in mints}
+        
+        ids_to_mints: Dict[str, List[str]] = {}
+        for mint in mints:
+            coingecko_id = self.mint_to_coingecko_id.get(mint)
+            if not coingecko_id:
+                continue
+            cached = self.cache.get(coingecko_id)
+            if cached is not None:
+                prices[mint] = cached
+            else:
+                ids_to_mints.setdefault(coingecko_id, []).append(mint)
         
-        now = time.time()
-        if coingecko_id in self.cache:
-            price, timestamp = self.cache[coingecko_id]
-            if now - timestamp < self.cache_ttl:
-                return price
+        missing = sorted(ids_to_mints)
+        for start in range(0, len(missing), self.MAX_IDS_PER_REQUEST):
+            chunk = missing[start:start + self.MAX_IDS_PER_REQUEST]
+            fetched = self.inflight.do(("simple", tuple(chunk), currency),
+                                       lambda: self._fetch_simple_prices(chunk, currency))
+            if fetched is None:
+                continue
+            for coingecko_id in chunk:
+                price = fetched.get(coingecko_id, {}).get(currency.lower(), 0.0)
+                self.cache.set(coingecko_id, price)
+                for mint in ids_to_mints[coingecko_id]:
+                    prices[mint] = price
         
+        return prices
+
+    def _fetch_simple_prices(self, coingecko_ids: List[str], currency: str) -> Optional[Dict[str, Dict[str, float]]]:
         try:
             url = f"{self.base_url}/simple/price"
             params = {
-                "ids": coingecko_id,
+                "ids": ",".join(coingecko_ids),
                 "vs_currencies": currency.lower()
             }
-            response = requests.get(url, params=params, timeout=5)
+            response = self.http.get(url, params=params, timeout=5)
+            response.raise_for_status()
+            return response.json()
+            
+        except Exception as e:
+            print(f"Error fetching prices for {','.join(coingecko_ids)}: {e}")
+            return None
+
+    def get_daily_prices(self, token_mints: Iterable[str], first_day: int, last_day: int,
+                         currency: str = "USD") -> Dict[str, Dict[int, float]]:
+        """Daily prices already in the shared disk cache.
+
+        Missing days are not fetched inline: they are queued for the history
+        workers, so a cold request returns a sparse series instead of waiting
+        on one market_chart call per coin.
+        """
+        mints = set(token_mints)
+        cache = self.history_cache or get_daily_price_cache()
+        current = self.get_prices(mints, currency)
+        today = utc_epoch_day()
+        
+        history: Dict[str, Dict[int, float]] = {}
+        for mint in mints:
+            coingecko_id = self.mint_to_coingecko_id.get(mint)
+            if not coingecko_id:
+                continue
+            known, missing = self._cached_days(cache, coingecko_id, currency, first_day, last_day, today)
+            if missing:
+                self._schedule_fill(coingecko_id, currency, missing)
+            
+            prices = {day: price for day, price in known.items() if price is not None}
+            if first_day <= today <= last_day:
+                prices[today] = current[mint]
+            history[mint] = prices
+        
+        return history
+
+    def fill_daily_prices(self, token_mints: Iterable[str], first_day: int, last_day: int,
+                          currency: str = "USD") -> None:
+        cache = self.history_cache or get_daily_price_cache()
+        today = utc_epoch_day()
+        for mint in set(token_mints):
+            coingecko_id = self.mint_to_coingecko_id.get(mint)
+            if not coingecko_id:
+                continue
+            _, missing = self._cached_days(cache, coingecko_id, currency, first_day, last_day, today)
+            if missing:
+                self._fill(coingecko_id, currency, missing)
+
+    @staticmethod
+    def _cached_days(cache: DailyPriceCache, coingecko_id: str, currency: str, first_day: int, last_day: int,
+                     today: int) -> Tuple[Dict[int, Optional[float]], List[int]]:
+        """Stored days in the range and the completed days still missing."""
+        # Today's price is still moving, so only completed days are persisted
+        closed_last_day = min(last_day, today - 1)
+        if first_day > closed_last_day:
+            return {}, []
+        known = cache.get(coingecko_id, currency, first_day, closed_last_day)
+        return known, [day for day in range(first_day, closed_last_day + 1) if day not in known]
+
+    def _schedule_fill(self, coingecko_id: str, currency: str, missing: List[int]) -> None:
+        """Queue a fill for the missing days no other fill of this coin already covers."""
+        key = (coingecko_id, currency)
+        with self._pending_lock:
+            pending = self._pending_days.get(key, set())
+            days = [day for day in missing if day not in pending]
+            if not days:
+                return
+            if self._queued_fills >= self.MAX_QUEUED_FILLS:
+                print(f"Price history queue full, deferring {coingecko_id} days {days[0]}-{days[-1]}")
+                return
+            self._pending_days[key] = pending | set(days)
+            self._queued_fills += 1
+        self.history_executor.submit(self._fill_pending, coingecko_id, currency, days)
+
+    def _fill_pending(self, coingecko_id: str, currency: str, days: List[int]) -> None:
+        try:
+            self._fill(coingecko_id, currency, days)
+        finally:
+            with self._pending_lock:
+                self._queued_fills -= 1
+                pending = self._pending_days[(coingecko_id, currency)]
+                pending.difference_update(days)
+                if not pending:
+                    del self._pending_days[(coingecko_id, currency)]
+
+    def _fill(self, coingecko_id: str, currency: str, missing: List[int]) -> None:
+        """One market_chart request covering the missing days; gaps are stored as None."""
+        key = (coingecko_id, currency, missing[0], missing[-1])
+        try:
+            fetched = self.inflight.do(("market_chart",) + key,
+                                       lambda: self._fetch_market_chart(coingecko_id, currency, missing[0], missing[-1]))
+            if fetched is not None:
+                cache = self.history_cache or get_daily_price_cache()
+                cache.put(coingecko_id, currency, {day: fetched.get(day) for day in missing})
+        except Exception as e:
+            print(f"Error storing price history for {coingecko_id}: {e}")
+
+    def _fetch_market_chart(self, coingecko_id: str, currency: str, first_day: int, last_day: int) -> Optional[Dict[int, float]]:
+        """Last quoted price of each UTC day in the range."""
+        try:
+            url = f"{self.base_url}/coins/{coingecko_id}/market_chart/range"
+            params = {
+                "vs_currency": currency.lower(),
+                "from": first_day * SECONDS_PER_DAY,
+                "to": (last_day + 1) * SECONDS_PER_DAY - 1,
+            }
+            response = self.http.get(url, params=params, timeout=10)
             response.raise_for_status()
-            data = response.json()
+            points = response.json().get("prices", [])
             
-            price = data.get(coingecko_id, {}).get(currency.lower(), 0.0)
-            self.cache[coingecko_id] = (price, now)
-            return price
+            # Points are ascending; later points in a day overwrite earlier ones
+            return {int(ms // 1000) // SECONDS_PER_DAY: price for ms, price in points}
             
         except Exception as e:
-            print(f"Error fetching price for {coingecko_id}: {e}")
-            return 0.0
+            print(f"Error fetching price history for {coingecko_id}: {e}")
+            return None
 
 class StaticPriceService(AbstractPriceService):
     def __init__(self):
@@ -65,7 +241,13 @@ class StaticPriceService(AbstractPriceService):
     def get_price(self, token_mint: str, currency: str = "USD") -> float:
         return self.prices.get(token_mint, 0.0)
 
-_price_service = CoinGeckoPriceService()
+    def get_prices(self, token_mints: Iterable[str], currency: str = "USD") -> Dict[str, float]:
+        return {mint: self.prices.get(mint, 0.0) for mint in token_mints}
+
+_price_service: Optional[AbstractPriceService] = None
 
 def get_price_service() -> AbstractPriceService:
+    global _price_service
+    if _price_service is None:
+        _price_service = CoinGeckoPriceService()
     return _price_service
@@ -0,0 +1,109 @@
+"""
+SQL pushdown backend: compute analytics aggregates inside SQLite.
+
+Instead of pulling every transaction and movement row into Python, these
+queries group and sum inside the wallet DB so only the small aggregated
+result sets cross into Python. They fill the same WalletAggregates as the
+row-by-row pass. The covering indexes in migrations.sql keep them to index
+scans. Movement sums too large for SQLite's 64-bit integers raise
+PushdownOverflowError, and the analyzer falls back to the Python pass.
+"""
+import sqlite3
+
+from vialytics_api.services.aggregation import WalletAggregates, _new_mint_flow
+
+
+class PushdownOverflowError(ArithmeticError):
+    """A SQLite SUM overflowed int64; the Python pass sums the rows exactly."""
+
+MINT_FLOWS_QUERY = """
+    WITH flows AS (
+        SELECT mint,
+               SUM(amount) AS net,
+               SUM(CASE WHEN amount > 0 THEN amount ELSE 0 END) AS received,
+               SUM(CASE WHEN amount < 0 THEN -amount ELSE 0 END) AS sent,
+               SUM(amount != 0) AS transfers,
+               MAX(CASE WHEN amount > 0 THEN amount ELSE 0 END) AS max_in,
+               MAX(CASE WHEN amount < 0 THEN -amount ELSE 0 END) AS max_out
+        FROM token_movements
+        GROUP BY mint
+    )
+    -- Earliest block_time (NULL first) of each mint's largest movements,
+    -- looked up through idx_token_movements_mint_amount
+    SELECT flows.*,
+           -- Decimals of the first movement that records them, in the row
+           -- order of the Python pass
+           (SELECT decimals FROM token_movements m
+            WHERE m.mint = flows.mint AND m.decimals IS NOT NULL
+            ORDER BY block_time, id LIMIT 1) AS decimals,
+           (SELECT block_time FROM token_movements m
+            WHERE m.mint = flows.mint AND m.amount = flows.max_in AND flows.max_in > 0
+            ORDER BY block_time LIMIT 1) AS max_in_at,
+           (SELECT block_time FROM token_movements m
+            WHERE m.mint = flows.mint AND m.amount = -flows.max_out AND flows.max_out > 0
+            ORDER BY block_time LIMIT 1) AS max_out_at
+    FROM flows
+"""
+
+INCOME_QUERY = """
+    SELECT source, mint, SUM(amount) AS received
+    FROM token_movements
+    WHERE amount > 0 AND source IS NOT NULL AND source != ''
+    GROUP BY source, mint
+"""
+
+INTERACTIONS_QUERY = """
+    SELECT destination, COUNT(*) AS movements
+    FROM token_movements
+    WHERE amount < 0 AND destination IS NOT NULL AND destination != ''
+    GROUP BY destination
+"""
+
+TRANSACTION_TOTALS_QUERY = """
+    SELECT COUNT(*) AS tx_count,
+           COALESCE(SUM(fee), 0) AS fee_total,
+           COALESCE(SUM(CASE WHEN status THEN 0 ELSE 1 END), 0) AS failed_count
+    FROM transactions
+"""
+
+
+def aggregate_transactions(conn: sqlite3.Connection, aggregates: WalletAggregates) -> None:
+    tx_count, fee_total, failed_count = conn.execute(TRANSACTION_TOTALS_QUERY).fetchone()
+    aggregates.tx_count += tx_count
+    aggregates.fee_total += fee_total
+    aggregates.failed_count += failed_count
+
+
+def aggregate_movements(conn: sqlite3.Connection, aggregates: WalletAggregates) -> None:
+    """Fold every movement into `aggregates`.
+
+    Raises PushdownOverflowError, before touching `aggregates`, when a sum
+    does not fit SQLite's 64-bit integers.
+    """
+    try:
+        pushed = _pushed_movements(conn)
+    except sqlite3.OperationalError as e:
+        if "integer overflow" not in str(e):
+            raise
+        raise PushdownOverflowError("Token movement sums overflow SQLite integers") from e
+    aggregates.merge(pushed)
+
+
+def _pushed_movements(conn: sqlite3.Connection) -> WalletAggregates:
+    pushed = WalletAggregates()
+
+    for (mint, net, received, sent, transfers, max_in, max_out, decimals,
+         max_in_at, max_out_at) in conn.execute(MINT_FLOWS_QUERY).fetchall():
+        flow = _new_mint_flow()
+        flow.update(net=net, received=received, sent=sent, transfers=transfers, max_in=max_in, max_out=max_out,
+                    max_in_at=max_in_at, max_out_at=max_out_at)
+        pushed.mint_flows[mint] = flow
+        if decimals is not None:
+            pushed.mint_decimals[mint] = decimals
+
+    for source, mint, received in conn.execute(INCOME_QUERY):
+        pushed.income.setdefault(source, {})[mint] = received
+
+    for destination, count in conn.execute(INTERACTIONS_QUERY):
+        pushed.interactions[destination] = count
+    return pushed
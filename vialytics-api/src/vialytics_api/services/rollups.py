@@ -0,0 +1,288 @@
+"""
+Materialized daily / monthly rollups kept in the wallet DB.
+
+Transactions are grouped by SQLite into 15-minute UTC slots, and each slot is
+mapped to a local date once (every real-world UTC offset is a multiple of 15
+minutes), so timezone bucketing never converts individual rows. Daily and
+monthly transaction counts, fee sums and failure counts are stored per
+timezone; per-mint net flows are stored per UTC epoch day, matching the
+balance timeline. Each rollup remembers the last rowid it folded in, so only
+rows added since are grouped on the next analysis. The delta is grouped
+without the write lock (plan_rollups) and stored by incremental analyses in
+the same short transaction as the analytics checkpoint (store_rollups).
+"""
+import sqlite3
+import sys
+from datetime import datetime, tzinfo
+from typing import Dict, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from vialytics_api.core.dates import SECONDS_PER_DAY
+
+SLOT_SECONDS = 900
+# Timezone name stored for the server's local time
+LOCAL_TIMEZONE = "local"
+
+ROLLUP_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS rollup_daily_activity (
+        timezone TEXT NOT NULL,
+        day TEXT NOT NULL,
+        tx_count INTEGER NOT NULL,
+        fee_sum INTEGER NOT NULL,
+        failed_count INTEGER NOT NULL,
+        PRIMARY KEY (timezone, day)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS rollup_monthly_activity (
+        timezone TEXT NOT NULL,
+        month TEXT NOT NULL,
+        tx_count INTEGER NOT NULL,
+        fee_sum INTEGER NOT NULL,
+        failed_count INTEGER NOT NULL,
+        PRIMARY KEY (timezone, month)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS rollup_daily_mint_flows (
+        day INTEGER NOT NULL,
+        mint TEXT NOT NULL,
+        net INTEGER NOT NULL,
+        PRIMARY KEY (day, mint)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS rollup_state (
+        name TEXT PRIMARY KEY,
+        last_rowid INTEGER NOT NULL
+    );
+"""
+
+SLOT_ACTIVITY_QUERY = f"""
+    SELECT block_time / {SLOT_SECONDS} AS slot,
+           COUNT(*) AS tx_count,
+           COALESCE(SUM(fee), 0) AS fee_sum,
+           SUM(CASE WHEN status THEN 0 ELSE 1 END) AS failed_count
+    FROM transactions
+    WHERE rowid > ? AND rowid <= ? AND block_time
+    GROUP BY slot
+"""
+
+DAILY_MINT_FLOWS_QUERY = f"""
+    SELECT block_time / {SECONDS_PER_DAY} AS day, mint, SUM(amount) AS net
+    FROM token_movements
+    WHERE id > ? AND id <= ? AND block_time AND amount != 0
+    GROUP BY day, mint
+"""
+
+MINT_FLOWS_STATE = "mint_flows"
+
+
+class TimezoneBuckets:
+    """Maps 15-minute UTC slots to local dates in one timezone, memoized per slot."""
+
+    def __init__(self, timezone: Optional[str] = None):
+        self.name = timezone or LOCAL_TIMEZONE
+        if self.name == LOCAL_TIMEZONE:
+            self._tz: Optional[tzinfo] = None
+        else:
+            try:
+                self._tz = ZoneInfo(self.name)
+            except (ZoneInfoNotFoundError, ValueError):
+                raise ValueError(f"Unknown timezone: {self.name}")
+        self._days: Dict[int, str] = {}
+
+    def day(self, slot: int) -> str:
+        day = self._days.get(slot)
+        if day is None:
+            day = self._days[slot] = datetime.fromtimestamp(slot * SLOT_SECONDS, self._tz).strftime("%Y-%m-%d")
+        return day
+
+
+def _new_activity() -> Dict[str, int]:
+    return {"tx_count": 0, "fee_sum": 0, "failed_count": 0}
+
+
+class Rollups:
+    """Activity per local day and month, and per-mint net flow per UTC day."""
+
+    def __init__(self):
+        # local date (YYYY-MM-DD) / month (YYYY-MM) -> activity totals
+        self.daily_activity: Dict[str, Dict[str, int]] = {}
+        self.monthly_activity: Dict[str, Dict[str, int]] = {}
+        # UTC epoch day (block_time // 86400) -> mint -> signed raw amount
+        self.daily_mint_flows: Dict[int, Dict[str, int]] = {}
+
+
+def collect_rollups(conn: sqlite3.Connection, buckets: TimezoneBuckets,
+                    tx_rowids: Optional[Tuple[int, int]],
+                    movement_ids: Optional[Tuple[int, int]]) -> Rollups:
+    """Group the rows in (after, upto] of each table into rollups; None skips a table."""
+    rollups = Rollups()
+    if tx_rowids is not None:
+        for slot, tx_count, fee_sum, failed_count in conn.execute(SLOT_ACTIVITY_QUERY, tx_rowids):
+            day = buckets.day(slot)
+            for buckets_by_key, key in ((rollups.daily_activity, day), (rollups.monthly_activity, day[:7])):
+                totals = buckets_by_key.get(key)
+                if totals is None:
+                    totals = buckets_by_key[key] = _new_activity()
+                totals["tx_count"] += tx_count
+                totals["fee_sum"] += fee_sum
+                totals["failed_count"] += failed_count
+
+    if movement_ids is not None:
+        for day, mint, net in conn.execute(DAILY_MINT_FLOWS_QUERY, movement_ids):
+            rollups.daily_mint_flows.setdefault(day, {})[mint] = net
+    return rollups
+
+
+def build_rollups(conn: sqlite3.Connection, buckets: TimezoneBuckets,
+                  activity: bool = True, mint_flows: bool = True) -> Rollups:
+    """Rollups over every row, computed in memory without touching the DB."""
+    everything = (0, sys.maxsize)
+    return collect_rollups(conn, buckets,
+                           everything if activity else None,
+                           everything if mint_flows else None)
+
+
+def _last_rowid(conn: sqlite3.Connection, name: str) -> int:
+    try:
+        row = conn.execute("SELECT last_rowid FROM rollup_state WHERE name = ?", (name,)).fetchone()
+    except sqlite3.OperationalError:
+        return 0  # No rollup tables yet
+    return row[0] if row else 0
+
+
+def _states(buckets: TimezoneBuckets, movement_id: int, tx_rowid: int,
+            activity: bool, mint_flows: bool) -> Dict[str, int]:
+    """rollup_state name -> the high-water mark it must reach."""
+    states = {}
+    if activity:
+        states[f"activity:{buckets.name}"] = tx_rowid
+    if mint_flows:
+        states[MINT_FLOWS_STATE] = movement_id
+    return states
+
+
+def is_current(conn: sqlite3.Connection, buckets: TimezoneBuckets, movement_id: int, tx_rowid: int,
+               activity: bool = True, mint_flows: bool = True) -> bool:
+    """Whether the stored rollups cover exactly the rows up to these high-water marks."""
+    return all(_last_rowid(conn, name) == mark
+               for name, mark in _states(buckets, movement_id, tx_rowid, activity, mint_flows).items())
+
+
+def _add(rollups: Rollups, delta: Rollups) -> None:
+    for totals_by_key, delta_by_key in ((rollups.daily_activity, delta.daily_activity),
+                                        (rollups.monthly_activity, delta.monthly_activity)):
+        for key, delta_totals in delta_by_key.items():
+            totals = totals_by_key.setdefault(key, _new_activity())
+            for name, value in delta_totals.items():
+                totals[name] += value
+    for day, flows in delta.daily_mint_flows.items():
+        day_flows = rollups.daily_mint_flows.setdefault(day, {})
+        for mint, net in flows.items():
+            day_flows[mint] = day_flows.get(mint, 0) + net
+
+
+class RollupUpdate:
+    """Rows to fold into the stored rollups, computed without the write lock.
+
+    `rollups` is the stored rollups with the delta applied, i.e. what the
+    tables will hold once store_rollups() has run.
+    """
+
+    def __init__(self, buckets: TimezoneBuckets, observed: Dict[str, int], base: Dict[str, int],
+                 target: Dict[str, int], delta: Rollups, rollups: Rollups):
+        self.buckets = buckets
+        # rollup_state marks as read, where the delta starts (0 = rebuild) and where it ends
+        self.observed = observed
+        self.base = base
+        self.target = target
+        self.delta = delta
+        self.rollups = rollups
+
+
+def plan_rollups(conn: sqlite3.Connection, buckets: TimezoneBuckets, movement_id: int, tx_rowid: int,
+                 activity: bool = True, mint_flows: bool = True) -> RollupUpdate:
+    """Group the rows added since the stored rollups, up to the high-water marks.
+
+    Only reads, so it can run in the caller's read transaction.
+    """
+    target = _states(buckets, movement_id, tx_rowid, activity, mint_flows)
+    observed = {name: _last_rowid(conn, name) for name in target}
+    # Rows were removed (e.g. the wallet was re-indexed): rebuild from scratch
+    base = {name: last if last <= target[name] else 0 for name, last in observed.items()}
+    activity_state = f"activity:{buckets.name}"
+    tx_rowids = (base[activity_state], tx_rowid) if activity else None
+    movement_ids = (base[MINT_FLOWS_STATE], movement_id) if mint_flows else None
+    delta = collect_rollups(conn, buckets, tx_rowids, movement_ids)
+
+    stored = Rollups()
+    try:
+        stored = read_rollups(conn, buckets.name,
+                              activity=activity and base[activity_state] > 0,
+                              mint_flows=mint_flows and base[MINT_FLOWS_STATE] > 0)
+    except sqlite3.OperationalError:
+        pass  # No rollup tables yet
+    _add(stored, delta)
+    return RollupUpdate(buckets, observed, base, target, delta, stored)
+
+
+def store_rollups(conn: sqlite3.Connection, update: RollupUpdate) -> bool:
+    """Write a planned update inside the caller's write transaction.
+
+    Returns False (writing nothing) if the stored rollups changed since the
+    update was planned, e.g. another analysis stored the same rows first.
+    """
+    # Statement by statement: executescript() would commit the caller's transaction
+    for statement in ROLLUP_SCHEMA.split(";"):
+        if statement.strip():
+            conn.execute(statement)
+
+    if any(_last_rowid(conn, name) != last for name, last in update.observed.items()):
+        return False
+
+    timezone = update.buckets.name
+    if update.base.get(f"activity:{timezone}") == 0:
+        conn.execute("DELETE FROM rollup_daily_activity WHERE timezone = ?", (timezone,))
+        conn.execute("DELETE FROM rollup_monthly_activity WHERE timezone = ?", (timezone,))
+    if update.base.get(MINT_FLOWS_STATE) == 0:
+        conn.execute("DELETE FROM rollup_daily_mint_flows")
+
+    delta = update.delta
+    for table, key_column, totals_by_key in (
+        ("rollup_daily_activity", "day", delta.daily_activity),
+        ("rollup_monthly_activity", "month", delta.monthly_activity),
+    ):
+        conn.executemany(
+            f"INSERT INTO {table} (timezone, {key_column}, tx_count, fee_sum, failed_count) "
+            "VALUES (?, ?, ?, ?, ?) "
+            f"ON CONFLICT (timezone, {key_column}) DO UPDATE SET "
+            "tx_count = tx_count + excluded.tx_count, "
+            "fee_sum = fee_sum + excluded.fee_sum, "
+            "failed_count = failed_count + excluded.failed_count",
+            [(timezone, key, t["tx_count"], t["fee_sum"], t["failed_count"]) for key, t in totals_by_key.items()],
+        )
+    conn.executemany(
+        "INSERT INTO rollup_daily_mint_flows (day, mint, net) VALUES (?, ?, ?) "
+        "ON CONFLICT (day, mint) DO UPDATE SET net = net + excluded.net",
+        [(day, mint, net) for day, flows in delta.daily_mint_flows.items() for mint, net in flows.items()],
+    )
+    conn.executemany("INSERT OR REPLACE INTO rollup_state (name, last_rowid) VALUES (?, ?)",
+                     list(update.target.items()))
+    return True
+
+
+def read_rollups(conn: sqlite3.Connection, timezone: str,
+                 activity: bool = True, mint_flows: bool = True) -> Rollups:
+    rollups = Rollups()
+    if activity:
+        for table, key_column, target in (
+            ("rollup_daily_activity", "day", rollups.daily_activity),
+            ("rollup_monthly_activity", "month", rollups.monthly_activity),
+        ):
+            for key, tx_count, fee_sum, failed_count in conn.execute(
+                f"SELECT {key_column}, tx_count, fee_sum, failed_count FROM {table} "
+                f"WHERE timezone = ? ORDER BY {key_column}",
+                (timezone,),
+            ):
+                target[key] = {"tx_count": tx_count, "fee_sum": fee_sum, "failed_count": failed_count}
+
+    if mint_flows:
+        for day, mint, net in conn.execute("SELECT day, mint, net FROM rollup_daily_mint_flows"):
+            rollups.daily_mint_flows.setdefault(day, {})[mint] = net
+    return rollups
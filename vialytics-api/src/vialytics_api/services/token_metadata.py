@@ -0,0 +1,147 @@
+"""
+Token metadata service: decimals, symbol and name per mint.
+
+Backed by a shared SQLite cache under DATA_DIR with an in-memory LRU in
+front. It is filled in bulk from Helius DAS responses and from the decimals
+recorded on token_movements rows, and read with one batched lookup per
+analysis.
+"""
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from vialytics_api.core.cache import LRUCache
+from vialytics_api.core.database import DATA_DIR
+
+TOKEN_METADATA_DB_PATH = os.environ.get("VIALYTICS_TOKEN_METADATA_DB", os.path.join(DATA_DIR, "token_metadata.db"))
+
+# Used when a mint has never been seen in DAS or in a movement row
+DEFAULT_DECIMALS = 6
+
+# Well-known mints, so common tokens value correctly on a cold cache
+KNOWN_TOKENS: Dict[str, Dict[str, Any]] = {
+    "So11111111111111111111111111111111111111112": {"decimals": 9, "symbol": "SOL", "name": "Wrapped SOL"},
+    "EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v": {"decimals": 6, "symbol": "USDC", "name": "USD Coin"},
+    "Es9vMFrzaCERmJfrF4H2FYD4KCoNkY11McCe8BenwNYB": {"decimals": 6, "symbol": "USDT", "name": "USDT"},
+    "DezXAZ8z7PnrnRJjz3wXBoRgixCa6xjnB7YaB1pPB263": {"decimals": 5, "symbol": "BONK", "name": "Bonk"},
+    "4k3Dyjzvzp8eMZWUXbBCjEvwSkkk59S5iCNLY3QrkX6R": {"decimals": 6, "symbol": "RAY", "name": "Raydium"},
+    "JUPyiwrYJFskUPiHa7hkeR8VUtAeFoSYbKedZNsDvCN": {"decimals": 6, "symbol": "JUP", "name": "Jupiter"},
+    "mSoLzYCxHdYgdzU16g5QSh3i5K3z3KZK7ytfqcJm7So": {"decimals": 9, "symbol": "mSOL", "name": "Marinade staked SOL"},
+}
+
+TOKEN_METADATA_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS token_metadata (
+        mint TEXT PRIMARY KEY,
+        decimals INTEGER,
+        symbol TEXT,
+        name TEXT,
+        updated_at INTEGER NOT NULL
+    )
+"""
+
+# Bound on host parameters per IN (...) query
+_LOOKUP_BATCH_SIZE = 500
+_MISSING = object()
+
+
+class TokenMetadataService:
+    """Persistent mint -> {decimals, symbol, name} lookups."""
+
+    def __init__(self, db_path: Optional[str] = None, max_memory_entries: int = 10000):
+        self.db_path = db_path or TOKEN_METADATA_DB_PATH
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self.memory = LRUCache(max_memory_entries)
+        with self._connect() as conn:
+            conn.execute(TOKEN_METADATA_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def get(self, mint: str) -> Optional[Dict[str, Any]]:
+        return self.get_many([mint]).get(mint)
+
+    def get_many(self, mints: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Metadata for every known mint in one batched lookup; unknown mints are omitted."""
+        found: Dict[str, Dict[str, Any]] = {}
+        misses = []
+        for mint in set(mints):
+            cached = self.memory.get(mint, _MISSING)
+            if cached is _MISSING:
+                misses.append(mint)
+            elif cached is not None:
+                found[mint] = cached
+
+        if misses:
+            stored = self._load(misses)
+            for mint in misses:
+                record = stored.get(mint) or KNOWN_TOKENS.get(mint)
+                if record is not None:
+                    record = {"mint": mint, **record}
+                    found[mint] = record
+                # Remember misses too, so unknown mints do not hit the DB again
+                self.memory.set(mint, record)
+        return found
+
+    def _load(self, mints: list) -> Dict[str, Dict[str, Any]]:
+        stored = {}
+        conn = self._connect()
+        try:
+            for start in range(0, len(mints), _LOOKUP_BATCH_SIZE):
+                batch = mints[start:start + _LOOKUP_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT mint, decimals, symbol, name FROM token_metadata WHERE mint IN ({placeholders})",
+                    batch,
+                )
+                for mint, decimals, symbol, name in rows:
+                    known = KNOWN_TOKENS.get(mint, {})
+                    stored[mint] = {
+                        "decimals": decimals if decimals is not None else known.get("decimals"),
+                        "symbol": symbol or known.get("symbol"),
+                        "name": name or known.get("name"),
+                    }
+        finally:
+            conn.close()
+        return stored
+
+    def upsert_many(self, records: Iterable[Dict[str, Any]]) -> None:
+        """Store records with a "mint" key; fields that are None keep their stored value."""
+        rows = [
+            (r["mint"], r.get("decimals"), r.get("symbol"), r.get("name"), int(time.time()))
+            for r in records if r.get("mint")
+        ]
+        if not rows:
+            return
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    """
+                    INSERT INTO token_metadata (mint, decimals, symbol, name, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(mint) DO UPDATE SET
+                        decimals = COALESCE(excluded.decimals, decimals),
+                        symbol = COALESCE(excluded.symbol, symbol),
+                        name = COALESCE(excluded.name, name),
+                        updated_at = excluded.updated_at
+                    """,
+                    rows,
+                )
+        except sqlite3.OperationalError as e:
+            print(f"Token metadata save error: {e}")
+        finally:
+            conn.close()
+        # Re-read on next access so merged fields are picked up
+        for row in rows:
+            self.memory.pop(row[0])
+
+
+_token_metadata_service: Optional[TokenMetadataService] = None
+
+
+def get_token_metadata_service() -> TokenMetadataService:
+    global _token_metadata_service
+    if _token_metadata_service is None:
+        _token_metadata_service = TokenMetadataService()
+    return _token_metadata_service
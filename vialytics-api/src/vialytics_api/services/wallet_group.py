@@ -0,0 +1,202 @@
+"""
+Combined analytics for a group of wallets owned by the same user.
+
+Each wallet DB is ATTACHed in turn and its rows are copied into one scratch DB
+with the indexer schema, so WalletAnalyzer (any backend, any section set) runs
+a single pass over the whole group. While merging:
+  - a transaction seen in several wallet DBs is counted once (by signature)
+  - a movement recorded in several wallet DBs is counted once
+  - transfers between wallets of the group are netted out
+  - the group's own wallets are dropped as income sources and counterparties
+
+The indexer stores one movement per token account whose balance changed, with
+the account owner as `source` (and no `destination`). A transfer between two
+group wallets is therefore a negative leg owned by one of them and a positive
+leg owned by another, in the same transaction and mint; the matched amount is
+removed from both legs. Since `source` is the owner rather than the sender,
+whatever remains on a group wallet's legs would still list that wallet as a
+"top income source", so group addresses are cleared from `source` and
+`destination` after netting; the amounts still count towards token flows.
+"""
+import os
+import sqlite3
+import tempfile
+from typing import Any, Dict, List, Mapping, Tuple
+
+from vialytics_api.services.analytics import WalletAnalyzer
+
+GROUP_SCHEMA = """
+    CREATE TABLE transactions (
+        signature TEXT PRIMARY KEY,
+        slot INTEGER NOT NULL,
+        block_time INTEGER,
+        fee INTEGER,
+        status BOOLEAN,
+        meta_json TEXT
+    );
+    CREATE TABLE token_movements (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        signature TEXT NOT NULL,
+        mint TEXT NOT NULL,
+        amount INTEGER NOT NULL,
+        decimals INTEGER,
+        source TEXT,
+        destination TEXT,
+        block_time INTEGER
+    );
+    CREATE TABLE group_wallets (address TEXT PRIMARY KEY);
+    CREATE TABLE staged_movements (
+        wallet_index INTEGER NOT NULL,
+        signature TEXT NOT NULL,
+        mint TEXT NOT NULL,
+        amount INTEGER NOT NULL,
+        decimals INTEGER,
+        source TEXT,
+        destination TEXT,
+        block_time INTEGER
+    );
+"""
+
+# Indexes used by the SQL pushdown backend, created after the bulk load
+GROUP_INDEXES = """
+    CREATE INDEX idx_transactions_block_time ON transactions(block_time);
+    CREATE INDEX idx_token_movements_mint_amount ON token_movements(mint, amount, decimals);
+    CREATE INDEX idx_token_movements_source ON token_movements(source, mint, amount);
+    CREATE INDEX idx_token_movements_destination ON token_movements(destination, amount);
+"""
+
+STAGE_MOVEMENTS_QUERY = """
+    INSERT INTO staged_movements
+    SELECT ?, signature, mint, amount, decimals, source, destination, block_time
+    FROM wallet.token_movements
+    ORDER BY id
+"""
+
+# Keep each movement from the first wallet DB that recorded it
+MERGE_MOVEMENTS_QUERY = """
+    INSERT INTO token_movements (signature, mint, amount, decimals, source, destination, block_time)
+    SELECT signature, mint, amount, decimals, source, destination, block_time
+    FROM (
+        SELECT *, MIN(wallet_index) OVER (
+            PARTITION BY signature, mint, amount, source, destination
+        ) AS first_wallet
+        FROM staged_movements
+    )
+    WHERE wallet_index = first_wallet
+    ORDER BY block_time, wallet_index
+"""
+
+# Legs owned by group wallets, in (signature, mint) pairs that have both a
+# sending and a receiving group wallet
+INTERNAL_LEGS_QUERY = """
+    WITH group_legs AS (
+        SELECT id, signature, mint, source, amount
+        FROM token_movements
+        WHERE source IN (SELECT address FROM group_wallets)
+    ), internal AS (
+        SELECT signature, mint
+        FROM group_legs
+        GROUP BY signature, mint
+        HAVING MIN(amount) < 0 AND MAX(amount) > 0 AND COUNT(DISTINCT source) > 1
+    )
+    SELECT id, signature, mint, source, amount
+    FROM group_legs JOIN internal USING (signature, mint)
+    ORDER BY signature, mint, id
+"""
+
+# After netting, the group's own addresses are not sources or counterparties
+CLEAR_GROUP_ADDRESSES_QUERY = """
+    UPDATE token_movements SET
+        source = CASE WHEN source IN (SELECT address FROM group_wallets) THEN NULL ELSE source END,
+        destination = CASE WHEN destination IN (SELECT address FROM group_wallets) THEN NULL ELSE destination END
+    WHERE source IN (SELECT address FROM group_wallets)
+       OR destination IN (SELECT address FROM group_wallets)
+"""
+
+
+def _net_internal_transfers(conn: sqlite3.Connection) -> None:
+    """Remove the amounts moved between group wallets from both legs."""
+    legs_by_transfer: Dict[Tuple[str, str], List[List[Any]]] = {}
+    for movement_id, signature, mint, owner, amount in conn.execute(INTERNAL_LEGS_QUERY):
+        legs_by_transfer.setdefault((signature, mint), []).append([movement_id, owner, amount])
+
+    updates, deletes = [], []
+    for legs in legs_by_transfer.values():
+        sent = [leg for leg in legs if leg[2] < 0]
+        received = [leg for leg in legs if leg[2] > 0]
+        for out_leg in sent:
+            for in_leg in received:
+                if in_leg[1] == out_leg[1] or not in_leg[2] or not out_leg[2]:
+                    continue
+                matched = min(-out_leg[2], in_leg[2])
+                out_leg[2] += matched
+                in_leg[2] -= matched
+        for movement_id, _, amount in sent + received:
+            if amount:
+                updates.append((amount, movement_id))
+            else:
+                deletes.append((movement_id,))
+    conn.executemany("UPDATE token_movements SET amount = ? WHERE id = ?", updates)
+    conn.executemany("DELETE FROM token_movements WHERE id = ?", deletes)
+
+
+def merge_wallet_dbs(wallet_dbs: Mapping[str, str], group_db_path: str) -> None:
+    """Merge the given {wallet address: wallet DB path} into a fresh group DB."""
+    conn = sqlite3.connect(group_db_path)
+    try:
+        # Scratch DB that lives for one analysis: skip the journal and fsyncs
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.executescript(GROUP_SCHEMA)
+        conn.executemany("INSERT OR IGNORE INTO group_wallets (address) VALUES (?)",
+                         [(wallet,) for wallet in wallet_dbs])
+        conn.commit()
+
+        for wallet_index, db_path in enumerate(wallet_dbs.values()):
+            conn.execute("ATTACH DATABASE ? AS wallet", (db_path,))
+            try:
+                conn.execute(
+                    "INSERT OR IGNORE INTO transactions (signature, slot, block_time, fee, status) "
+                    "SELECT signature, slot, block_time, fee, status FROM wallet.transactions ORDER BY rowid"
+                )
+                conn.execute(STAGE_MOVEMENTS_QUERY, (wallet_index,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.execute("DETACH DATABASE wallet")
+
+        conn.execute(MERGE_MOVEMENTS_QUERY)
+        conn.execute("DROP TABLE staged_movements")
+        _net_internal_transfers(conn)
+        conn.execute(CLEAR_GROUP_ADDRESSES_QUERY)
+        conn.executescript(GROUP_INDEXES)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class WalletGroupAnalyzer:
+    """Runs WalletAnalyzer once over the merged rows of several wallets."""
+
+    def __init__(self, wallet_dbs: Mapping[str, str], **analyzer_options: Any):
+        if not wallet_dbs:
+            raise ValueError("A wallet group needs at least one wallet")
+        missing = [path for path in wallet_dbs.values() if not os.path.exists(path)]
+        if missing:
+            raise FileNotFoundError(f"No wallet DB at {', '.join(missing)}")
+        if analyzer_options.get("incremental"):
+            raise ValueError("Group analytics are computed from scratch and cannot be incremental")
+        self.wallet_dbs = dict(wallet_dbs)
+        self.analyzer_options = analyzer_options
+
+    def analyze(self) -> Dict[str, Any]:
+        with tempfile.TemporaryDirectory(prefix="vialytics_group_") as tmp:
+            group_db_path = os.path.join(tmp, "group.db")
+            merge_wallet_dbs(self.wallet_dbs, group_db_path)
+            analyzer = WalletAnalyzer(db_path=group_db_path, **self.analyzer_options)
+            try:
+                return analyzer.analyze()
+            finally:
+                analyzer.close()
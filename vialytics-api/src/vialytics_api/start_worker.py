@@ -1,28 +1,164 @@
 import json
 import argparse
+import glob
+import os
+import sqlite3
 import sys
-from vialytics_api.services.analytics import WalletAnalyzer
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+from vialytics_api.core.database import DATA_DIR
+from vialytics_api.services.analytics import WalletAnalyzer, ANALYTICS_BACKENDS
+from vialytics_api.services.price_service import StaticPriceService
+from vialytics_api.services.token_metadata import TokenMetadataService
+
+WALLET_DB_PATTERN = "wallet_*.db"
+
+
+def discover_wallet_dbs(data_dir: str, wallets: Optional[List[str]] = None) -> List[str]:
+    """Wallet DB paths in `data_dir`, either all of them or only the given wallets."""
+    if wallets:
+        return [os.path.join(data_dir, f"wallet_{wallet}.db") for wallet in wallets]
+    return sorted(glob.glob(os.path.join(data_dir, WALLET_DB_PATTERN)))
+
+
+def wallet_from_db_path(db_path: str) -> str:
+    name = os.path.splitext(os.path.basename(db_path))[0]
+    return name[len("wallet_"):] if name.startswith("wallet_") else name
+
+
+def count_rows(conn: sqlite3.Connection) -> int:
+    """Transactions plus token movements stored in a wallet DB."""
+    return conn.execute(
+        "SELECT (SELECT COUNT(*) FROM transactions) + (SELECT COUNT(*) FROM token_movements)"
+    ).fetchone()[0]
+
+
+def analyze_wallet_db(db_path: str, backend: Optional[str] = None, incremental: bool = False,
+                      static_prices: bool = False, token_metadata_db: Optional[str] = None) -> Dict[str, Any]:
+    """Analyse one wallet DB; runs inside a worker process.
+
+    `token_metadata_db` overrides the shared token metadata DB under DATA_DIR.
+    """
+    started = time.perf_counter()
+    record: Dict[str, Any] = {"wallet": wallet_from_db_path(db_path), "db_path": db_path, "rows": 0}
+    try:
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(f"No wallet DB at {db_path}")
+        analyzer = WalletAnalyzer(
+            db_path=db_path,
+            backend=backend,
+            incremental=incremental,
+            price_service=StaticPriceService() if static_prices else None,
+            token_metadata=TokenMetadataService(token_metadata_db) if token_metadata_db else None,
+        )
+        try:
+            record["rows"] = count_rows(analyzer.conn)
+            record["analytics"] = analyzer.analyze()
+        finally:
+            analyzer.close()
+    except Exception as e:
+        record["error"] = str(e)
+    record["seconds"] = round(time.perf_counter() - started, 4)
+    return record
+
+
+def run_batch(db_paths: List[str], output: str, workers: Optional[int] = None,
+              backend: Optional[str] = None, incremental: bool = False,
+              static_prices: bool = False, token_metadata_db: Optional[str] = None) -> Dict[str, Any]:
+    """Fan analyses out over a process pool, writing JSON Lines as they finish."""
+    started = time.perf_counter()
+    analysed = failed = rows = 0
+
+    with open(output, "w") as out, ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(analyze_wallet_db, db_path, backend, incremental, static_prices, token_metadata_db)
+            for db_path in db_paths
+        ]
+        for future in as_completed(futures):
+            record = future.result()
+            if "error" in record:
+                failed += 1
+                print(f"Error analysing {record['wallet']}: {record['error']}")
+            else:
+                analysed += 1
+                rows += record["rows"]
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    return {
+        "wallets": analysed,
+        "failed": failed,
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "wallets_per_sec": round(analysed / elapsed, 2),
+        "rows_per_sec": round(rows / elapsed, 1),
+    }
+
 
 def main():
     parser = argparse.ArgumentParser(description="Run Vialytics Personal Analytics")
     parser.add_argument("--db", help="Path to wallet.db", default=None)
-    parser.add_argument("--output", help="Output JSON file path", default="analytics_output.json")
-    
+    parser.add_argument("--output", help="Output JSON file path (JSON Lines in batch mode)", default=None)
+    parser.add_argument("--data-dir", help="Batch mode: analyse the wallet_*.db files in this directory",
+                        nargs="?", const=DATA_DIR, default=None)
+    parser.add_argument("--wallets", help="Batch mode: only analyse these wallets", nargs="+", default=None)
+    parser.add_argument("--workers", help="Worker processes for batch mode (default: CPU count)", type=int, default=None)
+    parser.add_argument("--backend", help="Analytics backend", choices=ANALYTICS_BACKENDS, default=None)
+    parser.add_argument("--incremental", help="Resume from the checkpoint stored in each wallet DB", action="store_true")
+    parser.add_argument("--static-prices", help="Use built-in prices instead of CoinGecko", action="store_true")
+
     args = parser.parse_args()
-    
+
+    if args.data_dir or args.wallets:
+        run_batch_main(args)
+        return
+
+    output = args.output or "analytics_output.json"
     print("Starting Personal Analytics Engine...")
     try:
-        analyzer = WalletAnalyzer(db_path=args.db)
-        results = analyzer.analyze()
-        
-        with open(args.output, "w") as f:
+        analyzer = WalletAnalyzer(
+            db_path=args.db,
+            backend=args.backend,
+            incremental=args.incremental,
+            price_service=StaticPriceService() if args.static_prices else None,
+        )
+        try:
+            results = analyzer.analyze()
+        finally:
+            analyzer.close()
+
+        with open(output, "w") as f:
             json.dump(results, f, indent=2)
-            
-        print(f"Analysis complete! Results saved to {args.output}")
-        
+
+        print(f"Analysis complete! Results saved to {output}")
+
     except Exception as e:
         print(f"Error running analytics: {e}")
         sys.exit(1)
 
+
+def run_batch_main(args) -> None:
+    data_dir = args.data_dir or DATA_DIR
+    output = args.output or "analytics_output.jsonl"
+    db_paths = discover_wallet_dbs(data_dir, args.wallets)
+    if not db_paths:
+        print(f"No wallet databases found in {data_dir}")
+        sys.exit(1)
+
+    print(f"Analysing {len(db_paths)} wallets with {args.workers or os.cpu_count()} workers...")
+    summary = run_batch(db_paths, output, workers=args.workers, backend=args.backend,
+                        incremental=args.incremental, static_prices=args.static_prices)
+    print(
+        f"Analysed {summary['wallets']} wallets ({summary['failed']} failed) in {summary['seconds']}s: "
+        f"{summary['wallets_per_sec']} wallets/sec, {summary['rows_per_sec']} rows/sec. "
+        f"Results saved to {output}"
+    )
+    if summary["failed"]:
+        sys.exit(1)
+
+
 if __name__ == "__main__":
     main()
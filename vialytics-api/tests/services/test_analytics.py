@@ -0,0 +1,819 @@
+"""
+Tests for WalletAnalyzer.
+No mocks - builds real SQLite wallet databases from the project schema.
+"""
+import unittest
+import json
+import sqlite3
+import os
+import tempfile
+import random
+import subprocess
+import sys
+import textwrap
+
+from vialytics_api.services.analytics import WalletAnalyzer, SOL_MINT
+from vialytics_api.services.aggregation import WalletAggregates
+from vialytics_api.services.price_service import StaticPriceService
+from vialytics_api.services import checkpoint, columnar, pushdown, rollups, timeline
+from vialytics_api.services.token_metadata import TokenMetadataService
+from vialytics_api.services.label_service import LabelService
+from vialytics_api.services.analytics_cache import AnalyticsResultCache
+from vialytics_api.services.wallet_group import WalletGroupAnalyzer, merge_wallet_dbs
+from vialytics_api import start_worker
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "..", "migrations.sql")
+
+USDC_MINT = "EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v"
+JUPITER = "JUP6LkbZbjS1jKKwapdHNy74zcZ3tLUZoi5QNyVTaV4"
+FRIEND = "9WzDXwBbmkg8ZTbNMqUxvQRAyrZzDsGYdLVL9zYtAWWM"
+
+
+def build_wallet_db(path, transactions, movements):
+    """Create a wallet DB with the indexer schema and the given rows.
+
+    transactions: (signature, slot, block_time, fee, status)
+    movements: (signature, mint, amount, source, destination, block_time)
+    """
+    conn = sqlite3.connect(path)
+    with open(SCHEMA_PATH) as f:
+        conn.executescript(f.read())
+    conn.executemany(
+        "INSERT INTO transactions (signature, slot, block_time, fee, status, meta_json) VALUES (?, ?, ?, ?, ?, '{}')",
+        transactions,
+    )
+    conn.executemany(
+        "INSERT INTO token_movements (signature, mint, amount, decimals, source, destination, block_time) "
+        "VALUES (?, ?, ?, NULL, ?, ?, ?)",
+        movements,
+    )
+    conn.commit()
+    conn.close()
+
+
+def build_random_wallet_db(path, n_transactions, seed=7):
+    """Create a wallet DB with pseudo-random but reproducible activity."""
+    rng = random.Random(seed)
+    mints = [SOL_MINT, USDC_MINT, "DezXAZ8z7PnrnRJjz3wXBoRgixCa6xjnB7YaB1pPB263",
+             "Mint1111111111111111111111111111111111111111"]
+    addresses = [JUPITER, FRIEND, "Addr1111111111111111111111111111111111111111", None]
+    transactions, movements = [], []
+    for i in range(n_transactions):
+        block_time = 1690000000 + rng.randint(0, 60_000_000)
+        transactions.append((f"sig{i}", i, block_time, rng.randint(0, 20000), rng.random() > 0.1))
+        for _ in range(rng.randint(0, 3)):
+            movements.append((f"sig{i}", rng.choice(mints), rng.randint(-10**9, 2 * 10**9),
+                              rng.choice(addresses), rng.choice(addresses), block_time))
+    build_wallet_db(path, transactions, movements)
+
+
+def make_analyzer(db_path, tmp_dir, **options):
+    """A WalletAnalyzer whose prices and token metadata stay out of VIALYTICS_DATA_DIR."""
+    options.setdefault("price_service", StaticPriceService())
+    options.setdefault("token_metadata", TokenMetadataService(os.path.join(tmp_dir, "tokens.db")))
+    return WalletAnalyzer(db_path=db_path, **options)
+
+
+def reference_biggest_movements(db_path, price_service):
+    """biggest_incoming/outgoing as the row-by-row analyzer computed them: (value, mint)."""
+    conn = sqlite3.connect(db_path)
+    biggest_incoming, biggest_outgoing = (0, None), (0, None)
+    for mint, amount in conn.execute("SELECT mint, amount FROM token_movements ORDER BY block_time ASC"):
+        decimals = 9 if mint == SOL_MINT else 6
+        usd_value = abs(amount) / (10 ** decimals) * price_service.get_price(mint)
+        if amount > 0 and usd_value > biggest_incoming[0]:
+            biggest_incoming = (usd_value, mint)
+        elif amount < 0 and usd_value > biggest_outgoing[0]:
+            biggest_outgoing = (usd_value, mint)
+    conn.close()
+    return biggest_incoming, biggest_outgoing
+
+
+SAMPLE_TRANSACTIONS = [
+    ("sig1", 100, 1704110400, 5000, 1),  # 2024-01-01
+    ("sig2", 200, 1704196800, 5000, 1),  # 2024-01-02
+    ("sig3", 300, 1706875200, 10000, 0),  # 2024-02-02, failed
+]
+
+SAMPLE_MOVEMENTS = [
+    ("sig1", SOL_MINT, 2_000_000_000, FRIEND, None, 1704110400),
+    ("sig1", USDC_MINT, 50_000_000, JUPITER, None, 1704110400),
+    ("sig2", SOL_MINT, -500_000_000, None, JUPITER, 1704196800),
+    ("sig3", USDC_MINT, -10_000_000, None, FRIEND, 1706875200),
+]
+
+
+class TestWalletAnalyzer(unittest.TestCase):
+    """Tests for the fused single-pass analytics."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "wallet.db")
+        build_wallet_db(self.db_path, SAMPLE_TRANSACTIONS, SAMPLE_MOVEMENTS)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def analyze(self, **kwargs):
+        return make_analyzer(self.db_path, self.tmp.name, **kwargs).analyze()
+
+    def test_portfolio_overview(self):
+        overview = self.analyze()["portfolio_overview"]
+        # 1.5 SOL * 136 + 40 USDC * 1
+        self.assertEqual(overview["total_balance_usd"], 244.0)
+        self.assertEqual([t["symbol"] for t in overview["top_tokens"]], ["Wrapped SOL", "USDC"])
+
+    def test_earnings_spending(self):
+        earnings = self.analyze()["earnings_spending"]
+        self.assertEqual(earnings["total_received_usd"], 322.0)
+        self.assertEqual(earnings["total_sent_usd"], 78.0)
+        self.assertEqual(earnings["net_flow"], 244.0)
+        self.assertEqual(earnings["biggest_incoming"], {"value": 272.0, "label": "Received Wrapped SOL"})
+        self.assertEqual(earnings["biggest_outgoing"], {"value": 68.0, "label": "Sent Wrapped SOL"})
+        self.assertEqual(earnings["average_transaction_size"], 100.0)
+
+    def test_biggest_movement_ties_go_to_earliest(self):
+        # 1 SOL and 136 USDC are both worth 136 USD. Rows are inserted out of
+        # time order, and the later tie belongs to the mint seen first.
+        tied_path = os.path.join(self.tmp.name, "tied.db")
+        build_wallet_db(tied_path, [("sig1", 1, 1, 5000, 1)], [
+            ("sig1", USDC_MINT, 136_000_000, FRIEND, None, 30),
+            ("sig1", USDC_MINT, 10_000_000, FRIEND, None, 10),
+            ("sig1", SOL_MINT, 1_000_000_000, FRIEND, None, 20),
+            ("sig1", USDC_MINT, -1_000_000, None, None, 10),
+            ("sig1", SOL_MINT, -500_000_000, None, None, 20),
+            ("sig1", USDC_MINT, -68_000_000, None, None, None),  # NULL sorts first
+        ])
+        prices = StaticPriceService()
+        labels = {SOL_MINT: "Wrapped SOL", USDC_MINT: "USDC"}
+        (in_value, in_mint), (out_value, out_mint) = reference_biggest_movements(tied_path, prices)
+        self.assertEqual((in_mint, out_mint), (SOL_MINT, USDC_MINT))
+
+        for kwargs in ({"backend": "python"}, {"backend": "numpy"}, {"backend": "sql"}, {"incremental": True}):
+            earnings = make_analyzer(tied_path, self.tmp.name, price_service=prices,
+                                     **kwargs).analyze()["earnings_spending"]
+            self.assertEqual(earnings["biggest_incoming"], {"value": in_value, "label": f"Received {labels[in_mint]}"})
+            self.assertEqual(earnings["biggest_outgoing"], {"value": out_value, "label": f"Sent {labels[out_mint]}"})
+
+    def test_token_insights(self):
+        insights = {t["mint"]: t for t in self.analyze()["token_insights"]}
+        self.assertEqual(insights[USDC_MINT]["current_holdings"], 40.0)
+        self.assertEqual(insights[USDC_MINT]["total_received"], 50.0)
+        self.assertEqual(insights[USDC_MINT]["total_sent"], 10.0)
+
+    def test_activity_and_security(self):
+        result = self.analyze()
+        activity = result["activity_insights"]
+        self.assertEqual(activity["total_transactions"], 3)
+        self.assertEqual(activity["active_days_count"], 3)
+        self.assertEqual(sum(activity["monthly_frequency"].values()), 3)
+        self.assertEqual(result["security"]["failed_transactions_count"], 1)
+        # 20000 lamports of fees at 136 USD/SOL
+        self.assertEqual(result["spending_categories"]["top_spending_categories"],
+                         [{"category": "Network Fees", "value_usd": 0.0}])
+
+    def test_income_and_interactions(self):
+        result = self.analyze()
+        self.assertEqual(result["income_streams"]["top_income_sources"], [
+            {"source": "9WzD...AWWM", "value_usd": 272.0},
+            {"source": "Jupiter", "value_usd": 50.0},
+        ])
+        # Equal counts are ordered by address, the same in every backend
+        self.assertEqual(result["interactions"]["top_apps_platforms"], [
+            {"name": "9WzD...AWWM", "count": 1},
+            {"name": "Jupiter", "count": 1},
+        ])
+
+    def test_balance_history_ends_at_current_balance(self):
+        history = self.analyze(balance_interval="day")["portfolio_overview"]["total_balance_history"]
+        self.assertEqual(history[0], {"date": "2024-01-01", "balance_usd": 322.0})
+        self.assertEqual(history[1], {"date": "2024-01-02", "balance_usd": 254.0})
+        self.assertEqual(history[-1]["balance_usd"], 244.0)
+
+        # Weekly buckets unless daily ones are asked for
+        weekly = self.analyze()["portfolio_overview"]["total_balance_history"]
+        self.assertEqual(weekly[0], {"date": "2024-01-07", "balance_usd": 254.0})
+        self.assertLess(len(weekly), len(history))
+
+    def test_decimals_come_from_movement_rows(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("UPDATE token_movements SET decimals = 7 WHERE mint = ?", (USDC_MINT,))
+        conn.commit()
+        conn.close()
+        insights = {t["mint"]: t for t in self.analyze()["token_insights"]}
+        self.assertEqual(insights[USDC_MINT]["current_holdings"], 4.0)
+
+    def test_prices_resolved_in_one_snapshot(self):
+        class CountingPriceService(StaticPriceService):
+            def __init__(self):
+                super().__init__()
+                self.bulk_calls = 0
+
+            def get_price(self, token_mint, currency="USD"):
+                raise AssertionError("per-mint lookup during analysis")
+
+            def get_prices(self, token_mints, currency="USD"):
+                self.bulk_calls += 1
+                return super().get_prices(token_mints, currency)
+
+        prices = CountingPriceService()
+        analyzer = make_analyzer(self.db_path, self.tmp.name, price_service=prices)
+        analyzer.analyze()
+        self.assertEqual(prices.bulk_calls, 1)
+        with self.assertRaises(TypeError):
+            analyzer._prices[SOL_MINT] = 0.0
+
+    def test_sections_skip_unneeded_data(self):
+        class NoPriceService(StaticPriceService):
+            def get_prices(self, token_mints, currency="USD"):
+                raise AssertionError("prices fetched for a transactions-only view")
+
+        # Movements are not needed for these sections, so they are never read
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("DROP TABLE token_movements")
+        conn.close()
+        for backend in ("python", "sql"):
+            result = make_analyzer(self.db_path, self.tmp.name, price_service=NoPriceService(), backend=backend,
+                                    sections=["security", "activity_insights"]).analyze()
+            self.assertEqual(list(result), ["activity_insights", "security"])
+            self.assertEqual(result["activity_insights"]["total_transactions"], 3)
+            self.assertEqual(result["security"]["failed_transactions_count"], 1)
+
+    def test_section_matches_full_report(self):
+        full = self.analyze()
+        partial = self.analyze(sections=["token_insights", "interactions"])
+        self.assertEqual(partial, {"token_insights": full["token_insights"], "interactions": full["interactions"]})
+        with self.assertRaises(ValueError):
+            self.analyze(sections=["horoscope"])
+
+    def test_empty_wallet(self):
+        empty_path = os.path.join(self.tmp.name, "empty.db")
+        build_wallet_db(empty_path, [], [])
+        result = make_analyzer(empty_path, self.tmp.name, price_service=StaticPriceService()).analyze()
+        self.assertEqual(result["activity_insights"], {})
+        self.assertEqual(result["portfolio_overview"]["total_balance_usd"], 0)
+        self.assertEqual(result["earnings_spending"]["average_transaction_size"], 0)
+
+
+class TestBalanceTimeline(unittest.TestCase):
+    """Tests for the prefix-sum balance timeline."""
+
+    FLOWS = {
+        19723: {SOL_MINT: 2_000_000_000},              # 2024-01-01
+        19725: {SOL_MINT: -1_000_000_000, USDC_MINT: 5_000_000},
+    }
+    DECIMALS = {SOL_MINT: 9, USDC_MINT: 6}
+
+    def test_values_with_historical_prices(self):
+        daily_prices = {SOL_MINT: {19723: 100.0, 19724: 110.0}}
+        series = timeline.build_balance_timeline(
+            self.FLOWS, self.DECIMALS, {SOL_MINT: 150.0, USDC_MINT: 1.0}, daily_prices, end_day=19726)
+        self.assertEqual([point["balance_usd"] for point in series], [200.0, 220.0, 115.0, 115.0])
+        self.assertEqual(series[0]["date"], "2024-01-01")
+
+    def test_falls_back_to_current_prices(self):
+        series = timeline.build_balance_timeline(
+            self.FLOWS, self.DECIMALS, {SOL_MINT: 150.0}, {}, end_day=19725)
+        self.assertEqual([point["balance_usd"] for point in series], [300.0, 300.0, 150.0])
+
+    def test_weekly_buckets(self):
+        series = timeline.build_balance_timeline(
+            self.FLOWS, self.DECIMALS, {SOL_MINT: 150.0}, {}, end_day=19740, interval="week")
+        # Sundays 2024-01-07 and 2024-01-14, then the partial week ending 2024-01-18
+        self.assertEqual([point["date"] for point in series], ["2024-01-07", "2024-01-14", "2024-01-18"])
+
+
+@unittest.skipIf(columnar.np is None, "numpy not installed")
+class TestColumnarBackend(unittest.TestCase):
+    """The numpy backend must match the pure-Python pass exactly."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.db_path = os.path.join(cls.tmp.name, "wallet.db")
+        build_random_wallet_db(cls.db_path, 2000)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_aggregates_match_python_backend(self):
+        python = make_analyzer(self.db_path, self.tmp.name, backend="python")._aggregate()
+        numpy = make_analyzer(self.db_path, self.tmp.name, backend="numpy")._aggregate()
+        self.assertEqual(list(numpy.mint_flows.items()), list(python.mint_flows.items()))
+        self.assertEqual(list(numpy.income.items()), list(python.income.items()))
+        self.assertEqual(list(numpy.interactions.items()), list(python.interactions.items()))
+
+    def test_analyze_matches_python_backend(self):
+        prices = StaticPriceService()
+        python = make_analyzer(self.db_path, self.tmp.name, price_service=prices, backend="python").analyze()
+        numpy = make_analyzer(self.db_path, self.tmp.name, price_service=prices, backend="numpy").analyze()
+        self.assertEqual(numpy, python)
+
+    def test_columns_are_dictionary_encoded(self):
+        columns = columnar.load_movement_columns(make_analyzer(self.db_path, self.tmp.name).conn, chunk_size=100)
+        self.assertEqual(columns.mint.dtype, columnar.np.int32)
+        self.assertEqual(columns.amount.dtype, columnar.np.int64)
+        self.assertLessEqual(len(columns.mints), 4)
+        self.assertEqual(int(columns.source.min()), -1)
+
+    def test_empty_addresses_skipped_like_python(self):
+        path = os.path.join(self.tmp.name, "empty.db")
+        build_wallet_db(path, [("sig1", 1, 1, 0, 1)], [
+            ("sig1", USDC_MINT, 5, "", None, 1),
+            ("sig1", USDC_MINT, -3, None, "", 2),
+            ("sig1", USDC_MINT, 2, FRIEND, None, 3),
+        ])
+        python = make_analyzer(path, self.tmp.name, backend="python")._aggregate()
+        numpy = make_analyzer(path, self.tmp.name, backend="numpy")._aggregate()
+        self.assertEqual(numpy.income, {FRIEND: {USDC_MINT: 2}})
+        self.assertEqual((numpy.income, numpy.interactions), (python.income, python.interactions))
+
+    def test_int64_overflow_falls_back_to_python(self):
+        # Each amount fits in int64, their sum does not
+        big_path = os.path.join(self.tmp.name, "big.db")
+        huge = 6 * 10 ** 18
+        build_wallet_db(big_path, [("sig1", 1, 1, 0, 1)], [
+            ("sig1", USDC_MINT, huge, FRIEND, None, 1),
+            ("sig1", USDC_MINT, huge, FRIEND, None, 2),
+        ])
+        analyzer = make_analyzer(big_path, self.tmp.name, backend="numpy")
+        with self.assertRaises(columnar.ColumnarOverflowError):
+            columnar.aggregate_movement_columns(columnar.load_movement_columns(analyzer.conn), WalletAggregates())
+        aggregates = analyzer._aggregate()
+        self.assertEqual(aggregates.mint_flows[USDC_MINT]["received"], 2 * huge)
+        self.assertEqual(aggregates.income[FRIEND][USDC_MINT], 2 * huge)
+
+    def test_unknown_backend_rejected(self):
+        with self.assertRaises(ValueError):
+            make_analyzer(self.db_path, self.tmp.name, backend="gpu")
+
+
+class TestSqlPushdownBackend(unittest.TestCase):
+    """Aggregates computed inside SQLite must match the row-by-row pass."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.db_path = os.path.join(cls.tmp.name, "wallet.db")
+        build_random_wallet_db(cls.db_path, 2000)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_aggregates_match_python_backend(self):
+        python = make_analyzer(self.db_path, self.tmp.name, backend="python")._aggregate()
+        sql = make_analyzer(self.db_path, self.tmp.name, backend="sql")._aggregate()
+        self.assertEqual(sql.mint_flows, python.mint_flows)
+        self.assertEqual(sql.income, python.income)
+        self.assertEqual(sql.interactions, python.interactions)
+        self.assertEqual((sql.tx_count, sql.fee_total, sql.failed_count),
+                         (python.tx_count, python.fee_total, python.failed_count))
+
+    def test_analyze_matches_python_backend(self):
+        prices = StaticPriceService()
+        python = make_analyzer(self.db_path, self.tmp.name, price_service=prices, backend="python").analyze()
+        sql = make_analyzer(self.db_path, self.tmp.name, price_service=prices, backend="sql").analyze()
+        self.assertEqual(sql, python)
+
+    def test_decimals_of_first_movement(self):
+        path = os.path.join(self.tmp.name, "decimals.db")
+        # The backfill inserted the older movement last; MAX(decimals) would pick 9
+        build_wallet_db(path, [("sig1", 1, 1, 0, 1)], [
+            ("sig1", USDC_MINT, 1, FRIEND, None, 20),
+            ("sig1", USDC_MINT, 1, FRIEND, None, 10),
+            ("sig1", USDC_MINT, 1, FRIEND, None, 5),
+        ])
+        conn = sqlite3.connect(path)
+        conn.executemany("UPDATE token_movements SET decimals = ? WHERE block_time = ?", [(9, 20), (6, 10)])
+        conn.commit()
+        conn.close()
+        python = make_analyzer(path, self.tmp.name, backend="python")._aggregate()
+        sql = make_analyzer(path, self.tmp.name, backend="sql")._aggregate()
+        self.assertEqual(sql.mint_decimals, {USDC_MINT: 6})
+        self.assertEqual(sql.mint_decimals, python.mint_decimals)
+
+    def test_integer_overflow_falls_back_to_python(self):
+        big_path = os.path.join(self.tmp.name, "big.db")
+        huge = 6 * 10 ** 18
+        build_wallet_db(big_path, [("sig1", 1, 1, 0, 1)], [
+            ("sig1", USDC_MINT, huge, FRIEND, None, 1),
+            ("sig1", USDC_MINT, huge, FRIEND, None, 2),
+        ])
+        analyzer = make_analyzer(big_path, self.tmp.name, backend="sql")
+        with self.assertRaises(pushdown.PushdownOverflowError):
+            pushdown.aggregate_movements(analyzer.conn, WalletAggregates())
+        aggregates = analyzer._aggregate()
+        self.assertEqual(aggregates.mint_flows[USDC_MINT]["received"], 2 * huge)
+        self.assertEqual(aggregates.income[FRIEND][USDC_MINT], 2 * huge)
+        self.assertEqual(aggregates.tx_count, 1)
+
+    def test_queries_use_indexes(self):
+        conn = sqlite3.connect(self.db_path)
+        plan = " ".join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + pushdown.MINT_FLOWS_QUERY))
+        self.assertIn("COVERING INDEX", plan)
+        conn.close()
+
+
+class TestIncrementalAnalytics(unittest.TestCase):
+    """Checkpointed analysis only folds in rows added since the last run."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "wallet.db")
+        build_wallet_db(self.db_path, SAMPLE_TRANSACTIONS, SAMPLE_MOVEMENTS)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def analyze(self, incremental=True):
+        return make_analyzer(self.db_path, self.tmp.name, incremental=incremental).analyze()
+
+    def add_rows(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO transactions (signature, slot, block_time, fee, status) "
+                     "VALUES ('sig4', 50, 1709294400, 5000, 1)")
+        conn.execute("INSERT INTO token_movements (signature, mint, amount, source, destination, block_time) "
+                     f"VALUES ('sig4', '{USDC_MINT}', 25000000, '{JUPITER}', NULL, 1709294400)")
+        conn.commit()
+        conn.close()
+
+    def test_checkpoint_matches_full_analysis(self):
+        self.assertEqual(self.analyze(), self.analyze(incremental=False))
+        self.add_rows()
+        self.assertEqual(self.analyze(), self.analyze(incremental=False))
+
+    def test_only_new_rows_are_folded_in(self):
+        self.analyze()
+        # Rows already covered by the checkpoint are not read again
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("DELETE FROM token_movements WHERE signature = 'sig3'")
+        conn.commit()
+        conn.close()
+        self.add_rows()
+
+        result = self.analyze()
+        insights = {t["mint"]: t for t in result["token_insights"]}
+        self.assertEqual(insights[USDC_MINT]["current_holdings"], 65.0)
+        self.assertEqual(result["activity_insights"]["total_transactions"], 4)
+
+        saved = checkpoint.load_checkpoint(sqlite3.connect(self.db_path))
+        self.assertEqual(saved.last_movement_id, 5)
+        self.assertEqual(saved.last_slot, 300)
+
+    def test_rebuilds_when_rows_removed(self):
+        self.analyze()
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("DELETE FROM token_movements")
+        conn.commit()
+        conn.close()
+        self.assertEqual(self.analyze()["token_insights"], [])
+
+    def stored_marks(self):
+        conn = sqlite3.connect(self.db_path)
+        saved = checkpoint.load_checkpoint(conn)
+        states = dict(conn.execute("SELECT name, last_rowid FROM rollup_state"))
+        conn.close()
+        return (saved.last_movement_id, saved.last_tx_rowid), (states["mint_flows"], states["activity:local"])
+
+    def test_no_write_lock_when_nothing_new(self):
+        self.analyze()
+        analyzer = make_analyzer(self.db_path, self.tmp.name, incremental=True)
+        statements = []
+        analyzer.conn.set_trace_callback(statements.append)
+        self.assertEqual(analyzer.analyze(), self.analyze(incremental=False))
+        analyzer.close()
+        self.assertFalse([s for s in statements if "IMMEDIATE" in s or s.lstrip().upper().startswith(("INSERT", "DELETE"))])
+
+    def test_checkpoint_and_rollups_stored_together(self):
+        self.analyze()
+        self.add_rows()
+        self.assertEqual(self.stored_marks(), ((4, 3), (4, 3)))
+
+        # The indexer holds the write lock: results are right, nothing is stored
+        writer = sqlite3.connect(self.db_path)
+        writer.execute("BEGIN IMMEDIATE")
+        try:
+            self.assertEqual(self.analyze(), self.analyze(incremental=False))
+        finally:
+            writer.rollback()
+            writer.close()
+        self.assertEqual(self.stored_marks(), ((4, 3), (4, 3)))
+
+        self.analyze()
+        self.assertEqual(self.stored_marks(), ((5, 4), (5, 4)))
+
+    def test_write_lock_only_held_to_store(self):
+        self.analyze()
+        self.add_rows()
+        analyzer = make_analyzer(self.db_path, self.tmp.name, incremental=True)
+        statements = []
+        analyzer.conn.set_trace_callback(statements.append)
+        analyzer.analyze()
+        analyzer.close()
+        locked = statements[next(i for i, s in enumerate(statements) if "IMMEDIATE" in s):]
+        # Under the lock: re-checking the marks and writing, but no fold over the rows
+        folds = [s for s in locked if s.lstrip().startswith("SELECT")
+                 and ("decimals" in s or "fee, status" in s or "GROUP BY" in s)]
+        self.assertFalse(folds)
+        self.assertEqual(self.stored_marks(), ((5, 4), (5, 4)))
+
+    def test_results_discarded_when_rows_arrive_before_the_store(self):
+        self.analyze()
+        self.add_rows()
+        db_path = self.db_path
+
+        class RacingAnalyzer(WalletAnalyzer):
+            def _store_incremental(self, *args):
+                # The indexer commits more rows between the fold and the store
+                conn = sqlite3.connect(db_path)
+                conn.execute("INSERT INTO transactions (signature, slot, block_time, fee, status) "
+                             "VALUES ('sig5', 60, 1709380800, 5000, 1)")
+                conn.commit()
+                conn.close()
+                super()._store_incremental(*args)
+
+        analyzer = RacingAnalyzer(db_path=db_path, incremental=True, price_service=StaticPriceService(),
+                                  token_metadata=TokenMetadataService(os.path.join(self.tmp.name, "tokens.db")))
+        analyzer.analyze()
+        analyzer.close()
+        self.assertEqual(self.stored_marks(), ((4, 3), (4, 3)))
+        self.assertEqual(self.analyze(), self.analyze(incremental=False))
+        self.assertEqual(self.stored_marks(), ((5, 5), (5, 5)))
+
+    def test_result_cache_invalidates_on_new_rows(self):
+        cache = AnalyticsResultCache(max_entries=4)
+        runs = []
+
+        def compute():
+            runs.append(1)
+            return self.analyze()
+
+        first = cache.get_or_compute(self.db_path, compute)
+        # The checkpoint write does not invalidate the stored result
+        self.assertIs(cache.get_or_compute(self.db_path, compute), first)
+        self.assertEqual(len(runs), 1)
+
+        self.add_rows()
+        refreshed = cache.get_or_compute(self.db_path, compute)
+        self.assertEqual(len(runs), 2)
+        self.assertEqual(refreshed["activity_insights"]["total_transactions"], 4)
+
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["stale"]), (1, 2, 1))
+
+
+class TestRollups(unittest.TestCase):
+    """Daily/monthly rollups kept in the wallet DB."""
+
+    LATE_JANUARY = 1706743800  # 2024-01-31 23:30 UTC, 2024-02-01 05:00 in Kolkata
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "wallet.db")
+        transactions = SAMPLE_TRANSACTIONS + [("sig4", 400, self.LATE_JANUARY, 5000, 1)]
+        build_wallet_db(self.db_path, transactions, SAMPLE_MOVEMENTS)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def activity(self, timezone, incremental=True):
+        return make_analyzer(self.db_path, self.tmp.name, incremental=incremental,
+                             timezone=timezone).analyze()["activity_insights"]
+
+    def test_buckets_follow_timezone(self):
+        utc = self.activity("UTC")
+        self.assertEqual(utc["monthly_frequency"], {"2024-01": 3, "2024-02": 1})
+        self.assertEqual(utc["last_activity"], "2024-02-02")
+
+        kolkata = self.activity("Asia/Kolkata")
+        self.assertEqual(kolkata["monthly_frequency"], {"2024-01": 2, "2024-02": 2})
+        self.assertEqual(kolkata["active_days_count"], 4)
+
+    def test_tables_updated_incrementally(self):
+        self.activity("UTC")
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO transactions (signature, slot, block_time, fee, status) "
+                     "VALUES ('sig5', 500, 1706875300, 7000, 0)")
+        conn.commit()
+
+        self.assertEqual(self.activity("UTC"), self.activity("UTC", incremental=False))
+        fee_sum, failed = conn.execute(
+            "SELECT fee_sum, failed_count FROM rollup_daily_activity WHERE timezone = 'UTC' AND day = '2024-02-02'"
+        ).fetchone()
+        self.assertEqual((fee_sum, failed), (17000, 2))
+        conn.close()
+
+    def test_rows_grouped_once_per_slot(self):
+        conn = sqlite3.connect(self.db_path)
+        movement_id, tx_rowid, _ = checkpoint.high_water_marks(conn)
+        update = rollups.plan_rollups(conn, rollups.TimezoneBuckets("UTC"), movement_id, tx_rowid)
+        with conn:
+            self.assertTrue(rollups.store_rollups(conn, update))
+        # A second store planned from the same state would fold the rows in twice
+        self.assertFalse(rollups.store_rollups(conn, update))
+        conn.rollback()
+        stored = rollups.read_rollups(conn, "UTC")
+        self.assertEqual(stored.daily_activity, update.rollups.daily_activity)
+        built = rollups.build_rollups(conn, rollups.TimezoneBuckets("UTC"))
+        self.assertEqual(stored.daily_activity, built.daily_activity)
+        self.assertEqual(stored.daily_mint_flows, built.daily_mint_flows)
+        self.assertEqual(stored.daily_mint_flows[19723], {SOL_MINT: 2_000_000_000, USDC_MINT: 50_000_000})
+        conn.close()
+
+    def test_unknown_timezone_rejected(self):
+        with self.assertRaises(ValueError):
+            make_analyzer(self.db_path, self.tmp.name, timezone="Mars/Olympus_Mons")
+
+
+class TestWalletGroup(unittest.TestCase):
+    """Combined analytics over several wallet DBs of one user."""
+
+    ALICE = "A1iceWa11et1111111111111111111111111111111"
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.wallet_dbs = {
+            self.ALICE: os.path.join(self.tmp.name, "wallet_alice.db"),
+            FRIEND: os.path.join(self.tmp.name, "wallet_friend.db"),
+        }
+        # Like the indexer: one row per token account whose balance changed,
+        # owned by `source`, with no destination
+        alice, friend = self.ALICE, FRIEND
+        shared = [
+            # Alice sends Friend 1 SOL
+            ("sigX", SOL_MINT, -1_000_000_000, alice, None, 1704196800),
+            ("sigX", SOL_MINT, 1_000_000_000, friend, None, 1704196800),
+            # Jupiter pays both of them 5 USDC
+            ("sigS", USDC_MINT, 5_000_000, alice, None, 1704283200),
+            ("sigS", USDC_MINT, 5_000_000, friend, None, 1704283200),
+            ("sigS", USDC_MINT, -10_000_000, JUPITER, None, 1704283200),
+            # Alice pays 4 USDC: 3 to Friend, 1 to Jupiter
+            ("sigP", USDC_MINT, -4_000_000, alice, None, 1704300000),
+            ("sigP", USDC_MINT, 3_000_000, friend, None, 1704300000),
+            ("sigP", USDC_MINT, 1_000_000, JUPITER, None, 1704300000),
+        ]
+        build_wallet_db(
+            self.wallet_dbs[alice],
+            [("sigA", 100, 1704110400, 5000, 1), ("sigX", 200, 1704196800, 5000, 1),
+             ("sigS", 300, 1704283200, 5000, 1), ("sigP", 350, 1704300000, 5000, 1)],
+            [("sigA", SOL_MINT, 2_000_000_000, alice, None, 1704110400),
+             ("sigA", SOL_MINT, -2_000_000_000, JUPITER, None, 1704110400)] + shared,
+        )
+        build_wallet_db(
+            self.wallet_dbs[friend],
+            [("sigX", 200, 1704196800, 5000, 1), ("sigS", 300, 1704283200, 5000, 1),
+             ("sigP", 350, 1704300000, 5000, 1), ("sigF", 400, 1704369600, 5000, 1),
+             ("sigE", 500, 1704456000, 5000, 0)],
+            shared + [("sigF", USDC_MINT, -3_000_000, friend, None, 1704369600),
+                      ("sigF", USDC_MINT, 3_000_000, JUPITER, None, 1704369600)],
+        )
+
+        self.services = {"price_service": StaticPriceService(),
+                         "token_metadata": TokenMetadataService(os.path.join(self.tmp.name, "tokens.db"))}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_internal_transfers_netted(self):
+        merged = os.path.join(self.tmp.name, "group.db")
+        merge_wallet_dbs(self.wallet_dbs, merged)
+        conn = sqlite3.connect(merged)
+        movements = sorted(conn.execute("SELECT signature, mint, amount, source FROM token_movements"), key=repr)
+        conn.close()
+        # sigX is gone, only the 1 USDC that left the group is kept from sigP,
+        # and the group's own addresses are cleared
+        self.assertEqual(movements, sorted([
+            ("sigA", SOL_MINT, 2_000_000_000, None),
+            ("sigA", SOL_MINT, -2_000_000_000, JUPITER),
+            ("sigF", USDC_MINT, -3_000_000, None),
+            ("sigF", USDC_MINT, 3_000_000, JUPITER),
+            ("sigP", USDC_MINT, -1_000_000, None),
+            ("sigP", USDC_MINT, 1_000_000, JUPITER),
+            ("sigS", USDC_MINT, -10_000_000, JUPITER),
+            ("sigS", USDC_MINT, 5_000_000, None),
+            ("sigS", USDC_MINT, 5_000_000, None),
+        ], key=repr))
+
+    def test_shared_rows_counted_once(self):
+        result = WalletGroupAnalyzer(self.wallet_dbs, **self.services).analyze()
+
+        insights = {t["mint"]: t for t in result["token_insights"]}
+        self.assertEqual((insights[SOL_MINT]["total_received"], insights[SOL_MINT]["total_sent"]), (2.0, 2.0))
+        self.assertEqual((insights[USDC_MINT]["total_received"], insights[USDC_MINT]["total_sent"]), (14.0, 14.0))
+        self.assertEqual(result["activity_insights"]["total_transactions"], 6)
+        self.assertEqual(result["security"]["failed_transactions_count"], 1)
+
+        single = make_analyzer(self.wallet_dbs[FRIEND], self.tmp.name).analyze()
+        self.assertEqual(list(result), list(single))
+
+    def test_group_wallets_not_income_sources_or_counterparties(self):
+        # Alice sends USDC with the counterparty recorded, to Friend and to Jupiter
+        conn = sqlite3.connect(self.wallet_dbs[self.ALICE])
+        conn.executemany(
+            "INSERT INTO token_movements (signature, mint, amount, decimals, source, destination, block_time) "
+            "VALUES (?, ?, ?, 6, ?, ?, ?)",
+            [("sigD", USDC_MINT, -2_000_000, self.ALICE, FRIEND, 1704400000),
+             ("sigD", USDC_MINT, -1_000_000, self.ALICE, JUPITER, 1704400000)])
+        conn.commit()
+        conn.close()
+        jupiter = LabelService().get_label(JUPITER)
+
+        backends = ("python", "sql") + (("numpy",) if columnar.np is not None else ())
+        for backend in backends:
+            result = WalletGroupAnalyzer(self.wallet_dbs, backend=backend, **self.services).analyze()
+            sources = [s["source"] for s in result["income_streams"]["top_income_sources"]]
+            apps = [a["name"] for a in result["interactions"]["top_apps_platforms"]]
+            self.assertEqual((sources, apps), ([jupiter], [jupiter]), backend)
+
+    def test_backends_agree(self):
+        python = WalletGroupAnalyzer(self.wallet_dbs, **self.services).analyze()
+        sql = WalletGroupAnalyzer(self.wallet_dbs, backend="sql", **self.services).analyze()
+        self.assertEqual(sql["activity_insights"], python["activity_insights"])
+        self.assertEqual(sql["earnings_spending"], python["earnings_spending"])
+
+
+class TestBatchAnalytics(unittest.TestCase):
+    """Batch mode fans wallet DBs out over a process pool."""
+
+    def test_results_streamed_as_json_lines(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for wallet in ("walletA", "walletB"):
+                build_wallet_db(os.path.join(tmp, f"wallet_{wallet}.db"), SAMPLE_TRANSACTIONS, SAMPLE_MOVEMENTS)
+            # Deleted rows leave rowid gaps; they must not be counted
+            conn = sqlite3.connect(os.path.join(tmp, "wallet_walletB.db"))
+            conn.execute("DELETE FROM token_movements WHERE rowid = 1")
+            conn.commit()
+            conn.close()
+            db_paths = start_worker.discover_wallet_dbs(tmp) + start_worker.discover_wallet_dbs(tmp, ["missing"])
+            output = os.path.join(tmp, "out.jsonl")
+
+            summary = start_worker.run_batch(db_paths, output, workers=2, static_prices=True,
+                                             token_metadata_db=os.path.join(tmp, "tokens.db"))
+
+            with open(output) as f:
+                records = {r["wallet"]: r for r in map(json.loads, f)}
+        self.assertEqual((summary["wallets"], summary["failed"]), (2, 1))
+        self.assertEqual(summary["rows"], 2 * (len(SAMPLE_TRANSACTIONS) + len(SAMPLE_MOVEMENTS)) - 1)
+        self.assertEqual(records["walletB"]["rows"], len(SAMPLE_TRANSACTIONS) + len(SAMPLE_MOVEMENTS) - 1)
+        self.assertIn("error", records["missing"])
+        self.assertEqual(records["walletA"]["analytics"]["activity_insights"]["total_transactions"], 3)
+
+
+class TestStreamingMemory(unittest.TestCase):
+    """Peak memory of the streaming pass must not grow with history length."""
+
+    MOVEMENTS = int(os.environ.get("VIALYTICS_STREAMING_TEST_ROWS", "2000000"))
+    MAX_RSS_GROWTH_MB = 100
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.db_path = os.path.join(cls.tmp.name, "wallet.db")
+        conn = sqlite3.connect(cls.db_path)
+        with open(SCHEMA_PATH) as f:
+            conn.executescript(";".join(s for s in f.read().split(";") if "CREATE TABLE" in s))
+        # Generate rows inside SQLite; the indexes are not needed for this test
+        conn.execute("""
+            WITH RECURSIVE seq(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM seq WHERE i < ?)
+            INSERT INTO transactions (signature, slot, block_time, fee, status, meta_json)
+            SELECT 'sig' || i, i, 1690000000 + i * 300, 5000, i % 17 != 0, '{}' FROM seq
+        """, (cls.MOVEMENTS // 10,))
+        conn.execute("""
+            WITH RECURSIVE seq(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM seq WHERE i < ?)
+            INSERT INTO token_movements (signature, mint, amount, decimals, source, destination, block_time)
+            SELECT 'sig' || (i / 10), 'Mint' || (i % 50), (i % 1000) - 400, 6,
+                   'Src' || (i % 5000), 'Dst' || (i % 3000), 1690000000 + i * 30
+            FROM seq
+        """, (cls.MOVEMENTS,))
+        conn.commit()
+        conn.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "ru_maxrss is reported in KB on Linux only")
+    def test_peak_rss_is_bounded(self):
+        # Measured in a fresh interpreter so earlier tests do not affect the peak
+        script = textwrap.dedent(f"""
+            import resource
+            from vialytics_api.services.analytics import WalletAnalyzer
+            from vialytics_api.services.price_service import StaticPriceService
+            from vialytics_api.services.token_metadata import TokenMetadataService
+            analyzer = WalletAnalyzer(db_path={self.db_path!r}, price_service=StaticPriceService(), chunk_size=5000,
+                                      token_metadata=TokenMetadataService({os.path.join(self.tmp.name, "tokens.db")!r}))
+            baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            result = analyzer.analyze()
+            assert result["activity_insights"]["total_transactions"] == {self.MOVEMENTS // 10}
+            print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline)
+        """)
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, env=env, check=True)
+        growth_mb = int(output.stdout.strip()) / 1024
+        self.assertLess(growth_mb, self.MAX_RSS_GROWTH_MB)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,12 +2,32 @@
 Tests for Vialytics API services.
 No mocks - uses real in-memory SQLite and live API calls where needed.
 """
+import asyncio
 import unittest
 import sqlite3
 import os
+import sys
+import time
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-from vialytics_api.services.price_service import StaticPriceService
+from vialytics_api.services.price_service import StaticPriceService, CoinGeckoPriceService
 from vialytics_api.services.label_service import LabelService
+from vialytics_api.services.price_history import DailyPriceCache
+from vialytics_api.services.token_metadata import TokenMetadataService
+from vialytics_api.services.enrichment_store import EnrichmentStore
+from vialytics_api.services.index_queue import IndexingQueue, QueueFullError
+from vialytics_api.services.indexer_service import IndexerService
+from vialytics_api.services.indexer_progress import ProgressReporter, parse_event, progress_percent
+from vialytics_api.services.indexer_supervisor import IndexerProcessError, IndexerSupervisor
+from vialytics_api.core.cache import LRUCache
+from vialytics_api.core.http import AsyncHttpClient, HttpClient
+from vialytics_api.core.rate_limit import (
+    PRIORITY_PREWARM, ProviderQuota, RateLimiter, priority, provider_for_url,
+)
+from vialytics_api.core.singleflight import AsyncSingleFlight, SingleFlight
+from vialytics_api.services.helius_client import AsyncHeliusClient, HeliusClient, TRANSACTIONS_PAGE_LIMIT
 
 
 class TestPriceService(unittest.TestCase):
@@ -22,6 +42,103 @@ class TestPriceService(unittest.TestCase):
         service = StaticPriceService()
         self.assertEqual(service.get_price("unknown_token_address"), 0.0)
 
+    def test_bulk_prices_match_single_lookups(self):
+        service = StaticPriceService()
+        mints = ["So11111111111111111111111111111111111111112", "unknown_token_address"]
+        self.assertEqual(service.get_prices(mints), {mint: service.get_price(mint) for mint in mints})
+
+
+class TestCoinGeckoPriceService(unittest.TestCase):
+    """Tests for CoinGeckoPriceService that need no network access."""
+
+    def test_unmapped_mints_resolve_without_requests(self):
+        service = CoinGeckoPriceService(http=HttpClient())
+        self.assertEqual(service.get_prices(["unknown_a", "unknown_b"]), {"unknown_a": 0.0, "unknown_b": 0.0})
+
+    def test_bulk_lookup_uses_fresh_cache(self):
+        service = CoinGeckoPriceService(http=HttpClient())
+        service.cache.set("solana", 150.0)
+        service.cache.set("usd-coin", 1.0)
+        prices = service.get_prices(["So11111111111111111111111111111111111111112",
+                                     "EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v"])
+        self.assertEqual(sorted(prices.values()), [1.0, 150.0])
+
+    def test_daily_prices_served_from_disk_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            history = DailyPriceCache(os.path.join(tmp, "prices.db"))
+            today = int(time.time()) // 86400
+            history.put("solana", "USD", {today - 3: 120.0, today - 2: None, today - 1: 125.0})
+
+            service = CoinGeckoPriceService(history_cache=DailyPriceCache(history.db_path), http=HttpClient())
+            service.cache.set("solana", 130.0)
+            prices = service.get_daily_prices(["So11111111111111111111111111111111111111112", "unknown"],
+                                              today - 3, today)
+            self.assertEqual(prices, {"So11111111111111111111111111111111111111112": {
+                today - 3: 120.0, today - 1: 125.0, today: 130.0}})
+
+    def test_missing_daily_prices_fetched_off_the_request(self):
+        class ChartPriceService(CoinGeckoPriceService):
+            def __init__(self, history_cache):
+                super().__init__(history_cache=history_cache, http=HttpClient())
+                self.chart_requests = []
+                self.release = threading.Event()
+
+            def _fetch_market_chart(self, coingecko_id, currency, first_day, last_day):
+                self.chart_requests.append((first_day, last_day))
+                self.release.wait(5)
+                return {day: 100.0 + day - first_day for day in range(first_day, last_day + 1)}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            service = ChartPriceService(DailyPriceCache(os.path.join(tmp, "prices.db")))
+            service.cache.set("solana", 130.0)
+            sol = "So11111111111111111111111111111111111111112"
+            today = int(time.time()) // 86400
+
+            # The cold call returns what is cached while the fetch is still blocked
+            self.assertEqual(service.get_daily_prices([sol], today - 2, today), {sol: {today: 130.0}})
+            self.assertEqual(service.get_daily_prices([sol], today - 2, today), {sol: {today: 130.0}})
+            service.release.set()
+            service.history_executor.shutdown(wait=True)
+
+            self.assertEqual(service.chart_requests, [(today - 2, today - 1)])
+            self.assertEqual(service.get_daily_prices([sol], today - 2, today),
+                             {sol: {today - 2: 100.0, today - 1: 101.0, today: 130.0}})
+
+    def test_overlapping_ranges_share_in_flight_days(self):
+        class ChartPriceService(CoinGeckoPriceService):
+            MAX_QUEUED_FILLS = 2
+
+            def __init__(self, history_cache):
+                super().__init__(history_cache=history_cache, http=HttpClient())
+                self.chart_requests = []
+                self.release = threading.Event()
+
+            def _fetch_market_chart(self, coingecko_id, currency, first_day, last_day):
+                self.chart_requests.append((coingecko_id, first_day, last_day))
+                self.release.wait(5)
+                return {day: 100.0 for day in range(first_day, last_day + 1)}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            service = ChartPriceService(DailyPriceCache(os.path.join(tmp, "prices.db")))
+            service.cache.set("solana", 130.0)
+            service.cache.set("usd-coin", 1.0)
+            sol = "So11111111111111111111111111111111111111112"
+            usdc = "EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v"
+            today = int(time.time()) // 86400
+
+            # A second wallet's wider range only queues the days not already in flight
+            service.get_daily_prices([sol], today - 2, today)
+            service.get_daily_prices([sol], today - 4, today)
+            # The queue is full, so this miss is left for a later request
+            service.get_daily_prices([usdc], today - 2, today)
+            service.release.set()
+            service.history_executor.shutdown(wait=True)
+
+            self.assertEqual(service.chart_requests, [("solana", today - 2, today - 1),
+                                                      ("solana", today - 4, today - 3)])
+            self.assertEqual(service._pending_days, {})
+            self.assertEqual(service._queued_fills, 0)
+
 
 class TestLabelService(unittest.TestCase):
     """Tests for LabelService."""
@@ -37,12 +154,655 @@ class TestLabelService(unittest.TestCase):
         self.assertTrue("..." in label)
         self.assertTrue(label.startswith("9WzD"))
 
+    def test_batched_labels_use_token_symbols(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            metadata = TokenMetadataService(os.path.join(tmp, "tokens.db"))
+            metadata.upsert_many([{"mint": "MintPopcorn1111111111111111111111111111111", "symbol": "POP"}])
+            service = LabelService(token_metadata=metadata)
+            labels = service.get_labels(["MintPopcorn1111111111111111111111111111111",
+                                         "JUP6LkbZbjS1jKKwapdHNy74zcZ3tLUZoi5QNyVTaV4",
+                                         "9WzDXwBbmkg8ZTbNMqUxvQRAyrZzDsGYdLVL9zYtAWWM"])
+            self.assertEqual(labels["MintPopcorn1111111111111111111111111111111"], "POP")
+            self.assertEqual(labels["JUP6LkbZbjS1jKKwapdHNy74zcZ3tLUZoi5QNyVTaV4"], "Jupiter")
+            self.assertEqual(labels["9WzDXwBbmkg8ZTbNMqUxvQRAyrZzDsGYdLVL9zYtAWWM"], "9WzD...AWWM")
+
     def test_is_known_platform(self):
         service = LabelService()
         self.assertTrue(service.is_known_platform("JUP6LkbZbjS1jKKwapdHNy74zcZ3tLUZoi5QNyVTaV4"))
         self.assertFalse(service.is_known_platform("unknown_address"))
 
 
+class TestTokenMetadataService(unittest.TestCase):
+    """Tests for the persistent token metadata cache."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "tokens.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_records_persist_and_merge(self):
+        service = TokenMetadataService(self.db_path)
+        service.upsert_many([{"mint": "MintA", "decimals": 8, "symbol": "AAA"}])
+        service.upsert_many([{"mint": "MintA", "name": "Token A"}])
+
+        reopened = TokenMetadataService(self.db_path)
+        self.assertEqual(reopened.get("MintA"),
+                         {"mint": "MintA", "decimals": 8, "symbol": "AAA", "name": "Token A"})
+
+    def test_known_tokens_and_unknown_mints(self):
+        service = TokenMetadataService(self.db_path)
+        found = service.get_many(["DezXAZ8z7PnrnRJjz3wXBoRgixCa6xjnB7YaB1pPB263", "MintB"])
+        self.assertEqual(found["DezXAZ8z7PnrnRJjz3wXBoRgixCa6xjnB7YaB1pPB263"]["decimals"], 5)
+        self.assertNotIn("MintB", found)
+
+        # The remembered miss is dropped once the mint is stored
+        service.upsert_many([{"mint": "MintB", "decimals": 2}])
+        self.assertEqual(service.get("MintB")["decimals"], 2)
+
+
+class TestLRUCache(unittest.TestCase):
+    """Tests for the shared in-process LRU cache."""
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_counts_hits_and_misses(self):
+        cache = LRUCache()
+        cache.set("a", 1)
+        cache.get("a")
+        cache.get("missing")
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_entries_expire_and_are_swept(self):
+        cache = LRUCache(ttl=60, sweep_interval=0)
+        cache.set("short", 1, ttl=0)
+        cache.set("unread", 2, ttl=0)
+        cache.set("long", 3)
+        self.assertIsNone(cache.get("short"))
+        # The write sweeps "unread" out even though it is never read again
+        cache.set("other", 4)
+        self.assertEqual(cache.keys(), ["long", "other"])
+        self.assertEqual(cache.stats()["expirations"], 2)
+
+    def test_byte_budget_evicts_oldest(self):
+        cache = LRUCache(max_bytes=1000, sizeof=len)
+        cache.set("a", "x" * 400)
+        cache.set("b", "x" * 400)
+        cache.set("c", "x" * 400)
+        cache.set("huge", "x" * 2000)
+        self.assertEqual(cache.keys(), ["b", "c"])
+        self.assertEqual(cache.stats()["bytes"], 800)
+
+
+class TestRateLimiter(unittest.TestCase):
+    """Token buckets shared through SQLite, with priority headroom."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "rate_limits.db")
+        self.quotas = {"helius": ProviderQuota(rate=0.5, burst=4)}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_bucket_is_shared_between_workers(self):
+        worker_a = RateLimiter(self.db_path, self.quotas)
+        worker_b = RateLimiter(self.db_path, self.quotas)
+        for worker in (worker_a, worker_b, worker_a, worker_b):
+            self.assertEqual(worker.try_acquire("helius"), 0)
+        self.assertGreater(worker_b.try_acquire("helius"), 1)
+        # Providers without a quota are never throttled
+        self.assertEqual(worker_a.try_acquire("cryptocompare"), 0)
+
+    def test_prewarm_leaves_headroom_for_interactive(self):
+        limiter = RateLimiter(self.db_path, self.quotas)
+        with priority(PRIORITY_PREWARM):
+            granted = [limiter.try_acquire("helius") == 0 for _ in range(4)]
+        self.assertEqual(granted, [True, True, False, False])
+        self.assertEqual([limiter.try_acquire("helius") for _ in range(2)], [0, 0])
+
+    def test_throttling_pauses_the_bucket(self):
+        limiter = RateLimiter(self.db_path, self.quotas)
+        limiter.penalize("helius", 10)
+        self.assertGreaterEqual(limiter.try_acquire("helius"), 10)
+        self.assertEqual(provider_for_url("https://mainnet.helius-rpc.com/?api-key=x"), "helius")
+        self.assertIsNone(provider_for_url("https://min-api.cryptocompare.com/data/v2/news/"))
+
+    def test_locked_bucket_is_awaited_off_the_event_loop(self):
+        limiter = RateLimiter(self.db_path, self.quotas)
+        # Another process holding the bucket's write lock
+        holder = sqlite3.connect(self.db_path, isolation_level=None)
+        holder.execute("BEGIN IMMEDIATE")
+        started = time.monotonic()
+        self.assertGreater(limiter.try_acquire("helius"), 0)
+        self.assertLess(time.monotonic() - started, 2)
+
+        async def acquire_while_locked():
+            task = asyncio.ensure_future(limiter.acquire_async("helius"))
+            ticks = 0
+            for _ in range(20):
+                await asyncio.sleep(0.01)
+                ticks += 1
+            self.assertFalse(task.done())
+            holder.execute("COMMIT")
+            await asyncio.wait_for(task, 5)
+            return ticks
+
+        self.assertEqual(asyncio.run(acquire_while_locked()), 20)
+        holder.close()
+
+
+class TestIndexingQueue(unittest.TestCase):
+    """Fixed worker pool, bounded depth and per-wallet dedupe."""
+
+    def setUp(self):
+        self.release = threading.Event()
+        self.started = []
+        self.queue = IndexingQueue(self.run_job, workers=1, max_depth=2)
+
+    def tearDown(self):
+        self.release.set()
+
+    def run_job(self, wallet, job_id):
+        self.started.append(wallet)
+        self.release.wait(5)
+        if wallet == "bad":
+            raise RuntimeError("indexer crashed")
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.001)
+
+    def test_bounded_queue_with_positions_and_dedupe(self):
+        running, _ = self.queue.submit("w1", "job1")
+        self.wait_for(lambda: self.started)
+        self.queue.submit("w2", "job2")
+        self.queue.submit("bad", "job3")
+
+        duplicate, created = self.queue.submit("w2", "job4")
+        self.assertFalse(created)
+        self.assertEqual(duplicate.job_id, "job2")
+        self.assertEqual((running.status, self.queue.position("job1"), self.queue.position("job3")),
+                         ("running", None, 2))
+        self.assertEqual(self.queue.estimated_wait("job3"), 2 * 60.0)
+        with self.assertRaises(QueueFullError) as raised:
+            self.queue.submit("w5", "job5")
+        self.assertGreaterEqual(raised.exception.retry_after, 1)
+
+        self.release.set()
+        self.wait_for(lambda: self.queue.stats()["completed"] + self.queue.stats()["failed"] == 3)
+        self.assertEqual(self.started, ["w1", "w2", "bad"])
+        self.assertEqual(self.queue.get("job3").error, "indexer crashed")
+        self.assertEqual(self.queue.stats()["rejected"], 1)
+        # Finished wallets can be indexed again
+        self.assertTrue(self.queue.submit("w1", "job6")[1])
+
+    def test_job_ids_are_unique_and_dead_workers_replaced(self):
+        self.release.set()
+        self.queue.submit("w1", "job1")
+        with self.assertRaises(ValueError):
+            self.queue.submit("w2", "job1")
+        self.wait_for(lambda: self.queue.stats()["completed"] == 1)
+
+        # A worker that died is replaced rather than counted
+        dead = threading.Thread(target=lambda: None)
+        dead.start()
+        dead.join()
+        self.queue._threads = [dead]
+        self.queue.submit("w3", "job3")
+        self.wait_for(lambda: self.queue.stats()["completed"] == 2)
+        self.assertEqual(self.queue.get("job3").status, "completed")
+
+
+class TestIndexerResume(unittest.TestCase):
+    """Re-indexing resumes after the newest signature only once a backfill completed."""
+
+    SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "..", "migrations.sql")
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "wallet.db")
+        self.indexer = IndexerService()
+        self.indexer.get_wallet_db_path = lambda wallet: self.db_path
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_resume_signature(self):
+        self.assertIsNone(self.indexer.resume_signature("w"))
+
+        conn = sqlite3.connect(self.db_path)
+        with open(self.SCHEMA_PATH) as f:
+            conn.executescript(f.read())
+        conn.executemany("INSERT INTO transactions (signature, slot) VALUES (?, ?)",
+                         [("old", 10), ("newest", 30), ("backfilled", 5)])
+        conn.execute("INSERT INTO history_state (id, complete, updated_at) VALUES (1, 0, 0)")
+        conn.commit()
+        # An interrupted backfill may have left a gap: walk the full history again
+        self.assertIsNone(self.indexer.resume_signature("w"))
+
+        conn.execute("UPDATE history_state SET complete = 1")
+        conn.commit()
+        conn.close()
+        self.assertEqual(self.indexer.resume_signature("w"), "newest")
+
+
+class TestIndexerSupervisor(unittest.TestCase):
+    """Warm indexer processes speaking the `vialytics-core --serve` line protocol."""
+
+    # Stand-in for the Rust binary: same stdin/stdout protocol, crashes once on "crash"
+    SERVER = r"""
+import json, os, sys
+print(json.dumps({"event": "ready"}), flush=True)
+for line in sys.stdin:
+    request = json.loads(line)
+    if request["op"] == "ping":
+        print(json.dumps({"event": "pong", "id": request["id"]}), flush=True)
+        continue
+    db_path = request["db_url"][len("sqlite://"):]
+    if request["wallet"] == "crash" and not os.path.exists(db_path + ".crashed"):
+        open(db_path + ".crashed", "w").close()
+        os._exit(1)
+    if request["wallet"] == "bad":
+        print(json.dumps({"event": "error", "id": request["id"], "message": "Invalid wallet address"}), flush=True)
+        continue
+    print("Fetching history for wallet: " + request["wallet"], flush=True)
+    print(json.dumps({"event": "progress", "phase": "transactions", "listed": True, "done": 1, "total": 2}), flush=True)
+    open(db_path, "w").close()
+    print(json.dumps({"event": "done", "id": request["id"], "complete": True, "pid": os.getpid()}), flush=True)
+"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "wallet.db")
+        self.supervisor = IndexerSupervisor([sys.executable, "-c", self.SERVER], processes=1)
+
+    def tearDown(self):
+        self.supervisor.shutdown()
+        self.tmp.cleanup()
+
+    def test_reuses_process_and_restarts_after_crash(self):
+        events = []
+        first = self.supervisor.index("w1", self.db_path, on_progress=events.append)
+        self.assertEqual(events, [{"event": "progress", "phase": "transactions", "listed": True,
+                                   "done": 1, "total": 2}])
+        second = self.supervisor.index("w2", self.db_path, until_signature="sig")
+        self.assertTrue(first["complete"])
+        self.assertEqual(first["pid"], second["pid"])
+        self.assertTrue(os.path.exists(self.db_path))
+
+        with self.assertRaises(IndexerProcessError):
+            self.supervisor.index("bad", self.db_path)
+
+        # Crashes mid-job: retried once on a fresh process
+        third = self.supervisor.index("crash", self.db_path)
+        self.assertNotEqual(third["pid"], first["pid"])
+        self.assertTrue(self.supervisor.processes[0].ping())
+        stats = self.supervisor.stats()
+        self.assertEqual((stats["jobs"], stats["starts"], stats["crashes"], stats["alive"]), (3, 2, 1, 1))
+
+        self.supervisor.shutdown()
+        self.assertEqual(self.supervisor.stats()["alive"], 0)
+
+
+class TestIndexerProgress(unittest.TestCase):
+    """Structured indexer progress events mapped to throttled job percentages."""
+
+    def test_events_to_percentages(self):
+        self.assertIsNone(parse_event("Processed transaction: abc | Slot: 1"))
+        self.assertIsNone(parse_event("{not json"))
+        event = parse_event('{"done":50,"event":"progress","listed":true,"pages":1,"phase":"transactions","total":100}')
+        self.assertEqual(progress_percent(event), 50)
+        self.assertEqual(progress_percent({"phase": "transactions", "listed": True, "done": 0, "total": 0}), 80)
+        # While pages are still being listed the running total is not the end
+        self.assertEqual(progress_percent({"phase": "transactions", "pages": 1, "done": 100, "total": 100}), 50)
+        walk = [progress_percent({"phase": "transactions", "pages": pages, "done": 100 * pages, "total": 100 * pages})
+                for pages in (1, 2, 10)]
+        self.assertEqual(walk, sorted(walk))
+        self.assertTrue(walk[-1] < 80)
+
+    def test_reporter_throttles_and_never_goes_backwards(self):
+        pushed = []
+        reporter = ProgressReporter(lambda percent, eta: pushed.append((percent, eta)), min_interval=60)
+        self.assertTrue(reporter.update({"phase": "transactions", "listed": True, "done": 1, "total": 10,
+                                         "eta_seconds": 9.0}))
+        self.assertFalse(reporter.update({"phase": "transactions", "listed": True, "done": 5, "total": 10}))
+        self.assertTrue(reporter.report(20, force=True))
+        self.assertEqual(pushed, [(26, 9.0), (50, None)])
+        self.assertEqual(reporter.percent, 50)
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Concurrent callers of one key share a single call."""
+
+    def test_threads_share_one_call(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        executions = []
+
+        def fetch():
+            executions.append(1)
+            release.wait(5)
+            return {"wallet": WALLET}
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do(WALLET, fetch))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        while flight.stats()["calls"] < 8:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(executions), 1)
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(r is results[0] for r in results))
+        self.assertEqual(flight.stats(), {"calls": 8, "shared": 7, "executed": 1})
+
+    def test_errors_reach_every_caller_and_are_not_remembered(self):
+        flight = SingleFlight()
+
+        def fail():
+            raise RuntimeError("rate limited")
+
+        with self.assertRaises(RuntimeError):
+            flight.do("key", fail)
+        self.assertEqual(flight.do("key", lambda: 1), 1)
+
+    def test_coroutines_share_one_call(self):
+        flight = AsyncSingleFlight()
+        executions = []
+
+        async def fetch():
+            executions.append(1)
+            await asyncio.sleep(0.01)
+            return len(executions)
+
+        async def burst():
+            return await asyncio.gather(*(flight.do(WALLET, fetch) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(burst()), [1] * 5)
+        self.assertEqual(flight.stats()["executed"], 1)
+
+
+WALLET = "2QkJLTKTLYFHS6xir1TEXLSdajM7r1DjF96JogKnRGSR"
+SENDER = "9WzDXwBbmkg8ZTbNMqUxvQRAyrZzDsGYdLVL9zYtAWWM"
+
+
+class PagedHeliusClient(HeliusClient):
+    """Serves a fixed transaction history and asset list in API-sized pages."""
+
+    def __init__(self, n_transactions, n_nfts, metadata_path, store=None):
+        super().__init__(api_key="test", http=HttpClient(), token_metadata=TokenMetadataService(metadata_path),
+                         store=store or EnrichmentStore(os.path.join(os.path.dirname(metadata_path), "enrichment.db")))
+        self.history = [
+            {"signature": f"sig{i}", "fee": 5000, "source": "SYSTEM_PROGRAM",
+             "nativeTransfers": [{"fromUserAccount": SENDER, "toUserAccount": WALLET, "amount": 1_000_000}]}
+            for i in range(n_transactions)
+        ]
+        self.assets = [{"id": f"nft{i}", "interface": "V1_NFT", "content": {"metadata": {"name": f"NFT {i}"}}}
+                       for i in range(n_nfts)]
+        self.cursors = []
+        # Index of a transaction page whose request fails
+        self.failing_page = None
+
+    def _rpc_call(self, method, params, timeout=10):
+        start = (params["page"] - 1) * params["limit"]
+        return {"items": self.assets[start:start + params["limit"]], "limit": params["limit"],
+                "nativeBalance": {"lamports": 10**9, "price_per_sol": 100.0}}
+
+    def _get(self, path, params=None, timeout=8):
+        self.cursors.append(params.get("before"))
+        if len(self.cursors) - 1 == self.failing_page:
+            return None
+        start = 0
+        if params.get("before"):
+            start = int(params["before"][3:]) + 1
+        return self.history[start:start + params["limit"]]
+
+
+class TestHeliusPagination(unittest.TestCase):
+    """Full-history fetch follows the cursors and folds pages as they arrive."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.metadata_path = os.path.join(self.tmp.name, "tokens.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_latest_page_by_default(self):
+        client = PagedHeliusClient(250, 3, self.metadata_path)
+        result = client.fetch_enrichment(WALLET, use_cache=False)
+        self.assertEqual(result["normalized"]["transaction_count"], TRANSACTIONS_PAGE_LIMIT)
+        self.assertEqual(client.cursors, [None])
+        # Compact by default: only the normalized view is returned and cached
+        self.assertNotIn("transactions", result)
+        self.assertNotIn("assets", client.cache.get(f"helius:{WALLET}:latest"))
+
+    def test_raw_pages_on_request(self):
+        client = PagedHeliusClient(250, 3, self.metadata_path)
+        compact = client.fetch_enrichment(WALLET)
+        raw = client.fetch_enrichment(WALLET, include_raw=True)
+        self.assertEqual(len(raw["transactions"]), TRANSACTIONS_PAGE_LIMIT)
+        self.assertEqual(len(raw["assets"]["items"]), 3)
+        self.assertEqual(raw["normalized"], compact["normalized"])
+        # Raw and compact results are cached separately
+        self.assertNotIn("transactions", client.fetch_enrichment(WALLET))
+
+    def test_full_history_follows_before_cursor(self):
+        client = PagedHeliusClient(250, 1500, self.metadata_path)
+        result = client.fetch_enrichment(WALLET, use_cache=False, full_history=True)
+
+        normalized = result["normalized"]
+        self.assertEqual(client.cursors, [None, "sig99", "sig199"])
+        self.assertEqual(normalized["transaction_count"], 250)
+        self.assertEqual(normalized["nft_count"], 1500)
+        self.assertEqual(len(normalized["nfts"]), 10)
+        self.assertAlmostEqual(normalized["top_counterparties"][0]["usd_volume"], 250 * 0.001 * 100.0)
+        self.assertEqual(result["pagination"], {"asset_pages": 2, "transaction_pages": 3, "truncated": False,
+                                                "error": False})
+        # Raw pages are folded and dropped, not returned
+        self.assertNotIn("transactions", result)
+
+    def test_page_cap_marks_result_truncated(self):
+        client = PagedHeliusClient(1000, 0, self.metadata_path)
+        result = client.fetch_enrichment(WALLET, use_cache=False, full_history=True, max_pages=2)
+        self.assertEqual(result["normalized"]["transaction_count"], 200)
+        self.assertTrue(result["pagination"]["truncated"])
+
+    def test_failed_page_marks_result_partial_and_uncached(self):
+        key = f"helius:{WALLET}:full"
+        for fetch in ("sync", "async"):
+            paged = PagedHeliusClient(250, 3, self.metadata_path)
+            paged.failing_page = 1
+            if fetch == "sync":
+                client = paged
+                result = paged.fetch_enrichment(WALLET, full_history=True)
+            else:
+                client = AsyncPagedHeliusClient(paged)
+                result = asyncio.run(client.fetch_enrichment_async(WALLET, full_history=True))
+
+            self.assertEqual(result["normalized"]["transaction_count"], TRANSACTIONS_PAGE_LIMIT)
+            self.assertTrue(result["partial"])
+            self.assertEqual(result["pagination"]["transaction_pages"], 1)
+            self.assertTrue(result["pagination"]["truncated"])
+            self.assertTrue(result["pagination"]["error"])
+            # The next request fetches again instead of serving the partial result
+            self.assertIsNone(client.cache.get(key))
+            self.assertIsNone(client.store.get(key))
+
+    def test_async_client_fetches_streams_concurrently(self):
+        paged = PagedHeliusClient(250, 1500, self.metadata_path)
+        client = AsyncPagedHeliusClient(paged)
+        result = asyncio.run(client.fetch_enrichment_async(WALLET, use_cache=False, full_history=True))
+
+        expected = PagedHeliusClient(250, 1500, self.metadata_path).fetch_enrichment(
+            WALLET, use_cache=False, full_history=True)
+        self.assertEqual(result["normalized"], expected["normalized"])
+        self.assertEqual(result["pagination"], expected["pagination"])
+        # The transaction stream did not wait for the asset pages to finish
+        self.assertEqual(client.calls[:2], ["assets", "transactions"])
+
+
+class TestEnrichmentStore(unittest.TestCase):
+    """Enrichment results survive restarts and are served stale while refreshing."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.metadata_path = os.path.join(self.tmp.name, "tokens.db")
+        self.store_path = os.path.join(self.tmp.name, "enrichment.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_new_process_starts_warm(self):
+        first = PagedHeliusClient(250, 3, self.metadata_path, EnrichmentStore(self.store_path))
+        fetched = first.fetch_enrichment(WALLET)
+
+        # A fresh client has an empty memory cache, as after a restart
+        restarted = PagedHeliusClient(250, 3, self.metadata_path, EnrichmentStore(self.store_path))
+        self.assertEqual(restarted.fetch_enrichment(WALLET), fetched)
+        self.assertEqual(restarted.cursors, [])
+
+    def test_stale_result_served_while_refreshing(self):
+        first = PagedHeliusClient(40, 3, self.metadata_path, EnrichmentStore(self.store_path))
+        fetched = first.fetch_enrichment(WALLET)
+        self.assertEqual(fetched["normalized"]["transaction_count"], 40)
+
+        stale_store = EnrichmentStore(self.store_path, soft_ttl=0)
+        restarted = PagedHeliusClient(60, 3, self.metadata_path, stale_store)
+        self.assertEqual(restarted.fetch_enrichment(WALLET)["normalized"], fetched["normalized"])
+
+        flight_key = (f"helius:{WALLET}:latest", None, None)
+        deadline = time.monotonic() + 5
+        while (restarted.inflight.stats()["executed"] == 0 or restarted.inflight.in_flight(flight_key)) \
+                and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(restarted.cursors, [None])
+        refreshed, _ = stale_store.get(f"helius:{WALLET}:latest")
+        self.assertEqual(refreshed["normalized"]["transaction_count"], 60)
+        self.assertGreaterEqual(refreshed["fetched_at"], fetched["fetched_at"])
+
+    def test_async_stale_result_served_while_refreshing(self):
+        PagedHeliusClient(40, 3, self.metadata_path, EnrichmentStore(self.store_path)).fetch_enrichment(WALLET)
+        stale_store = EnrichmentStore(self.store_path, soft_ttl=0)
+        client = AsyncPagedHeliusClient(PagedHeliusClient(60, 3, self.metadata_path, stale_store))
+
+        async def serve_then_refresh():
+            served = await client.fetch_enrichment_async(WALLET)
+            await asyncio.gather(*client._refreshes)
+            return served
+
+        served = asyncio.run(serve_then_refresh())
+        self.assertEqual(served["normalized"]["transaction_count"], 40)
+        refreshed, _ = stale_store.get(f"helius:{WALLET}:latest")
+        self.assertEqual(refreshed["normalized"]["transaction_count"], 60)
+
+    def test_entries_past_hard_ttl_are_ignored(self):
+        store = EnrichmentStore(self.store_path, soft_ttl=0, hard_ttl=0)
+        store.put("helius:key", {"normalized": {}})
+        self.assertIsNone(store.get("helius:key"))
+
+
+class AsyncPagedHeliusClient(AsyncHeliusClient):
+    """Serves a PagedHeliusClient's pages through the async code path."""
+
+    def __init__(self, paged):
+        super().__init__(api_key="test", http=AsyncHttpClient(), store=paged.store, token_metadata=paged.token_metadata)
+        self.paged = paged
+        self.calls = []
+
+    async def _rpc_call_async(self, method, params, timeout=10):
+        self.calls.append("assets")
+        await asyncio.sleep(0)
+        return self.paged._rpc_call(method, params)
+
+    async def _get_async(self, path, params=None, timeout=8):
+        self.calls.append("transactions")
+        await asyncio.sleep(0)
+        return self.paged._get(path, params)
+
+
+class ScriptedHandler(BaseHTTPRequestHandler):
+    """Replies with the next (status, headers) from the server's script, then 200s."""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.client_ports.append(self.client_address[1])
+        status, headers = self.server.script.pop(0) if self.server.script else (200, {})
+        body = b"{}"
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHttpClient(unittest.TestCase):
+    """Tests for the pooled HTTP layer against a local server."""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), ScriptedHandler)
+        self.server.script = []
+        self.server.client_ports = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        self.http = HttpClient(max_retries=2, backoff=0.01)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_retries_throttled_requests(self):
+        self.server.script = [(429, {"Retry-After": "0"}), (503, {})]
+        response = self.http.get(self.url, timeout=5)
+        self.assertEqual(response.status_code, 200)
+        host_stats = self.http.stats()[f"127.0.0.1:{self.server.server_address[1]}"]
+        self.assertEqual((host_stats["requests"], host_stats["retries"], host_stats["errors"]), (3, 2, 2))
+
+    def test_gives_up_after_max_retries(self):
+        self.server.script = [(503, {})] * 5
+        self.assertEqual(self.http.get(self.url, timeout=5).status_code, 503)
+        self.assertEqual(len(self.server.client_ports), 3)
+
+    def test_connections_are_kept_alive(self):
+        for _ in range(3):
+            self.http.get(self.url, timeout=5)
+        self.assertEqual(len(set(self.server.client_ports)), 1)
+
+    def test_async_client_retries_and_keeps_alive(self):
+        self.server.script = [(429, {"Retry-After": "0"})]
+
+        async def fetch_twice():
+            http = AsyncHttpClient(max_retries=2, backoff=0.01)
+            try:
+                return [(await http.get(self.url, timeout=5)).status_code for _ in range(2)], http.stats()
+            finally:
+                await http.aclose()
+
+        statuses, stats = asyncio.run(fetch_twice())
+        self.assertEqual(statuses, [200, 200])
+        self.assertEqual(stats[f"127.0.0.1:{self.server.server_address[1]}"]["retries"], 1)
+        self.assertEqual(len(set(self.server.client_ports)), 1)
+
+
 class TestHeliusIntegration(unittest.TestCase):
     """Tests for Helius API integration. Skips if no API key."""
 
@@ -65,6 +65,25 @@ pub async fn save_transaction(
     }
 }
 
+/// Records whether the history backfill reached the wallet's first transaction.
+/// Cleared when a backfill starts, so an interrupted run forces a full walk next time.
+pub async fn set_history_complete(pool: &Pool<Sqlite>, complete: bool) {
+    let result = sqlx::query(
+        r#"
+        INSERT INTO history_state (id, complete, updated_at)
+        VALUES (1, $1, strftime('%s', 'now'))
+        ON CONFLICT(id) DO UPDATE SET complete = excluded.complete, updated_at = excluded.updated_at
+        "#,
+    )
+    .bind(complete)
+    .execute(pool)
+    .await;
+
+    if let Err(e) = result {
+        eprintln!("Failed to update history state: {}", e);
+    }
+}
+
 pub async fn save_token_movement(
     pool: &Pool<Sqlite>,
     signature: &str,
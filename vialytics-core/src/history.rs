@@ -1,78 +1,260 @@
+use serde_json::json;
 use solana_client::rpc_client::RpcClient;
 use sqlx::{Pool, Sqlite};
 use std::str::FromStr;
+use std::time::{Duration, Instant};
 
 use solana_sdk::{pubkey::Pubkey as SolanaPubkey, signature::Signature};
 
-use crate::db::process_confirmed_transaction;
+use crate::db::{process_confirmed_transaction, set_history_complete};
 
-pub async fn fetch_history(rpc_url: &str, wallet_address: &SolanaPubkey, pool: &Pool<Sqlite>) {
-    println!("Fetching history for wallet: {}...", wallet_address);
+/// Walks the wallet's signatures from newest to oldest, storing every transaction
+/// not yet in the database. With `until`, the walk stops at that signature (the
+/// newest one an earlier complete backfill stored) instead of the first transaction.
+/// Each page of signatures is stored before the next one is listed, so memory stays
+/// flat however long the history is. Returns whether the walk finished without errors.
+pub async fn fetch_history(
+    client: &RpcClient,
+    wallet_address: &SolanaPubkey,
+    pool: &Pool<Sqlite>,
+    until: Option<Signature>,
+    pacer: &mut RequestPacer,
+) -> bool {
+    match until {
+        Some(until) => println!(
+            "Fetching history for wallet: {} since {}...",
+            wallet_address, until
+        ),
+        None => println!("Fetching history for wallet: {}...", wallet_address),
+    }
 
-    let client = RpcClient::new(rpc_url.to_string());
     let pubkey = wallet_address;
 
+    // Only an error-free walk may be resumed from its newest signature later
+    set_history_complete(pool, false).await;
+    let mut complete = true;
+
+    let mut progress = Progress::new();
     let mut before: Option<Signature> = None;
     loop {
+        pacer.wait().await;
         let signatures = match client.get_signatures_for_address_with_config(
             &pubkey,
             solana_client::rpc_client::GetConfirmedSignaturesForAddress2Config {
                 before,
-                limit: Some(100),
+                until,
+                limit: Some(SIGNATURES_PAGE_LIMIT),
                 ..Default::default()
             },
         ) {
             Ok(sig) => sig,
             Err(e) => {
                 eprintln!("Error fetching signatures: {}", e);
+                complete = false;
                 break;
             }
         };
-        if signatures.is_empty() {
-            break;
-        }
 
-        for sig_info in &signatures {
-            let signature_str = &sig_info.signature;
-            let signature = Signature::from_str(signature_str).unwrap();
-
-            let exists = sqlx::query("SELECT 1 as exists FROM transactions WHERE signature = $1")
-                .bind(signature_str)
-                .fetch_optional(pool)
-                .await
-                .unwrap_or(None);
-
-            if exists.is_some() {
-                println!(
-                    "Transaction {} already exists in the database, skipping.",
-                    signature_str
-                );
-                before = Some(signature);
-                continue;
-            }
+        before = signatures
+            .last()
+            .and_then(|sig_info| Signature::from_str(&sig_info.signature).ok());
+        let last_page = signatures.len() < SIGNATURES_PAGE_LIMIT || before.is_none();
+        progress.add_page(signatures.len(), last_page);
 
-            match client.get_transaction_with_config(
-                &signature,
-                solana_client::rpc_config::RpcTransactionConfig {
-                    encoding: Some(solana_transaction_status::UiTransactionEncoding::Json),
-                    commitment: Some(solana_sdk::commitment_config::CommitmentConfig::confirmed()),
-                    max_supported_transaction_version: Some(0),
-                },
-            ) {
-                Ok(tx) => {
-                    process_confirmed_transaction(pool, signature_str, &tx).await;
-                }
-                Err(e) => {
-                    eprintln!("Error fetching transaction {}: {}", signature_str, e);
-                }
+        for sig_info in &signatures {
+            if !store_transaction(client, pool, pacer, &sig_info.signature, &mut progress).await {
+                complete = false;
             }
-
-            before = Some(signature);
+            progress.report();
         }
-        if signatures.len() < 100 {
+        if last_page {
             break;
         }
     }
+    // Ends on a final event even when the walk stopped early
+    progress.finish();
 
+    if complete {
+        set_history_complete(pool, true).await;
+    }
     println!("Finished fetching history for wallet: {}", wallet_address);
+    complete
+}
+
+/// Signatures listed per RPC call (the RPC maximum is 1000)
+const SIGNATURES_PAGE_LIMIT: usize = 100;
+
+/// Fetches and stores one transaction unless it is already in the database.
+/// Returns false if it could not be fetched.
+async fn store_transaction(
+    client: &RpcClient,
+    pool: &Pool<Sqlite>,
+    pacer: &mut RequestPacer,
+    signature_str: &str,
+    progress: &mut Progress,
+) -> bool {
+    let exists = sqlx::query("SELECT 1 as exists FROM transactions WHERE signature = $1")
+        .bind(signature_str)
+        .fetch_optional(pool)
+        .await
+        .unwrap_or(None);
+
+    if exists.is_some() {
+        println!(
+            "Transaction {} already exists in the database, skipping.",
+            signature_str
+        );
+        progress.skipped += 1;
+        return true;
+    }
+
+    let signature = match Signature::from_str(signature_str) {
+        Ok(signature) => signature,
+        Err(e) => {
+            eprintln!("Invalid signature {}: {}", signature_str, e);
+            progress.failed += 1;
+            return false;
+        }
+    };
+    pacer.wait().await;
+    match client.get_transaction_with_config(
+        &signature,
+        solana_client::rpc_config::RpcTransactionConfig {
+            encoding: Some(solana_transaction_status::UiTransactionEncoding::Json),
+            commitment: Some(solana_sdk::commitment_config::CommitmentConfig::confirmed()),
+            max_supported_transaction_version: Some(0),
+        },
+    ) {
+        Ok(tx) => {
+            process_confirmed_transaction(pool, signature_str, &tx).await;
+            progress.fetched += 1;
+            true
+        }
+        Err(e) => {
+            eprintln!("Error fetching transaction {}: {}", signature_str, e);
+            progress.failed += 1;
+            false
+        }
+    }
+}
+
+/// Spaces RPC requests out to at most `max_rps` per second (unlimited when None),
+/// keeping a backfill inside the share of the provider quota the API gives it.
+pub struct RequestPacer {
+    interval: Option<Duration>,
+    next: Instant,
+}
+
+impl RequestPacer {
+    pub fn new(max_rps: Option<f64>) -> Self {
+        RequestPacer {
+            interval: max_rps
+                .filter(|rps| *rps > 0.0)
+                .map(|rps| Duration::from_secs_f64(1.0 / rps)),
+            next: Instant::now(),
+        }
+    }
+
+    /// Waits until the next request may be sent.
+    pub async fn wait(&mut self) {
+        let Some(interval) = self.interval else {
+            return;
+        };
+        let now = Instant::now();
+        if self.next > now {
+            tokio::time::sleep(self.next - now).await;
+        }
+        self.next = self.next.max(now) + interval;
+    }
+}
+
+/// Least time between two progress events of the same phase
+const PROGRESS_INTERVAL: Duration = Duration::from_millis(500);
+
+/// Counts of a backfill, printed to stdout as one-line JSON `progress` events
+/// so a supervisor can turn them into percentages without scanning the logs.
+/// `total` is the number of signatures listed so far; it only becomes final
+/// (`listed`) once the last page has been seen. Listing and fetching are
+/// interleaved page by page, so `phase` is always "transactions" and the ETA
+/// is extrapolated from the pages listed so far until then.
+struct Progress {
+    started: Instant,
+    last_report: Option<Instant>,
+    pages: usize,
+    total: usize,
+    listed: bool,
+    fetched: usize,
+    skipped: usize,
+    failed: usize,
+}
+
+impl Progress {
+    fn new() -> Self {
+        Progress {
+            started: Instant::now(),
+            last_report: None,
+            pages: 0,
+            total: 0,
+            listed: false,
+            fetched: 0,
+            skipped: 0,
+            failed: 0,
+        }
+    }
+
+    fn add_page(&mut self, signatures: usize, last: bool) {
+        self.pages += 1;
+        self.total += signatures;
+        self.listed = last;
+    }
+
+    fn done(&self) -> usize {
+        self.fetched + self.skipped + self.failed
+    }
+
+    fn report(&mut self) {
+        let now = Instant::now();
+        if self
+            .last_report
+            .map_or(false, |at| now - at < PROGRESS_INTERVAL)
+        {
+            return;
+        }
+        self.print(now);
+    }
+
+    fn finish(&mut self) {
+        self.listed = true;
+        self.print(Instant::now());
+    }
+
+    fn print(&mut self, now: Instant) {
+        self.last_report = Some(now);
+        let done = self.done();
+        // Estimated from the pace so far. Until the last page is listed, assume at
+        // least one more page of the average size, as the API's percentage does.
+        let expected = if self.listed || self.pages == 0 {
+            self.total as f64
+        } else {
+            self.total as f64 + self.total as f64 / self.pages as f64
+        };
+        let elapsed = self.started.elapsed().as_secs_f64();
+        let eta_seconds = (done > 0 && (self.listed || self.pages > 0))
+            .then(|| elapsed / done as f64 * (expected - done as f64).max(0.0));
+        println!(
+            "{}",
+            json!({
+                "event": "progress",
+                "phase": "transactions",
+                "pages": self.pages,
+                "listed": self.listed,
+                "done": done,
+                "total": self.total,
+                "fetched": self.fetched,
+                "skipped": self.skipped,
+                "failed": self.failed,
+                "eta_seconds": eta_seconds,
+            })
+        );
+    }
 }
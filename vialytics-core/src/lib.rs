@@ -10,11 +10,13 @@
 //! - [`handler`]: The core logic for processing streamed transactions.
 //! - [`history`]: Utilities for backfilling historical data from RPC.
 //! - [`parser`]: Logic for parsing raw gRPC messages into usable structures.
+//! - [`serve`]: Long-running mode that backfills many wallets from stdin requests.
 
 pub mod db;
 pub mod handler;
 pub mod history;
 pub mod parser;
+pub mod serve;
 
 pub use db::*;
 pub use handler::*;
@@ -26,7 +28,12 @@ use yellowstone_vixen_yellowstone_grpc_source::YellowstoneGrpcConfig;
 #[derive(Deserialize)]
 pub struct VialyticsConfig {
     pub rpc_url: String,
+    /// Unused by `--serve`, where every request names its wallet DB
+    #[serde(default)]
     pub db_url: String,
+    /// Most RPC requests per second a backfill sends; unlimited when unset
+    #[serde(default)]
+    pub max_rps: Option<f64>,
 }
 
 #[derive(Deserialize)]
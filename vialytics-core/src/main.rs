@@ -7,8 +7,9 @@ use clap::Parser;
 use solana_client::rpc_client;
 use tracing_subscriber::prelude::*;
 use vialytics_core::{
-    AppConfig, db, handler::TransactionHandler, history::fetch_history,
-    parser::RawTransactionParser,
+    AppConfig, db, handler::TransactionHandler,
+    history::{fetch_history, RequestPacer},
+    parser::RawTransactionParser, serve::serve,
 };
 use yellowstone_vixen::{
     self as vixen,
@@ -23,8 +24,16 @@ pub struct Opts {
     #[arg(long, short)]
     config: PathBuf,
 
+    #[arg(long, required_unless_present = "serve")]
+    wallet_address: Option<String>,
+
+    /// Only fetch transactions newer than this signature (resume a complete backfill)
     #[arg(long)]
-    wallet_address: String,
+    until_signature: Option<String>,
+
+    /// Backfill wallets requested as JSON lines on stdin instead of streaming one
+    #[arg(long, conflicts_with_all = ["wallet_address", "until_signature"])]
+    serve: bool,
 }
 
 #[tokio::main]
@@ -40,21 +49,34 @@ async fn main() {
     let Opts {
         config,
         wallet_address,
+        until_signature,
+        serve: serve_mode,
     } = Opts::parse();
 
     let config_content = std::fs::read_to_string(config).expect("Error reading the config file");
     let config: AppConfig = toml::from_str(&config_content).expect("Error parsing config");
 
+    if serve_mode {
+        serve(&config.vialytics.rpc_url, config.vialytics.max_rps).await;
+        return;
+    }
+    let wallet_address = wallet_address.expect("--wallet-address is required");
+
     let pool = db::connect(&config.vialytics.db_url).await;
     db::run_migrations(&pool).await;
 
     let wallet_pubkey =
         solana_sdk::pubkey::Pubkey::from_str(&wallet_address).expect("Invalid wallet address");
 
-    fetch_history(&config.vialytics.rpc_url, &wallet_pubkey, &pool).await;
+    let until = until_signature.map(|signature| {
+        solana_sdk::signature::Signature::from_str(&signature).expect("Invalid until signature")
+    });
+
+    let rpc_client = Arc::new(rpc_client::RpcClient::new(config.vialytics.rpc_url.clone()));
+    let mut pacer = RequestPacer::new(config.vialytics.max_rps);
+    fetch_history(&rpc_client, &wallet_pubkey, &pool, until, &mut pacer).await;
     println!("History fetch completed.");
     println!("Starting stream for wallet: {}...", wallet_address);
-    let rpc_client = Arc::new(rpc_client::RpcClient::new(config.vialytics.rpc_url.clone()));
 
     let vixen_pubkey = Pubkey::from(wallet_pubkey.to_bytes());
 
@@ -0,0 +1,111 @@
+//! Long-running multi-wallet backfill mode.
+//!
+//! Instead of one process per wallet, `vialytics-core --serve` keeps its RPC
+//! client warm and reads one JSON request per line on stdin:
+//!
+//! ```text
+//! {"op": "ping", "id": "1"}
+//! {"op": "index", "id": "2", "wallet": "<PUBKEY>", "db_url": "sqlite://wallet.db", "until_signature": null}
+//! ```
+//!
+//! Every request is answered with one JSON line on stdout carrying the same `id`
+//! and an `event` of `pong`, `done` or `error`. Requests are handled one at a time;
+//! other stdout lines are progress logs. The process exits when stdin closes.
+
+use std::str::FromStr;
+
+use serde::Deserialize;
+use serde_json::{json, Value};
+use solana_client::rpc_client::RpcClient;
+use solana_sdk::{pubkey::Pubkey as SolanaPubkey, signature::Signature};
+
+use crate::{
+    db,
+    history::{fetch_history, RequestPacer},
+};
+
+#[derive(Deserialize)]
+#[serde(tag = "op", rename_all = "snake_case")]
+pub enum Request {
+    Ping {
+        id: String,
+    },
+    Index {
+        id: String,
+        wallet: String,
+        db_url: String,
+        until_signature: Option<String>,
+    },
+}
+
+/// Serves requests from stdin until it is closed.
+pub async fn serve(rpc_url: &str, max_rps: Option<f64>) {
+    let client = RpcClient::new(rpc_url.to_string());
+    // Shared by every request, so back-to-back backfills keep to the rate too
+    let mut pacer = RequestPacer::new(max_rps);
+    println!("{}", json!({"event": "ready"}));
+
+    let mut line = String::new();
+    loop {
+        line.clear();
+        match std::io::stdin().read_line(&mut line) {
+            Ok(0) => break,
+            Ok(_) => {}
+            Err(e) => {
+                eprintln!("Error reading request: {}", e);
+                break;
+            }
+        }
+        if line.trim().is_empty() {
+            continue;
+        }
+
+        let response = match serde_json::from_str::<Request>(&line) {
+            Ok(Request::Ping { id }) => json!({"event": "pong", "id": id}),
+            Ok(Request::Index {
+                id,
+                wallet,
+                db_url,
+                until_signature,
+            }) => {
+                index_wallet(
+                    &client,
+                    &id,
+                    &wallet,
+                    &db_url,
+                    until_signature.as_deref(),
+                    &mut pacer,
+                )
+                .await
+            }
+            Err(e) => json!({"event": "error", "id": null, "message": format!("Invalid request: {}", e)}),
+        };
+        println!("{}", response);
+    }
+}
+
+async fn index_wallet(
+    client: &RpcClient,
+    id: &str,
+    wallet: &str,
+    db_url: &str,
+    until_signature: Option<&str>,
+    pacer: &mut RequestPacer,
+) -> Value {
+    let wallet_pubkey = match SolanaPubkey::from_str(wallet) {
+        Ok(pubkey) => pubkey,
+        Err(e) => return json!({"event": "error", "id": id, "message": format!("Invalid wallet address: {}", e)}),
+    };
+    let until = match until_signature.map(Signature::from_str).transpose() {
+        Ok(until) => until,
+        Err(e) => return json!({"event": "error", "id": id, "message": format!("Invalid until signature: {}", e)}),
+    };
+
+    let pool = db::connect(db_url).await;
+    db::run_migrations(&pool).await;
+    let complete = fetch_history(client, &wallet_pubkey, &pool, until, pacer).await;
+    // Release the wallet DB so the API can analyze it right away
+    pool.close().await;
+
+    json!({"event": "done", "id": id, "wallet": wallet, "complete": complete})
+}